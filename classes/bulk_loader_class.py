@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+import tempfile
+import time
+from classes.event_sink_class import FileSink
+
+class BulkLoader(FileSink):
+    """
+    A sink that stages rows in a tab-separated file and ingests each staged chunk with MySQL's
+    native LOAD DATA LOCAL INFILE bulk loader, which is far faster than inserting the rows
+    through the connector. The connection must be opened with allow_local_infile = True.
+
+    """
+    def __init__(self, mycursor, table, columns, flush_size = 5000, chunk_rows = 1000000,
+                 staging_dir = None, duplicates = None, time_column = None):
+        """
+        Initialize a BulkLoader object
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+            table (string): the table the rows are loaded into
+            columns (List<string>): the table columns, in the order of the values in each row
+            flush_size (int): the number of buffered rows written to the staging file at a time
+            chunk_rows (int): the number of staged rows that triggers a load into the table
+            staging_dir (string): the directory for the staging files, defaults to the temp directory
+            duplicates (string): "REPLACE" or "IGNORE" to handle rows with an existing primary key,
+                                 or None to treat them as errors
+            time_column (int): the position of a column holding seconds since midnight, to be
+                               loaded as HH:MM:SS
+
+        """
+        self.table = table
+        self.staging_dir = staging_dir if staging_dir is not None else tempfile.gettempdir()
+        super().__init__(self.create_staging_path(), flush_size, time_column = time_column)
+
+        self.mycursor = mycursor
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.duplicates = duplicates
+
+        self.rows_staged = 0
+        self.rows_loaded = 0
+        self.chunk_rows_staged = 0
+        self.chunks_loaded = 0
+        self.stage_time = 0.0
+        self.load_time = 0.0
+
+    def create_staging_path(self):
+        """
+        Creates a new, uniquely named staging file, so that loaders running at the same time on
+        one host never write to each other's files
+
+        Returns:
+            path (string): the path of the empty staging file
+
+        """
+        handle, path = tempfile.mkstemp(prefix = self.table + "_", suffix = ".tsv", 
+                                        dir = self.staging_dir)
+        os.close(handle)
+        return(path)
+
+    def get_load_sql(self):
+        # MySQL reads the file path as a string literal, so use forward slashes on every platform
+        return("LOAD DATA LOCAL INFILE '" + self.path.replace("\\", "/") + "' " +
+               (self.duplicates + " " if self.duplicates is not None else "") +
+               "INTO TABLE " + self.table + " " +
+               "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' " +
+               "(" + ", ".join(self.columns) + ")")
+
+    def format_value(self, value):
+        """
+        Formats a single field for the staging file. Missing values are written as \\N, which
+        LOAD DATA reads as NULL, and backslashes, tabs and line breaks are escaped so LOAD DATA
+        does not read them as escapes or field and line separators.
+
+        Parameters:
+            value (object): the field value
+
+        Returns:
+            field (string): the formatted field
+
+        """
+        if value is None:
+            return("\\N")
+        return(super().format_value(value).replace("\\", "\\\\").replace("\t", "\\t")
+               .replace("\n", "\\n").replace("\r", "\\r"))
+
+    def write_batch(self, rows):
+        """
+        Appends a batch of rows to the staging file, loading the file into the table once it
+        holds a full chunk
+
+        Parameters:
+            rows (List<Tuple>): the rows to stage
+
+        Returns:
+            None
+
+        """
+        stage_start = time.perf_counter()
+        if self.out_file is None:
+            self.path = self.create_staging_path()
+            self.out_file = open(self.path, "w")
+        super().write_batch(rows)
+        self.stage_time += time.perf_counter() - stage_start
+
+        self.rows_staged += len(rows)
+        self.chunk_rows_staged += len(rows)
+        if self.chunk_rows_staged >= self.chunk_rows:
+            self.load_chunk()
+        return
+
+    def load_chunk(self):
+        """
+        Loads the staged rows into the table and deletes the staging file. Unique and foreign
+        key checks are turned off for the load, and turned back on even if the load fails.
+
+        Returns:
+            None
+
+        """
+        if self.out_file is None:
+            return
+
+        stage_start = time.perf_counter()
+        self.out_file.close()
+        self.out_file = None
+        self.stage_time += time.perf_counter() - stage_start
+
+        try:
+            if self.chunk_rows_staged > 0:
+                self.disable_checks()
+                try:
+                    load_start = time.perf_counter()
+                    self.mycursor.execute(self.get_load_sql())
+                    self.load_time += time.perf_counter() - load_start
+                finally:
+                    self.enable_checks()
+
+                self.rows_loaded += self.chunk_rows_staged
+                self.chunks_loaded += 1
+        finally:
+            os.remove(self.path)
+            self.chunk_rows_staged = 0
+        return
+
+    def disable_checks(self):
+        """
+        Turns off the session's unique and foreign key checks for a load. Secondary indexes are
+        not disabled, as InnoDB ignores DISABLE KEYS; the report indexes are instead built once
+        the tables are loaded.
+
+        Returns:
+            None
+
+        """
+        self.mycursor.execute('''SET unique_checks = 0''')
+        self.mycursor.execute('''SET foreign_key_checks = 0''')
+        return
+
+    def enable_checks(self):
+        self.mycursor.execute('''SET unique_checks = 1''')
+        self.mycursor.execute('''SET foreign_key_checks = 1''')
+        return
+
+    def close(self):
+        """
+        Stages any remaining rows and loads the final chunk. The loader can still be used 
+        afterwards, starting a new staging file.
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        self.load_chunk()
+        return
+
+    def sync(self):
+        self.close()
+        return
+
+    def get_summary(self):
+        """
+        Summarizes the rows staged and loaded, and the throughput of each phase
+
+        Returns:
+            summary (Dict<string: float>): the sink summary, plus row counts, timings in seconds
+                                           and rows per second for the staging and loading phases
+
+        """
+        summary = super().get_summary()
+        summary.update({"rows_staged": self.rows_staged,
+                        "rows_loaded": self.rows_loaded,
+                        "chunks_loaded": self.chunks_loaded,
+                        "stage_time": self.stage_time,
+                        "load_time": self.load_time,
+                        "stage_rows_per_sec": self.rows_staged / self.stage_time if self.stage_time > 0 else 0.0,
+                        "load_rows_per_sec": self.rows_loaded / self.load_time if self.load_time > 0 else 0.0
+                        })
+        self.summary = summary
+        return(self.summary)
+
+    def get_summary_string(self):
+        """
+        Formats the loader summary for printing
+
+        Returns:
+            summary_string (string): a single line description of each phase of the load
+
+        """
+        summary = self.get_summary()
+        self.summary_string = (self.table + ": staged " + str(summary["rows_staged"]) + " rows in " +
+                               str(round(summary["stage_time"], 3)) + "s (" +
+                               str(int(summary["stage_rows_per_sec"])) + " rows/s), loaded " +
+                               str(summary["rows_loaded"]) + " rows in " +
+                               str(summary["chunks_loaded"]) + " chunks in " +
+                               str(round(summary["load_time"], 3)) + "s (" +
+                               str(int(summary["load_rows_per_sec"])) + " rows/s)")
+        return(self.summary_string)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+import glob
+import shutil
+import pickle
+from modules.daily_metrics import rewind_daily_metrics
+from modules.initiate_tables import get_run_id
+
+class Checkpointer(object):
+    """
+    Periodically saves the full simulator state to a binary file, paired with a database commit,
+    so that a long simulation that dies part way through can resume from the last checkpoint
+
+    """
+    def __init__(self, path, mydb, interval_days = 30):
+        """
+        Initialize a Checkpointer object
+
+        Parameters:
+            path (string): the file the checkpoint is saved to
+            mydb (MySQL Connection): the database connection committed alongside each checkpoint
+            interval_days (int): the number of simulated days between checkpoints
+
+        """
+        self.path = path
+        self.mydb = mydb
+        self.interval_days = interval_days
+        self.run_id = None
+
+    def is_due(self, day_counter):
+        return(day_counter % self.interval_days == 0)
+
+    def start_run(self, mycursor):
+        """
+        Removes any checkpoint left by an earlier run, and records the run id of the database,
+        for a run that has just initiated the tables
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+        Returns:
+            None
+
+        """
+        for path in [self.path, self.path + ".tmp"]:
+            if os.path.exists(path):
+                os.remove(path)
+        for snapshot_dir in glob.glob(self.get_snapshot_dir("*")):
+            shutil.rmtree(snapshot_dir)
+        self.run_id = get_run_id(mycursor)
+        return
+
+    def save(self, state):
+        """
+        Commits the database and saves the simulator state. The state is written to a temporary
+        file first and only moved into place after the commit succeeds, so the checkpoint file
+        never runs ahead of the database. Disk-backed customer stores are snapshotted to a
+        directory of their own for each checkpoint, and earlier snapshots are only removed once
+        the new checkpoint file is in place.
+
+        Parameters:
+            state (Dict<string: object>): the simulator state, as returned by EventsTable.get_state
+
+        Returns:
+            None
+
+        """
+        snapshot_dir = self.get_snapshot_dir(state["day_counter"])
+        state["customers"].checkpoint(snapshot_dir)
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as checkpoint_file:
+            # The run id comes first, so a checkpoint of another run is refused before its state is read
+            pickle.dump(self.run_id, checkpoint_file, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(state, checkpoint_file, protocol = pickle.HIGHEST_PROTOCOL)
+
+        self.mydb.commit()
+        os.replace(temp_path, self.path)
+
+        for old_snapshot_dir in glob.glob(self.get_snapshot_dir("*")):
+            if old_snapshot_dir != snapshot_dir:
+                shutil.rmtree(old_snapshot_dir)
+        return
+
+    def get_snapshot_dir(self, day_counter):
+        return(self.path + "_customers_" + str(day_counter))
+
+    def load(self, mycursor):
+        """
+        Loads the last saved simulator state. If the run died after a commit but before its
+        checkpoint file was saved, the rows written after the checkpoint are removed so the
+        database matches the checkpoint again, and the daily_metrics rollup is rewound to match.
+        A checkpoint saved by a run on a different database, or on a database without a run id,
+        is not loaded.
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+        Returns:
+            state (Dict<string: object>): the simulator state, or None if no checkpoint of this
+                                          database exists
+
+        """
+        self.run_id = get_run_id(mycursor)
+        if not os.path.exists(self.path):
+            return(None)
+
+        with open(self.path, "rb") as checkpoint_file:
+            checkpoint_run_id = pickle.load(checkpoint_file)
+            if self.run_id is None or checkpoint_run_id != self.run_id:
+                return(None)
+            state = pickle.load(checkpoint_file)
+
+        mycursor.execute('''DELETE FROM events WHERE event_date >= %s''', (state["date"],))
+        mycursor.execute('''DELETE FROM customers WHERE customer_id >= %s''',
+                         (state["customer_id_allocation"],))
+        rewind_daily_metrics(mycursor, state["date"])
+        self.mydb.commit()
+        return(state)
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import numpy as np
+from datetime import datetime
+from classes.event_buffer_class import EventBuffer
+from classes.storage_backend_class import get_upsert_sql
+
+# Columns of the customers table, in the order of the exported customer rows
+CUSTOMER_COLUMNS = ["customer_id", "customer_first_name", "customer_last_name", "customer_email",
+                    "customer_phone", "first_purchase_date", "last_purchase_date", "shoe_club_id",
+                    "shoe_club_signup_date", "shoe_club_status"]
+
+# Base query to add customers to the MySQL table
+CUSTOMER_INSERT_SQL = '''INSERT INTO customers (customer_id, customer_first_name, customer_last_name,
+                         customer_email, customer_phone, first_purchase_date, last_purchase_date,
+                         shoe_club_id, shoe_club_signup_date, shoe_club_status) VALUES (%s, %s, %s,
+                         %s, %s, %s, %s, %s, %s, %s)'''
+
+def get_customer_upsert_sql(dialect = "mysql"):
+    # Query to update the rows of customers already written, in place
+    return(get_upsert_sql(dialect, "customers", CUSTOMER_COLUMNS, ["customer_id"]))
+
+# Attributes held for each customer in the store, and their array types
+STORE_COLUMNS = {"customer_id": np.int64,
+                 "first_name_code": np.int32,
+                 "last_name_code": np.int32,
+                 "phone_num": np.int64,
+                 "first_purchase_date": np.int32,
+                 "last_purchase_date": np.int32,
+                 "shoe_club_id": np.int16,
+                 "shoe_club_signup_date": np.int32,
+                 "shoe_club_status": np.bool_,
+                 "modified": np.bool_
+                 }
+
+# Sentinel signup date used for customers who have never joined the shoe club
+NO_SIGNUP_DATE = datetime.strptime("9999-01-01", "%Y-%m-%d")
+
+def date_to_day_number(date):
+    """
+    Converts a date to the number of days since 1970-01-01, the representation used for dates
+    in the customer store
+
+    Parameters:
+        date (datetime): the date to convert
+
+    Returns:
+        day_number (int): the number of days since 1970-01-01
+
+    """
+    return(int(np.datetime64(date, "D").astype(np.int64)))
+
+class CustomerStore(object):
+    """
+    A columnar store of Tim's Shoes customers, holding one NumPy array per customer attribute.
+    Customers are addressed by their index in the store, in the order they were added.
+
+    """
+    def __init__(self, initial_capacity = 1024):
+        """
+        Initialize a CustomerStore object
+
+        Parameters:
+            initial_capacity (int): the number of customers to allocate space for up front
+
+        """
+        self.num_customers = 0
+        self.capacity = 0
+
+        # Customers before this index have been written to the database at least once
+        self.num_logged = 0
+
+        # Names are interned, so each customer only stores an index into the name lists
+        self.first_names = []
+        self.last_names = []
+        self.first_name_codes = {}
+        self.last_name_codes = {}
+
+        self.columns = STORE_COLUMNS
+        for column, dtype in self.columns.items():
+            setattr(self, column, np.zeros(0, dtype = dtype))
+        self.grow(initial_capacity)
+
+    def __len__(self):
+        return(self.num_customers)
+
+    def __getstate__(self):
+        # Only pickle the filled part of each column, so checkpoints hold no spare capacity
+        state = self.__dict__.copy()
+        for column in self.columns:
+            state[column] = state[column][:self.num_customers].copy()
+        state["capacity"] = self.num_customers
+        return(state)
+
+    def checkpoint(self, snapshot_dir):
+        # The in-memory store is pickled with its columns; disk-backed stores snapshot them here
+        return
+
+    def grow(self, min_capacity):
+        """
+        Reallocates the column arrays so they can hold at least min_capacity customers
+
+        Parameters:
+            min_capacity (int): the number of customers the store must be able to hold
+
+        Returns:
+            None
+
+        """
+        new_capacity = max(min_capacity, 2*self.capacity)
+        for column, dtype in self.columns.items():
+            new_array = np.zeros(new_capacity, dtype = dtype)
+            new_array[:self.num_customers] = getattr(self, column)[:self.num_customers]
+            setattr(self, column, new_array)
+        self.capacity = new_capacity
+        return
+
+    def enforce_memory_budget(self):
+        # The in-memory store has no memory budget; disk-backed stores release memory here
+        return
+
+    def intern_names(self, names, name_list, name_codes):
+        """
+        Looks up the codes for a list of names, adding any unseen names to the name list
+
+        Parameters:
+            names (List<string>): the names to encode
+            name_list (List<string>): the list of known names, indexed by code
+            name_codes (Dict<string: int>): the code for each known name
+
+        Returns:
+            codes (List<int>): the code for each name
+
+        """
+        codes = []
+        for name in names:
+            code = name_codes.get(name)
+            if code is None:
+                code = len(name_list)
+                name_codes[name] = code
+                name_list.append(name)
+            codes.append(code)
+        return(codes)
+
+    def add_customers(self, customer_ids, first_purchase_date, first_names, last_names, phone_nums):
+        """
+        Adds a batch of new customers, all making their first purchase on the same day
+
+        Parameters:
+            customer_ids (Array<int>): a unique id number for each customer
+            first_purchase_date (datetime): the date the customers first made a purchase
+            first_names (List<string>): the customers' first names
+            last_names (List<string>): the customers' last names
+            phone_nums (Array<int>): the customers' ten digit phone numbers
+
+        Returns:
+            indexes (Array<int>): the store indexes of the new customers
+
+        """
+        num_new = len(customer_ids)
+        if self.num_customers + num_new > self.capacity:
+            self.grow(self.num_customers + num_new)
+
+        indexes = np.arange(self.num_customers, self.num_customers + num_new)
+        purchase_day = date_to_day_number(first_purchase_date)
+
+        self.customer_id[indexes] = customer_ids
+        self.first_name_code[indexes] = self.intern_names(first_names, self.first_names,
+                                                          self.first_name_codes)
+        self.last_name_code[indexes] = self.intern_names(last_names, self.last_names,
+                                                         self.last_name_codes)
+        self.phone_num[indexes] = phone_nums
+        self.first_purchase_date[indexes] = purchase_day
+        self.last_purchase_date[indexes] = purchase_day
+        self.shoe_club_id[indexes] = -1
+        self.shoe_club_signup_date[indexes] = date_to_day_number(NO_SIGNUP_DATE)
+        self.shoe_club_status[indexes] = False
+        self.modified[indexes] = True
+
+        self.num_customers += num_new
+        return(indexes)
+
+    def add_customer_rows(self, rows):
+        """
+        Adds existing customers read back from the customers table, in its column order. Loaded
+        customers are not marked as modified, and count as already written.
+
+        Parameters:
+            rows (List<Tuple>): customers table rows, in increasing customer id order
+
+        Returns:
+            indexes (Array<int>): the store indexes of the loaded customers
+
+        """
+        num_new = len(rows)
+        if self.num_customers + num_new > self.capacity:
+            self.grow(self.num_customers + num_new)
+        indexes = np.arange(self.num_customers, self.num_customers + num_new)
+
+        (customer_ids, first_names, last_names, emails, phone_nums, first_purchase_dates, 
+         last_purchase_dates, shoe_club_ids, shoe_club_signup_dates, statuses) = zip(*rows)
+
+        self.customer_id[indexes] = customer_ids
+        self.first_name_code[indexes] = self.intern_names(first_names, self.first_names,
+                                                          self.first_name_codes)
+        self.last_name_code[indexes] = self.intern_names(last_names, self.last_names,
+                                                         self.last_name_codes)
+        self.phone_num[indexes] = [int(phone) for phone in phone_nums]
+        self.first_purchase_date[indexes] = [date_to_day_number(d) for d in first_purchase_dates]
+        self.last_purchase_date[indexes] = [date_to_day_number(d) for d in last_purchase_dates]
+        self.shoe_club_id[indexes] = [int(club_id[len(last):]) if club_id != "NULL" else -1
+                                      for club_id, last in zip(shoe_club_ids, last_names)]
+        self.shoe_club_signup_date[indexes] = [date_to_day_number(d) for d in shoe_club_signup_dates]
+        self.shoe_club_status[indexes] = [status == "Active" for status in statuses]
+        self.modified[indexes] = False
+
+        self.num_customers += num_new
+        self.num_logged = self.num_customers
+        return(indexes)
+
+    def get_indexes(self, customer_ids):
+        """
+        Finds the store indexes of customers from their customer ids. Customer ids are allocated
+        in increasing order, so the id column is sorted.
+
+        Parameters:
+            customer_ids (Array<int>): the ids of the customers to look up
+
+        Returns:
+            indexes (Array<int>): the store index of each customer
+
+        """
+        return(np.searchsorted(self.customer_id[:self.num_customers], customer_ids))
+
+    def get_customer_ids(self, indexes):
+        return(self.customer_id[indexes])
+
+    def is_shoe_club_member(self, indexes):
+        return(self.shoe_club_status[indexes])
+
+    def set_last_purchase_date(self, indexes, last_purchase_date):
+        self.last_purchase_date[indexes] = date_to_day_number(last_purchase_date)
+        self.modified[indexes] = True
+        return
+
+    def set_shoe_club_id(self, indexes, shoe_club_id):
+        self.shoe_club_id[indexes] = shoe_club_id
+        self.modified[indexes] = True
+        return
+
+    def set_shoe_club_signup_date(self, indexes, shoe_club_signup_date):
+        self.shoe_club_signup_date[indexes] = date_to_day_number(shoe_club_signup_date)
+        self.modified[indexes] = True
+        return
+
+    def set_shoe_club_status(self, indexes, shoe_club_status):
+        self.shoe_club_status[indexes] = shoe_club_status
+        self.modified[indexes] = True
+        return
+
+    def export_rows(self, rows_slice = None):
+        """
+        Builds customers table rows for a selection of customers in the store
+
+        Parameters:
+            rows_slice (slice or Array<int>): the store indexes to export, defaults to every customer
+
+        Returns:
+            rows (List<Tuple>): one tuple per customer, in the column order of the customers table
+
+        """
+        if rows_slice is None:
+            rows_slice = slice(0, self.num_customers)
+
+        first_names = [self.first_names[code] for code in self.first_name_code[rows_slice].tolist()]
+        last_names = [self.last_names[code] for code in self.last_name_code[rows_slice].tolist()]
+        emails = [first + "." + last + "@gmail.com" for first, last in zip(first_names, last_names)]
+        phone_nums = [str(phone).zfill(10) for phone in self.phone_num[rows_slice].tolist()]
+        shoe_club_ids = [last + str(club_id) if club_id >= 0 else "NULL"
+                         for last, club_id in zip(last_names, self.shoe_club_id[rows_slice].tolist())]
+        statuses = np.where(self.shoe_club_status[rows_slice], "Active", "Inactive").tolist()
+
+        rows = list(zip(self.customer_id[rows_slice].tolist(),
+                        first_names,
+                        last_names,
+                        emails,
+                        phone_nums,
+                        self.to_dates(self.first_purchase_date[rows_slice]),
+                        self.to_dates(self.last_purchase_date[rows_slice]),
+                        shoe_club_ids,
+                        self.to_dates(self.shoe_club_signup_date[rows_slice]),
+                        statuses))
+        return(rows)
+
+    def to_dates(self, day_numbers):
+        """
+        Converts an array of day numbers back into dates
+
+        Parameters:
+            day_numbers (Array<int>): days since 1970-01-01
+
+        Returns:
+            dates (List<date>): the corresponding dates
+
+        """
+        return(day_numbers.astype("datetime64[D]").astype(object).tolist())
+
+    def log_customers_to_db(self, mycursor, chunk_size = 5000, upsert = False, sink = None,
+                            upsert_sink = None, dialect = "mysql"):
+        """
+        Writes the customers in the store to the Customer MySQL table, in chunks of multi-row 
+        inserts. By default every customer is inserted; in upsert mode only new or modified 
+        customers are written. Customers never written before are inserted, while modified 
+        customers already in the table are updated in place through a separate upsert. If a sink
+        is given, such as a BulkLoader, the inserted rows are written through it instead. Without
+        a sink, a chunk that fails is retried row by row and the failed customers are counted in
+        the returned writer's summary. The store is scanned one chunk at a time, so no array the 
+        size of the whole store is built.
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+            chunk_size (int): the number of customers written per insert
+            upsert (boolean): true to write only new or modified customers, updating existing rows
+            sink (EventSink): optional sink to insert the customers through, synced once written
+            upsert_sink (EventSink): optional sink to update existing customers through. Defaults
+                                     to the dialect's upsert through mycursor, or to the insert 
+                                     sink without a database, which must then replace rows.
+            dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+
+        Returns:
+            customer_sink (EventSink): the sink the customers were inserted through, holding the
+                                       counts of rows written and failed
+
+        """
+        if sink is None:
+            sink = EventBuffer(mycursor, CUSTOMER_INSERT_SQL, chunk_size, isolate_errors = True)
+        if upsert == True and upsert_sink is None:
+            if mycursor is not None:
+                upsert_sink = EventBuffer(mycursor, get_customer_upsert_sql(dialect), chunk_size,
+                                          isolate_errors = True)
+            else:
+                upsert_sink = sink
+
+        for start in range(0, self.num_customers, chunk_size):
+            chunk = slice(start, min(start + chunk_size, self.num_customers))
+            if upsert == False:
+                sink.add_rows(self.export_rows(chunk))
+                continue
+
+            chunk = np.flatnonzero(self.modified[chunk]) + start
+            new_chunk = chunk[chunk >= self.num_logged]
+            if len(new_chunk) > 0:
+                sink.add_rows(self.export_rows(new_chunk))
+            updated_chunk = chunk[chunk < self.num_logged]
+            if len(updated_chunk) > 0:
+                upsert_sink.add_rows(self.export_rows(updated_chunk))
+        sink.sync()
+        if upsert_sink is not None and upsert_sink is not sink:
+            upsert_sink.sync()
+        self.modified[:self.num_customers] = False
+        self.num_logged = self.num_customers
+        return(sink)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+from classes.event_sink_class import EventSink
+
+class EventBuffer(EventSink):
+    """
+    A buffer that collects event rows in memory and writes them to a MySQL table in batches,
+    rather than issuing one INSERT statement per event. Optionally, a batch that fails is
+    retried one row at a time, so that only the bad rows are lost and each one is reported.
+
+    """
+    def __init__(self, mycursor, sql, flush_size = 5000, time_column = None, isolate_errors = False):
+        """
+        Initialize an EventBuffer object
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+            sql (string): the parameterised INSERT statement used to write a single row
+            flush_size (int): the number of buffered rows that triggers an automatic flush
+            time_column (int): the position of a column holding seconds since midnight, to be
+                               written as HH:MM:SS
+            isolate_errors (boolean): true to retry a failed batch row by row, counting the rows 
+                                      that fail rather than raising
+
+        """
+        super().__init__(flush_size, time_column)
+        self.mycursor = mycursor
+        self.sql = sql
+        self.isolate_errors = isolate_errors
+
+    def write_batch(self, rows):
+        """
+        Writes a batch of rows to the database. The MySQL connector rewrites executemany INSERTs
+        into a single multi-row VALUES statement, so each batch is one round trip. When isolating 
+        errors, the batch runs inside a savepoint so a failure leaves none of its rows behind 
+        before they are retried individually.
+
+        Parameters:
+            rows (List<Tuple>): the rows to write
+
+        Returns:
+            None
+
+        """
+        if self.isolate_errors == False:
+            self.mycursor.executemany(self.sql, rows)
+            return
+
+        self.mycursor.execute("SAVEPOINT event_buffer_batch")
+        try:
+            self.mycursor.executemany(self.sql, rows)
+        except Exception:
+            self.mycursor.execute("ROLLBACK TO SAVEPOINT event_buffer_batch")
+            self.write_rows_individually(rows)
+        self.mycursor.execute("RELEASE SAVEPOINT event_buffer_batch")
+        return
+
+    def write_rows_individually(self, rows):
+        """
+        Writes rows one statement at a time, recording each row that fails
+
+        Parameters:
+            rows (List<Tuple>): the rows to write
+
+        Returns:
+            None
+
+        """
+        for row in rows:
+            try:
+                self.mycursor.execute(self.sql, row)
+            except Exception as error:
+                self.record_failure(row, error)
+        return
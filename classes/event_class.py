@@ -4,31 +4,132 @@
 @author: timpr
 """
 from datetime import datetime, timedelta
+import numpy as np
 import random as rand
-from classes.customer_class import Customer
+from classes.customer_store_class import CustomerStore, CUSTOMER_INSERT_SQL, get_customer_upsert_sql
+from classes.name_pool_class import get_name_pool
+from classes.event_buffer_class import EventBuffer
+from classes.event_encoder_class import EventEncoder, COMPACT_EVENT_INSERT_SQL
+from classes.item_cache_class import get_item_cache
+
+# Column order of the event records produced by the simulator
+EVENT_COLUMNS = ["event_date", "event_time", "event_type", "customer_id", "product_id", 
+                 "device_type", "device_info", "order_number", "ab_test_notes"]
+
+# Position of the event time, held as seconds since midnight until a sink writes it out
+EVENT_TIME_COLUMN = EVENT_COLUMNS.index("event_time")
+
+# Number of seconds in a day, the range of event times
+SECONDS_PER_DAY = 24*60*60
+
+# Base query to add events to the MySQL table
+EVENT_INSERT_SQL = '''INSERT INTO events (event_date, event_time, event_type, customer_id,
+                    product_id, device_type, device_info, order_number, ab_test_notes) 
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+
+# Each day up to BASE_DAILY_CUSTOMERS new customers, plus one for every CUSTOMER_GROWTH_DIVISOR 
+# existing customers, make a first purchase, and up to RETURNING_FRACTION of the existing 
+# customers return. The base traffic is multiplied by the scale factor.
+BASE_DAILY_CUSTOMERS = 10
+CUSTOMER_GROWTH_DIVISOR = 200
+RETURNING_FRACTION = 0.05
+
+# Conversion rates that an A/B test's test group may be given
+TEST_CONVERSION_PROBS = [0.67,0.68,0.69,0.70,0.71,0.72,0.73,0.75,0.80]
+
+# Shoe club join rates that a growth campaign may achieve
+CAMPAIGN_JOIN_PROBS = [0.25,0.26,0.30,0.35,0.40]
 
 class EventsTable(object):
     """
     An event table class, corresponding to a MySQL table used to store events on Tim's Shoes website
     
     """
-    def __init__(self, mycursor, start_date):
+    def __init__(self, mycursor, start_date, flush_size = 5000, seed = None, shard_index = 0, 
+                 num_shards = 1, item_ids = None, end_date = None, resume_state = None, 
+                 checkpointer = None, sink = None, run = True, customer_sink = None, 
+                 customer_stream_days = None, stats = None, scale_factor = 1, customer_store = None,
+                 compact_schema = False, customer_upsert_sink = None, dialect = "mysql"):
         """
         Initialize an EventsTable object 
         
         Parameters:
             mycursor (MySQL Cursor): a cursor to perform database operations from Python
             start_date (datetime): the date the website went live
+            flush_size (int): the number of buffered events that triggers a batch write to the database
+            seed (int): an optional seed making the simulation reproducible
+            shard_index (int): the index of the customer population shard this table simulates
+            num_shards (int): the number of shards the customer population is split across
+            item_ids (List<Tuple<int>>): the ids of items in stock, queried from the database if None
+            end_date (datetime): the date to simulate up to, defaults to today
+            resume_state (Dict<string: object>): simulator state to continue an earlier run from,
+                                                 in which case start_date is ignored
+            checkpointer (Checkpointer): optionally saves the simulator state every few days
+            sink (EventSink): where simulated events are written, defaults to batched inserts 
+                              into the events table through mycursor
+            run (boolean): true to run the whole simulation straight away, false to leave the 
+                           caller to consume iter_days or iter_events
+            customer_sink (EventSink): optional sink new customers are written through, such as a
+                                       BulkLoader, rather than inserted through mycursor
+            customer_stream_days (int): optionally write new and modified customers out every 
+                                        few simulated days, rather than all at the end of the run
+            stats (SimulationStats): optionally records phase timings, daily counters and sink
+                                     write latencies for the run
+            scale_factor (float): multiplies the base daily traffic, so the expected number of 
+                                  customers and events grows in proportion. Resumed runs must 
+                                  use the scale factor of the original run.
+            customer_store (CustomerStore): an empty store to hold the customers, such as a
+                                            MemmapCustomerStore to keep them on disk. Defaults
+                                            to an in-memory store.
+            compact_schema (boolean): true to write events to the compact events table, encoding
+                                      each day's events with an EventEncoder before they reach 
+                                      the sink. The sink must expect COMPACT_EVENT_COLUMNS.
+            customer_upsert_sink (EventSink): optional sink that customers already written are 
+                                              updated through when they change, defaulting to
+                                              the dialect's upsert through mycursor
+            dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
             
         """
         self.mycursor = mycursor
         self.date = start_date
-        self.end_date = datetime.today()
-        self.customer_list = []
+        self.end_date = end_date if end_date is not None else datetime.today()
+        self.customers = customer_store if customer_store is not None else CustomerStore()
         self.customer_id_allocation = 1
         self.camp_days_rem = 0
         
-        self.item_ids = self.get_item_ids()
+        # Each shard simulates an equal share of the new customer traffic
+        self.num_shards = num_shards
+        self.scale_factor = scale_factor
+        self.base_daily_customers = BASE_DAILY_CUSTOMERS*scale_factor / num_shards
+        
+        if seed is None:
+            self.shard_seed = None
+            self.state_rng = rand.Random()
+            self.rng = rand.Random()
+            self.name_rng = np.random.default_rng()
+            self.click_time_origin = datetime.today()
+        else:
+            # Site-wide conditions (A/B tests, bugs, campaigns) are drawn from a stream shared by 
+            # every shard, while customer behaviour is drawn from a stream unique to this shard. 
+            # New customers' names and contact details are drawn from a second per shard stream.
+            # Each simulator owns its generators, so the output does not depend on anything else
+            # in the process drawing from the global random module.
+            self.shard_seed = np.random.SeedSequence(seed, spawn_key = (shard_index,))
+            self.state_rng = rand.Random(seed)
+            self.rng = rand.Random(int(self.shard_seed.generate_state(1)[0]))
+            self.name_rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (shard_index, 1)))
+            self.click_time_origin = datetime.combine(start_date.date(), datetime.min.time())
+        self.click_time_origin_secs = (self.click_time_origin.hour*3600 + 
+                                       self.click_time_origin.minute*60 + 
+                                       self.click_time_origin.second)
+        
+        # Name distributions are loaded once per process and sampled in bulk for each day
+        self.name_pool = get_name_pool()
+        
+        if item_ids is None:
+            self.item_ids = self.get_item_ids()
+        else:
+            self.item_ids = item_ids
         
         self.device_dict = {"computer" : ["dell", "hp", "apple", "lenovo", 
                                           "microsoft", "asus", "asus", "other"],
@@ -40,104 +141,425 @@ class EventsTable(object):
         self.shoe_club_join_prob = 0.25
         self.control_conversion_prob = 0.7
                 
-        # Base query to add events to the MySQL table
-        self.event_sql = '''INSERT INTO events (event_date, event_time, event_type, customer_id,
-                    product_id, device_type, device_info, order_number, ab_test_notes) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+        self.event_sql = EVENT_INSERT_SQL
+        self.event_encoder = None
+        if compact_schema == True:
+            self.event_sql = COMPACT_EVENT_INSERT_SQL
+            self.event_encoder = EventEncoder()
+        
+        # Buffer events so they are written in batches rather than one round trip per event
+        if sink is None:
+            self.event_sink = EventBuffer(self.mycursor, self.event_sql, flush_size, EVENT_TIME_COLUMN)
+        else:
+            self.event_sink = sink
        
         self.day_counter = 0
-        # Randomly create events for each day
+        self.wrapped_purchases = 0
+        self.checkpointer = checkpointer
+        self.customer_stream_days = customer_stream_days
+        self.resumed = resume_state is not None
+        
+        # Write customers in chunks, retrying failed chunks row by row so bad rows are counted.
+        # Customers written before the end of the run are updated in place when they change, 
+        # through a separate upsert, while new customers are always plain inserts.
+        self.customer_upsert = (self.resumed or checkpointer is not None or 
+                                customer_stream_days is not None)
+        if customer_sink is None and self.mycursor is not None:
+            self.customer_sink = EventBuffer(self.mycursor, CUSTOMER_INSERT_SQL, flush_size, 
+                                             isolate_errors = True)
+        else:
+            self.customer_sink = customer_sink
+        if customer_upsert_sink is None and self.mycursor is not None and self.customer_upsert:
+            self.customer_upsert_sink = EventBuffer(self.mycursor, get_customer_upsert_sql(dialect), 
+                                                    flush_size, isolate_errors = True)
+        else:
+            self.customer_upsert_sink = customer_upsert_sink
+        
+        self.stats = stats
+        if self.stats is not None:
+            self.stats.add_sink("events", self.event_sink)
+            if self.customer_sink is not None:
+                self.stats.add_sink("customers", self.customer_sink)
+            if self.customer_upsert_sink is not None:
+                self.stats.add_sink("customer_updates", self.customer_upsert_sink)
+        
+        self.resume_rng_state = None
+        if self.resumed:
+            self.restore_state(resume_state)
+        if run == True:
+            self.run_simulation()
+    
+    def get_state(self):
+        """
+        Captures the simulator state at the end of the current day, including the random 
+        generator states, in the form accepted by restore_state
+        
+        Returns:
+            state (Dict<string: object>): the simulator state
+        
+        """
+        self.state = {"date": self.date,
+                      "day_counter": self.day_counter,
+                      "customers": self.customers,
+                      "customer_id_allocation": self.customer_id_allocation,
+                      "test_conversion_prob": self.test_conversion_prob,
+                      "test_label": self.test_label,
+                      "shoe_club_join_prob": self.shoe_club_join_prob,
+                      "camp_days_rem": self.camp_days_rem,
+                      "rng_state": self.get_rng_state()
+                      }
+        return(self.state)
+    
+    def get_rng_state(self):
+        """
+        Captures the state of the random generators used by the simulation
+        
+        Returns:
+            rng_state (Dict<string: object>): the state of each random generator
+        
+        """
+        self.rng_state = {"customers": self.rng.getstate(),
+                          "site": self.state_rng.getstate(),
+                          "names": self.name_rng.bit_generator.state}
+        return(self.rng_state)
+    
+    def set_rng_state(self, rng_state):
+        """
+        Restores the random generators used by the simulation to a captured state
+        
+        Parameters:
+            rng_state (Dict<string: object>): the state of each random generator
+        
+        Returns:
+            None
+        
+        """
+        self.rng.setstate(rng_state["customers"])
+        self.state_rng.setstate(rng_state["site"])
+        self.name_rng.bit_generator.state = rng_state["names"]
+        return
+    
+    def save_checkpoint(self):
+        """
+        Writes out the buffered events and any new or modified customers, then commits them 
+        alongside a checkpoint of the simulator state
+        
+        Returns:
+            None
+        
+        """
+        self.event_sink.sync()
+        self.customers.log_customers_to_db(self.mycursor, upsert = True, sink = self.customer_sink,
+                                           upsert_sink = self.customer_upsert_sink)
+        self.checkpointer.save(self.get_state())
+        return
+    
+    def restore_state(self, state):
+        """
+        Restores the simulator to the end of a day simulated by an earlier run, so that the 
+        simulation continues from the following day
+        
+        Parameters:
+            state (Dict<string: object>): the next date to simulate, the number of days already 
+                                          simulated, the customer store, the next customer id and 
+                                          the active A/B test and shoe club campaign settings
+        
+        Returns:
+            None
+        
+        """
+        self.date = state["date"]
+        self.day_counter = state["day_counter"]
+        self.customers = state["customers"]
+        self.customer_id_allocation = state["customer_id_allocation"]
+        self.test_conversion_prob = state["test_conversion_prob"]
+        self.test_label = state["test_label"]
+        self.shoe_club_join_prob = state["shoe_club_join_prob"]
+        self.camp_days_rem = state["camp_days_rem"]
+        
+        # Random generator states are only available when resuming from a checkpoint
+        self.resume_rng_state = state.get("rng_state")
+        return
+    
+    def prepare_simulation(self):
+        """
+        Sets up the simulator before the first simulated day, restoring the random generator 
+        states when resuming from a checkpoint
+        
+        Returns:
+            None
+        
+        """
+        if self.resume_rng_state is not None:
+            self.set_rng_state(self.resume_rng_state)
+        return
+    
+    def iter_days(self):
+        """
+        Lazily simulates each day from the start date up to the end date. Only one day's events 
+        are held in memory at a time.
+        
+        Returns:
+            day_events (Generator<Tuple<datetime, List<Tuple>>>): the date and event records of 
+                                                               each simulated day, in EVENT_COLUMNS order,
+                                                               with event times in seconds since midnight
+        
+        """
+        self.prepare_simulation()
+        
         while self.date < self.end_date:
             self.day_counter += 1
-           
-            # Run a new A/B test every 2 weeks
-            if (self.day_counter - 1) % 14 == 0:
-                self.test_conversion_prob, self.test_label = self.initiate_ab_test(self.day_counter)
+            self.day_events = []
+            self.num_returning_customers = 0
+            self.bug_suppressed_clicks = 0
             
-            # Instigate bugs on randomly selected days
-            self.impacted_device_type, self.impacted_device_info = self.instigate_bug()
+            if self.stats is None:
+                self.update_daily_state()
+                self.simulate_day()
+            else:
+                wrapped_purchases = self.wrapped_purchases
+                self.stats.start_phase("daily_state")
+                self.update_daily_state()
+                self.simulate_day()
+                self.stats.stop_phase()
+                self.record_day_stats(self.wrapped_purchases - wrapped_purchases)
             
-            # Run an shoe club growth campaign once per year
-            if self.day_counter % 365 == 0:
-                self.shoe_club_join_prob, self.camp_days_rem = self.initiate_shoe_club_growth_campaign()
-            elif self.camp_days_rem > 1:
-                self.camp_days_rem -= 1
-            elif self.camp_days_rem == 1:
-               self.shoe_club_join_prob = 0.25 
-               self.camp_days_rem -= 1
-              
-            # Randomly generate new customers making their first purchase on the day
-            self.num_current_customers = len(self.customer_list)
-            self.new_customers = self.generate_new_customers(self.num_current_customers, self.date)
+            # Disk-backed customer stores release paged in customers once over their memory budget
+            self.customers.enforce_memory_budget()
+            
+            event_date = self.date
+            self.date += timedelta(days = 1)
+            yield (event_date, self.day_events)
+    
+    def iter_events(self):
+        """
+        Lazily simulates events one at a time, from the start date up to the end date
+        
+        Returns:
+            events (Generator<Tuple>): event records, in EVENT_COLUMNS order
+        
+        """
+        for event_date, day_events in self.iter_days():
+            yield from day_events
+    
+    def run_simulation(self):
+        """
+        Randomly creates events for each day from the start date up to the end date, writing 
+        them to the event sink, then adds all the customer data to the database
+        
+        Returns:
+            None
+        
+        """
+        for event_date, day_events in self.iter_days():
+            self.start_stats_phase("event_writes")
+            if self.event_encoder is not None:
+                day_events = self.event_encoder.encode_rows(day_events)
+            self.event_sink.add_rows(day_events)
+            
+            # Write out the day's events at the day boundary
+            self.event_sink.flush()
+            
+            if self.checkpointer is not None and self.checkpointer.is_due(self.day_counter):
+                self.start_stats_phase("checkpoints")
+                self.save_checkpoint()
+            elif (self.customer_stream_days is not None and self.customer_sink is not None and
+                  self.day_counter % self.customer_stream_days == 0):
+                self.start_stats_phase("customer_writes")
+                self.customers.log_customers_to_db(self.mycursor, upsert = True, 
+                                                   sink = self.customer_sink,
+                                                   upsert_sink = self.customer_upsert_sink)
+            
+        # Write out any remaining buffered events
+        self.start_stats_phase("event_writes")
+        self.event_sink.close()
+        
+        self.start_stats_phase("customer_writes")
+        if self.mycursor is None:
+            # Without a database, customers are only written out if a customer sink is given, 
+            # otherwise they stay in the customer store
+            if self.customer_sink is not None:
+                self.customers.log_customers_to_db(None, upsert = self.customer_upsert,
+                                                   sink = self.customer_sink,
+                                                   upsert_sink = self.customer_upsert_sink)
+                self.customer_sink.close()
+            self.start_stats_phase(None)
+            return
+        
+        if self.checkpointer is not None:
+            # Checkpoint the final state, so a later run can extend the database from it
+            self.save_checkpoint()
+        else:
+            # Add the remaining customer data to the database, updating customers already written
+            self.customers.log_customers_to_db(self.mycursor, upsert = self.customer_upsert,
+                                               sink = self.customer_sink,
+                                               upsert_sink = self.customer_upsert_sink)
+        self.customer_sink.close()
+        if self.customer_upsert_sink is not None:
+            self.customer_upsert_sink.close()
+        self.start_stats_phase(None)
+        return
+    
+    def start_stats_phase(self, phase):
+        """
+        Starts timing a phase of the simulation if stats are being recorded
+        
+        Parameters:
+            phase (string): the phase name, or None to stop timing
+        
+        Returns:
+            None
+        
+        """
+        if self.stats is not None:
+            self.stats.start_phase(phase)
+        return
+    
+    def record_day_stats(self, wrapped_purchases):
+        """
+        Counts the current day's customers and events and records them in the stats
+        
+        Parameters:
+            wrapped_purchases (int): the number of the day's purchases that ran past midnight
+        
+        Returns:
+            None
+        
+        """
+        num_clickthroughs = sum(1 for event in self.day_events if event[2] == "clickthrough")
+        self.stats.record_day(self.date, {"new_customers": self.num_new_customers,
+                                          "returning_customers": self.num_returning_customers,
+                                          "clickthroughs": num_clickthroughs,
+                                          "purchases": len(self.day_events) - num_clickthroughs,
+                                          "bug_suppressed_clicks": self.bug_suppressed_clicks,
+                                          "wrapped_purchases": wrapped_purchases})
+        return
+    
+    def update_daily_state(self):
+        """
+        Updates the site-wide conditions for the current day: the active A/B test, any bugs 
+        affecting devices and the shoe club growth campaign
+        
+        Returns:
+            None
+        
+        """
+        # Run a new A/B test every 2 weeks
+        if (self.day_counter - 1) % 14 == 0:
+            self.test_conversion_prob, self.test_label = self.initiate_ab_test(self.day_counter)
+        
+        # Instigate bugs on randomly selected days
+        self.impacted_device_type, self.impacted_device_info = self.instigate_bug()
+        
+        # Run an shoe club growth campaign once per year
+        if self.day_counter % 365 == 0:
+            self.shoe_club_join_prob, self.camp_days_rem = self.initiate_shoe_club_growth_campaign()
+        elif self.camp_days_rem > 1:
+            self.camp_days_rem -= 1
+        elif self.camp_days_rem == 1:
+            self.shoe_club_join_prob = 0.25 
+            self.camp_days_rem -= 1
+        return
+    
+    def simulate_day(self):
+        """
+        Randomly generates the new customers and the clickthrough and purchase events for the 
+        current day, one customer at a time
+        
+        Returns:
+            None
+        
+        """
+        # Randomly generate new customers making their first purchase on the day
+        self.start_stats_phase("new_customers")
+        self.num_current_customers = len(self.customers)
+        self.new_customers = self.generate_new_customers(self.num_current_customers, self.date)
+        
+        self.start_stats_phase("event_draws")
+        for new_cust in self.new_customers:                
+            # Randomly simulate a view and event for the new customer
+            self.viewed_product = self.generate_viewed_product()
+            self.click_time = self.generate_click_time()
+            self.device_type, self.device_info = self.generate_user_device()                
+            self.purchase_time = self.generate_purchase_time(self.click_time)
+            
+            # Log events to the database
+            self.log_event_to_db(             
+                                self.date, 
+                                self.click_time, 
+                                "clickthrough",
+                                self.customer_id_allocation, 
+                                self.viewed_product, 
+                                self.device_type, 
+                                self.device_info, 
+                                "0", 
+                                ""
+                                )
+            self.log_event_to_db(
+                                self.date, 
+                                self.purchase_time, 
+                                "purchase",
+                                self.customer_id_allocation, 
+                                self.viewed_product, 
+                                self.device_type, 
+                                self.device_info, 
+                                "0", 
+                                ""
+                                )
+            
+            # Randomly select some new customers to sign up for the shoe club
+            if self.join_shoe_club(self.shoe_club_join_prob) == True:
+                self.allocate_shoe_club_membership(new_cust, self.date)
+            
+            # Increment id allocation to ensure each customer is assigned a unique id
+            self.customer_id_allocation += 1
             
-            for new_cust in self.new_customers:                
-                # Randomly simulate a view and event for the new customer
-                new_cust.set_customer_id(self.customer_id_allocation)
+        # Select a subset of the existing customers to view an item on the day
+        if(self.num_current_customers > 0):
+            self.ret_indexes = self.generate_returning_customer_index_list(self.num_current_customers)
+            self.num_returning_customers = len(self.ret_indexes)
+            
+            for i in self.ret_indexes:                     
+                # Simulate clickthroughs for each returning customer
                 self.viewed_product = self.generate_viewed_product()
                 self.click_time = self.generate_click_time()
-                self.device_type, self.device_info = self.generate_user_device()                
-                self.purchase_time = self.generate_purchase_time(self.click_time)
+                self.device_type, self.device_info = self.generate_user_device()
+                
+                # Check for bug impacts
+                if (self.device_type == self.impacted_device_type and 
+                    self.device_info in self.impacted_device_info):
+                    self.bug_suppressed_clicks += 1
+                    continue
+                
+                self.ret_cust_id = int(self.customers.get_customer_ids(i))
+                
+                # Select some customers to be in the A/B test control group for conversion
+                if self.assign_test_group() == True:
+                    self.ret_cust_return_prob = self.test_conversion_prob
+                    self.ret_cust_test_note = self.test_label + "_test"
+                else:
+                    self.ret_cust_return_prob = self.control_conversion_prob
+                    self.ret_cust_test_note = self.test_label + "_control"  
                 
-                # Log events to the database
                 self.log_event_to_db(             
                                     self.date, 
                                     self.click_time, 
                                     "clickthrough",
-                                    self.customer_id_allocation, 
+                                    self.ret_cust_id, 
                                     self.viewed_product, 
                                     self.device_type, 
                                     self.device_info, 
                                     "0", 
-                                    ""
+                                    self.ret_cust_test_note
                                     )
-                self.log_event_to_db(
-                                    self.date, 
-                                    self.purchase_time, 
-                                    "purchase",
-                                    self.customer_id_allocation, 
-                                    self.viewed_product, 
-                                    self.device_type, 
-                                    self.device_info, 
-                                    "0", 
-                                    ""
-                                    )
-                
-                # Randomly select some new customers to sign up for the shoe club
-                if self.join_shoe_club(self.shoe_club_join_prob) == True:
-                    new_cust = self.allocate_shoe_club_membership(new_cust, self.date)
-                
-                # Increment id allocation to ensure each customer is assigned a unique id
-                self.customer_id_allocation += 1
-                
-            # Select a subset of the existing customers to view an item on the day
-            if(self.num_current_customers > 0):
-                self.ret_indexes = self.generate_returning_customer_index_list(self.num_current_customers)
-                
-                for i in self.ret_indexes:                     
-                    # Simulate clickthroughs for each returning customer
-                    self.viewed_product = self.generate_viewed_product()
-                    self.click_time = self.generate_click_time()
-                    self.device_type, self.device_info = self.generate_user_device()
-                    
-                    # Check for bug impacts
-                    if (self.device_type == self.impacted_device_type and 
-                        self.device_info in self.impacted_device_info):
-                        continue
-                    
-                    self.ret_cust_id = self.customer_list[i].get_customer_id()
-                    
-                    # Select some customers to be in the A/B test control group for conversion
-                    if self.assign_test_group() == True:
-                        self.ret_cust_return_prob = self.test_conversion_prob
-                        self.ret_cust_test_note = self.test_label + "_test"
-                    else:
-                        self.ret_cust_return_prob = self.control_conversion_prob
-                        self.ret_cust_test_note = self.test_label + "_control"  
-                    
-                    self.log_event_to_db(             
+                                                             
+                if(self.makes_purchase(self.ret_cust_return_prob) == True):
+                    self.purchase_time = self.generate_purchase_time(self.click_time)    
+                    self.customers.set_last_purchase_date(i, self.date)
+                    self.log_event_to_db(
                                         self.date, 
-                                        self.click_time, 
-                                        "clickthrough",
+                                        self.purchase_time, 
+                                        "purchase",
                                         self.ret_cust_id, 
                                         self.viewed_product, 
                                         self.device_type, 
@@ -145,71 +567,53 @@ class EventsTable(object):
                                         "0", 
                                         self.ret_cust_test_note
                                         )
-                                                                 
-                    if(self.makes_purchase(self.ret_cust_return_prob) == True):
-                        self.purchase_time = self.generate_purchase_time(self.click_time)    
-                        self.customer_list[i].set_last_purchase_date(self.date)
-                        self.log_event_to_db(
-                                            self.date, 
-                                            self.purchase_time, 
-                                            "purchase",
-                                            self.ret_cust_id, 
-                                            self.viewed_product, 
-                                            self.device_type, 
-                                            self.device_info, 
-                                            "0", 
-                                            self.ret_cust_test_note
-                                            )
-                        
-                        # Randomly select some returning customers to sign up for or churn from the shoe club
-                        if self.customer_list[i].get_shoe_club_status() == "Inactive":
-                            if self.join_shoe_club(self.shoe_club_join_prob) == True:
-                                self.allocate_shoe_club_membership(self.customer_list[i], self.date)
-                        else:
-                            self.leave_shoe_club(self.customer_list[i])
-                        
-            self.customer_list.extend(self.daily_new_customers)
-            self.date += timedelta(days = 1)
-            
-        # Add all the customer data to the database
-        for cust in self.customer_list:
-            cust.log_customer_to_db(self.mycursor)
+                    
+                    # Randomly select some returning customers to sign up for or churn from the shoe club
+                    if self.customers.is_shoe_club_member(i) == False:
+                        if self.join_shoe_club(self.shoe_club_join_prob) == True:
+                            self.allocate_shoe_club_membership(i, self.date)
+                    else:
+                        self.leave_shoe_club(i)
+        return
     
     def get_item_ids(self):
         """
-        Create a list of all the ids of items available in the shop
+        Create a list of all the ids of items available in the shop, from the item cache so the
+        items table is only read once per process
 
         Returns:
-            item_ids (List<string>): a list of item ids
+            item_ids (List<Tuple<int>>): a list of item ids
 
         """
-        self.mycursor.execute('''SELECT 
-                                   item_id 
-                               FROM 
-                                   items 
-                               WHERE 
-                                   inventory > 0
-                            ''')
-        self.item_ids = self.mycursor.fetchall()
+        self.item_ids = get_item_cache(self.mycursor).get_item_ids()
         return(self.item_ids)
     
     def generate_new_customers(self, num_current_customers, current_date):
         """
-        Randomly creates a list of new customers, the length being proportionate to the number
-        of existing customers
+        Randomly creates new customers and adds them to the customer store, the number being 
+        proportionate to the number of existing customers. New customers are given consecutive
+        ids starting from the current id allocation.
         
         Parameters:
             num_current_customers (int): the current number of customers registered to the site 
             current_date (datetime): the current date
 
         Returns:
-            daily_new_customers (List<Customer>): a list of new customer objects
+            daily_new_customers (Array<int>): the customer store indexes of the new customers
 
         """
-        self.new_customers = int((10 + num_current_customers/200)*rand.random())
-        self.daily_new_customers = []
-        for i in range(self.new_customers):
-            self.daily_new_customers.append(Customer(current_date))
+        self.num_new_customers = int((self.base_daily_customers + 
+                                      num_current_customers/CUSTOMER_GROWTH_DIVISOR)*self.rng.random())
+        self.new_customer_ids = range(self.customer_id_allocation, 
+                                      self.customer_id_allocation + self.num_new_customers)
+        self.first_names, self.last_names, self.phone_nums = \
+            self.name_pool.sample_names_and_phones(self.num_new_customers, self.name_rng)
+        
+        self.daily_new_customers = self.customers.add_customers(list(self.new_customer_ids),
+                                                                current_date,
+                                                                self.first_names,
+                                                                self.last_names,
+                                                                self.phone_nums)
         return(self.daily_new_customers)
   
     def generate_viewed_product(self):
@@ -223,7 +627,7 @@ class EventsTable(object):
             viewed_product (string): the id of the viewed product
 
         """        
-        self.viewed_product = rand.choice(self.item_ids)[0]        
+        self.viewed_product = self.rng.choice(self.item_ids)[0]        
         return(self.viewed_product)
 
     def generate_user_device(self):
@@ -234,8 +638,8 @@ class EventsTable(object):
             device_type (string): the type of device the user is using e.g. computer 
             device_info (string): the make of the device e.g. Apple
         """
-        self.device_type = rand.choice(["computer", "phone", "tablet"])
-        self.device_info = rand.choice(self.device_dict[self.device_type])
+        self.device_type = self.rng.choice(["computer", "phone", "tablet"])
+        self.device_info = self.rng.choice(self.device_dict[self.device_type])
         return (self.device_type, self.device_info)
 
     def generate_click_time(self):
@@ -246,32 +650,34 @@ class EventsTable(object):
             None
             
         Returns:
-            event_time (string): An event time string in the form HH:MM:SS
+            event_time (int): the event time, in seconds since midnight
         
         """
         # Choose a random day time for a click event
-        self.event_datetime = datetime.today() + timedelta(hours = rand.randint(0,24)) +\
-                              timedelta(minutes = rand.randint(0,60))
-        self.event_time = datetime.strftime(self.event_datetime,"%H:%M:%S")
+        self.event_time = (self.click_time_origin_secs + 3600*self.rng.randint(0,24) + 
+                           60*self.rng.randint(0,60)) % SECONDS_PER_DAY
               
         return(self.event_time)        
         
     def generate_purchase_time(self, click_time):
         """
         Generates a random time for an item purchase, given the time the item was clicked into.
+        Purchases that run past midnight are counted, and keep the click's date with the time 
+        wrapped into the early hours.
         
         Parameters:
-            click_time (string): the time (HH:MM:SS) that the item was clicked into. 
+            click_time (int): the time that the item was clicked into, in seconds since midnight
                                 
         Returns:
-            event_time (string): An event time string in the form HH:MM:SS
+            event_time (int): the event time, in seconds since midnight
         
         """
         self.click_time = click_time
         # Add on a small amount of time after the corresponding click event
-        self.event_datetime = datetime.strptime(self.click_time, "%H:%M:%S") +\
-                              timedelta(minutes = rand.randint(0,60))
-        self.event_time = datetime.strftime(self.event_datetime, "%H:%M:%S")
+        self.event_time = self.click_time + 60*self.rng.randint(0,60)
+        if self.event_time >= SECONDS_PER_DAY:
+            self.wrapped_purchases += 1
+            self.event_time -= SECONDS_PER_DAY
                     
         return(self.event_time)
 
@@ -287,8 +693,8 @@ class EventsTable(object):
                                                     returning customers from the customer list
         
         """        
-        self.num_ret_custs = int(rand.random()*0.05*self.num_current_customers)
-        self.returning_customer_indexes = rand.sample(range(0, self.num_current_customers - 1), 
+        self.num_ret_custs = int(self.rng.random()*RETURNING_FRACTION*self.num_current_customers)
+        self.returning_customer_indexes = self.rng.sample(range(0, self.num_current_customers - 1), 
                                                       self.num_ret_custs)
     
         return (self.returning_customer_indexes)
@@ -304,11 +710,11 @@ class EventsTable(object):
                         order_number, 
                         ab_test_note):
         """
-        Inserts an event into the Events database table.
+        Adds an event to the current day's event records.
         
         Parameters:
             event_date (datetime): the day of the event
-            event_time (string): the time of the event in HH:MM:SS format
+            event_time (int): the time of the event, in seconds since midnight
             event_type (string): the type of event (clickthrough or purchase)
             customer_id (int): the unique id of the customer making the event
             product_id (int): the unique id of the product involved in the event
@@ -332,7 +738,7 @@ class EventsTable(object):
                       order_number, 
                       ab_test_note
                       )
-        self.mycursor.execute(self.event_sql, self.event) 
+        self.day_events.append(self.event)
         return
     
     def join_shoe_club(self, prob):
@@ -346,7 +752,7 @@ class EventsTable(object):
             joins_club (boolean): true if they join the club, false otherwise
         
         """
-        if rand.random() < prob:
+        if self.rng.random() < prob:
             return (True)
         else:
             return (False)
@@ -354,34 +760,34 @@ class EventsTable(object):
     def allocate_shoe_club_membership(self, customer, current_date):
         """
         Assign shoe club membership parameters to a customer joining the shoe club. Mutates
-        the input customer object
+        the customer store
         
         Parameters:
-            customer (Customer): a customer who is joining the shoe club
+            customer (int): the customer store index of a customer who is joining the shoe club
             date (datetime): the current date
         
         Returns:
             None
         
         """
-        customer.set_shoe_club_id = customer.get_last_name() + str(int(1000*rand.random()))
-        customer.set_shoe_club_signup_date(current_date)
-        customer.set_shoe_club_status("Active")
+        self.customers.set_shoe_club_id(customer, int(1000*self.rng.random()))
+        self.customers.set_shoe_club_signup_date(customer, current_date)
+        self.customers.set_shoe_club_status(customer, True)
         return
 
     def leave_shoe_club(self, customer):
         """
-        Checks to see if a user churns from the shoe club. Mutates the input customer object
+        Checks to see if a user churns from the shoe club. Mutates the customer store
         
         Parameters:
-            customer (Customer): a customer who is joining the shoe club
+            customer (int): the customer store index of a shoe club member
         
         Returns:
             None
         
         """
-        if rand.random() < 0.005:
-            customer.set_shoe_club_status("Inactive")
+        if self.rng.random() < 0.005:
+            self.customers.set_shoe_club_status(customer, False)
         return
 
     def makes_purchase(self, prob):
@@ -395,7 +801,7 @@ class EventsTable(object):
             makes_purchase (boolean): true if they make a purchase, false otherwise
         
         """
-        if rand.random() < prob:
+        if self.rng.random() < prob:
             return (True)
         else:
             return (False)
@@ -412,7 +818,7 @@ class EventsTable(object):
             test_label (string): a label used to identify users who have been exposed to a test
         
         """
-        self.test_conversion_prob = rand.choice([0.67,0.68,0.69,0.70,0.71,0.72,0.73,0.75,0.80])
+        self.test_conversion_prob = self.state_rng.choice(TEST_CONVERSION_PROBS)
         self.test_label = "Test_" + str(int((day_counter-1)/14 + 1))
         return(self.test_conversion_prob, self.test_label)
 
@@ -424,7 +830,7 @@ class EventsTable(object):
             test_group (boolean): true if they are in the test group, false if they are in the control
         
         """
-        if rand.random() < 0.5:
+        if self.rng.random() < 0.5:
             return (True)
         else:
             return (False)
@@ -439,12 +845,12 @@ class EventsTable(object):
             impacted_device_info (List<string>): the particular devices that are impacted by the bug
         
         """
-        if rand.random() < 0.01:
-            self.impacted_device_type = rand.choice(["computer", "phone", "tablet"])
+        if self.state_rng.random() < 0.01:
+            self.impacted_device_type = self.state_rng.choice(["computer", "phone", "tablet"])
             
             # Randomly select the device type variants that will be impacted
-            self.variants_impacted = rand.randint(1, len(self.device_dict[self.impacted_device_type]))
-            self.impacted_device_info = rand.sample(self.device_dict[self.impacted_device_type], 
+            self.variants_impacted = self.state_rng.randint(1, len(self.device_dict[self.impacted_device_type]))
+            self.impacted_device_info = self.state_rng.sample(self.device_dict[self.impacted_device_type], 
                                                     self.variants_impacted )
         else:
             self.impacted_device_type = ""
@@ -461,7 +867,7 @@ class EventsTable(object):
             campaign_length (string): the length of the shoe club membership growth campaign
         
         """
-        self.campaign_shoe_club_join_prob = rand.choice([0.25,0.26,0.30,0.35,0.40])
+        self.campaign_shoe_club_join_prob = self.state_rng.choice(CAMPAIGN_JOIN_PROBS)
         self.campaign_length = 30
         return(self.campaign_shoe_club_join_prob, self.campaign_length)
     
\ No newline at end of file
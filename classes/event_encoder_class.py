@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+
+# Values of the dictionary-encoded event columns. Each value is stored as its position in the
+# list plus one, which is also its id in the column's lookup table.
+EVENT_TYPES = ["clickthrough", "purchase"]
+DEVICE_TYPES = ["computer", "phone", "tablet"]
+DEVICE_INFOS = ["dell", "hp", "apple", "lenovo", "microsoft", "asus", "google", "huawei",
+                "samsung", "htc", "nokia", "motorola", "amazon", "other"]
+
+# Lookup tables of the compact schema, given as (table, id column, value column, values)
+LOOKUP_TABLES = [("event_types", "event_type_id", "event_type", EVENT_TYPES),
+                 ("device_types", "device_type_id", "device_type", DEVICE_TYPES),
+                 ("device_infos", "device_info_id", "device_info", DEVICE_INFOS)]
+
+# An A/B test note such as "Test_50_control" is stored as the test id, 50, and the group, 0 for
+# the control group and 1 for the test group. Events outside any test are stored with test id 0.
+AB_TEST_GROUPS = ["control", "test"]
+
+# Column order of the event records written to the compact events table
+COMPACT_EVENT_COLUMNS = ["event_date", "event_time", "event_type_id", "customer_id", "product_id",
+                         "device_type_id", "device_info_id", "order_number", "ab_test_id",
+                         "ab_test_group"]
+
+# Base query to add events to the compact events table
+COMPACT_EVENT_INSERT_SQL = '''INSERT INTO events (event_date, event_time, event_type_id, customer_id,
+                            product_id, device_type_id, device_info_id, order_number, ab_test_id,
+                            ab_test_group)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'''
+
+def get_event_type_id(event_type):
+    return(EVENT_TYPES.index(event_type) + 1)
+
+def get_ab_test_id(test_label):
+    return(int(test_label.split("_")[1]))
+
+def get_event_type_sql(compact_schema):
+    """
+    Gives the SQL that reads the event type of each event, for queries that work on either schema
+
+    Parameters:
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        event_type_column (string): the expression giving the event type name
+        event_type_join (string): the join needed by the expression, empty for the full schema
+
+    """
+    if compact_schema == True:
+        return('''event_types.event_type''',
+               '''INNER JOIN event_types ON events.event_type_id = event_types.event_type_id''')
+    return('''events.event_type''', '''''')
+
+def get_event_type_condition(event_type, compact_schema):
+    """
+    Gives the SQL condition matching the events of one type, comparing the type id directly on
+    the compact schema so that no join with event_types is needed
+
+    Parameters:
+        event_type (string): the event type, such as "purchase"
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        condition (string): the condition, true for events of the type
+
+    """
+    if compact_schema == True:
+        return('''events.event_type_id = ''' + str(get_event_type_id(event_type)))
+    return('''events.event_type = \'''' + event_type + '''\'''')
+
+class EventEncoder(object):
+    """
+    Converts event records from the simulator's EVENT_COLUMNS layout, with the event type, device
+    and A/B test note as strings, to the COMPACT_EVENT_COLUMNS layout of small integer codes, and
+    back again
+
+    """
+    def __init__(self):
+        """
+        Initialize an EventEncoder object
+
+        """
+        self.event_type_ids = {value: i + 1 for i, value in enumerate(EVENT_TYPES)}
+        self.device_type_ids = {value: i + 1 for i, value in enumerate(DEVICE_TYPES)}
+        self.device_info_ids = {value: i + 1 for i, value in enumerate(DEVICE_INFOS)}
+
+        # Codes of each A/B test note seen so far. Only two new notes appear per test.
+        self.ab_test_codes = {"": (0, 0)}
+
+    def get_ab_test_codes(self, ab_test_note):
+        """
+        Splits an A/B test note into its test id and group
+
+        Parameters:
+            ab_test_note (string): the note, such as "Test_50_control", or "" outside any test
+
+        Returns:
+            ab_test_codes (Tuple<int, int>): the test id and the group
+
+        """
+        ab_test_codes = self.ab_test_codes.get(ab_test_note)
+        if ab_test_codes is None:
+            test_label, group = ab_test_note.rsplit("_", 1)
+            ab_test_codes = (get_ab_test_id(test_label), AB_TEST_GROUPS.index(group))
+            self.ab_test_codes[ab_test_note] = ab_test_codes
+        return(ab_test_codes)
+
+    def encode_row(self, row):
+        """
+        Encodes a single event record
+
+        Parameters:
+            row (Tuple): the event, in EVENT_COLUMNS order
+
+        Returns:
+            row (Tuple): the event, in COMPACT_EVENT_COLUMNS order
+
+        """
+        (event_date, event_time, event_type, customer_id, product_id, device_type, device_info,
+         order_number, ab_test_note) = row
+        ab_test_id, ab_test_group = self.get_ab_test_codes(ab_test_note)
+        return((event_date, event_time, self.event_type_ids[event_type], customer_id, product_id,
+                self.device_type_ids[device_type], self.device_info_ids[device_info], order_number,
+                ab_test_id, ab_test_group))
+
+    def encode_rows(self, rows):
+        return([self.encode_row(row) for row in rows])
+
+    def decode_row(self, row):
+        """
+        Decodes a single event record read from the compact events table
+
+        Parameters:
+            row (Tuple): the event, in COMPACT_EVENT_COLUMNS order
+
+        Returns:
+            row (Tuple): the event, in EVENT_COLUMNS order
+
+        """
+        (event_date, event_time, event_type_id, customer_id, product_id, device_type_id,
+         device_info_id, order_number, ab_test_id, ab_test_group) = row
+        if ab_test_id == 0:
+            ab_test_note = ""
+        else:
+            ab_test_note = "Test_" + str(ab_test_id) + "_" + AB_TEST_GROUPS[ab_test_group]
+        return((event_date, event_time, EVENT_TYPES[event_type_id - 1], customer_id, product_id,
+                DEVICE_TYPES[device_type_id - 1], DEVICE_INFOS[device_info_id - 1], order_number,
+                ab_test_note))
+
+    def decode_rows(self, rows):
+        return([self.decode_row(row) for row in rows])
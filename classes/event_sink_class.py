@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+import time
+import pickle
+import tempfile
+from datetime import date, datetime
+
+# HH:MM:SS strings for every second of the day, built the first time a sink formats a time
+time_strings = None
+
+def get_time_strings():
+    """
+    Returns the HH:MM:SS string for every second of the day, so that times held as seconds since
+    midnight are formatted with a list lookup
+
+    Returns:
+        time_strings (List<string>): the time strings, indexed by seconds since midnight
+
+    """
+    global time_strings
+    if time_strings is None:
+        time_strings = ["%02d:%02d:%02d" % (s // 3600, (s // 60) % 60, s % 60)
+                        for s in range(24*60*60)]
+    return(time_strings)
+
+class EventSink(object):
+    """
+    A destination for simulated rows. Rows are buffered and handed to write_batch in batches of
+    at most flush_size rows; subclasses decide where each batch goes.
+
+    """
+    def __init__(self, flush_size = 5000, time_column = None):
+        """
+        Initialize an EventSink object
+
+        Parameters:
+            flush_size (int): the number of buffered rows that triggers an automatic flush
+            time_column (int): the position of a column holding times as seconds since midnight,
+                               which are formatted as HH:MM:SS strings before each batch is written.
+                               None leaves the rows unchanged.
+
+        """
+        self.flush_size = flush_size
+        self.time_column = time_column
+        self.rows = []
+
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.flush_times = []
+        self.format_time = 0.0
+        
+        # The first few rows that could not be written, with the error each one raised
+        self.failed_rows = []
+        self.max_failed_rows = 100
+
+    def add_row(self, row):
+        """
+        Adds a row to the buffer, flushing once the buffer is full
+
+        Parameters:
+            row (Tuple): the values for a single row
+
+        Returns:
+            None
+
+        """
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+        return
+
+    def add_rows(self, rows):
+        """
+        Adds several rows to the buffer at once, flushing once the buffer is full
+
+        Parameters:
+            rows (List<Tuple>): the values for each row
+
+        Returns:
+            None
+
+        """
+        self.rows.extend(rows)
+        if len(self.rows) >= self.flush_size:
+            self.flush()
+        return
+
+    def flush(self):
+        """
+        Writes all buffered rows, in batches of at most flush_size rows, timing each batch
+
+        Returns:
+            None
+
+        """
+        for i in range(0, len(self.rows), self.flush_size):
+            batch = self.rows[i:i + self.flush_size]
+
+            flush_start = time.perf_counter()
+            if self.time_column is not None:
+                batch = self.format_times(batch)
+                self.format_time += time.perf_counter() - flush_start
+            rows_failed_before = self.rows_failed
+            self.write_batch(batch)
+            self.flush_times.append(time.perf_counter() - flush_start)
+
+            self.rows_written += len(batch) - (self.rows_failed - rows_failed_before)
+
+        self.rows = []
+        return
+
+    def format_times(self, rows):
+        """
+        Formats the time column of a batch of rows as HH:MM:SS strings
+
+        Parameters:
+            rows (List<Tuple>): rows with the time as seconds since midnight
+
+        Returns:
+            rows (List<Tuple>): the rows with formatted times
+
+        """
+        strings = get_time_strings()
+        position = self.time_column
+        return([row[:position] + (strings[row[position]],) + row[position + 1:] for row in rows])
+
+    def record_failure(self, row, error):
+        """
+        Counts a row that could not be written, keeping the first few for inspection
+
+        Parameters:
+            row (Tuple): the row that failed
+            error (Exception): the error raised when writing it
+
+        Returns:
+            None
+
+        """
+        self.rows_failed += 1
+        if len(self.failed_rows) < self.max_failed_rows:
+            self.failed_rows.append((row, str(error)))
+        return
+
+    def write_batch(self, rows):
+        """
+        Writes a batch of rows to the sink's destination
+
+        Parameters:
+            rows (List<Tuple>): the rows to write
+
+        Returns:
+            None
+
+        """
+        raise NotImplementedError
+
+    def sync(self):
+        """
+        Makes sure every row added so far has reached the sink's destination, for example before
+        a checkpoint is committed. For most sinks this is the same as a flush.
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        return
+
+    def close(self):
+        """
+        Flushes any remaining rows and releases the sink's resources
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        return
+
+    def get_summary(self):
+        """
+        Summarizes the rows written and time spent flushing the sink
+
+        Returns:
+            summary (Dict<string: float>): rows written and failed, number of flushes, flush 
+                                           timings and time spent formatting times in seconds
+
+        """
+        num_flushes = len(self.flush_times)
+        total_flush_time = sum(self.flush_times)
+
+        self.summary = {"rows_written": self.rows_written,
+                        "rows_failed": self.rows_failed,
+                        "flushes": num_flushes,
+                        "total_flush_time": total_flush_time,
+                        "mean_flush_time": total_flush_time / num_flushes if num_flushes > 0 else 0.0,
+                        "max_flush_time": max(self.flush_times) if num_flushes > 0 else 0.0,
+                        "format_time": self.format_time
+                        }
+        return(self.summary)
+
+    def get_summary_string(self):
+        """
+        Formats the sink summary for printing
+
+        Returns:
+            summary_string (string): a single line description of the sink activity
+
+        """
+        summary = self.get_summary()
+        self.summary_string = ("Wrote " + str(summary["rows_written"]) + " rows in " +
+                               str(summary["flushes"]) + " flushes (total " +
+                               str(round(summary["total_flush_time"], 3)) + "s, mean " +
+                               str(round(1000*summary["mean_flush_time"], 2)) + "ms, max " +
+                               str(round(1000*summary["max_flush_time"], 2)) + "ms)")
+        if summary["rows_failed"] > 0:
+            self.summary_string += (", " + str(summary["rows_failed"]) + " rows failed, first error: " +
+                                    self.failed_rows[0][1])
+        return(self.summary_string)
+
+class FileSink(EventSink):
+    """
+    A sink that appends rows to a delimited text file, one line per row
+
+    """
+    def __init__(self, path, flush_size = 5000, delimiter = "\t", columns = None, time_column = None):
+        """
+        Initialize a FileSink object
+
+        Parameters:
+            path (string): the file to write to
+            flush_size (int): the number of buffered rows that triggers an automatic flush
+            delimiter (string): the field separator
+            columns (List<string>): optional column names, written as a header line
+            time_column (int): the position of a column holding seconds since midnight, to be
+                               written as HH:MM:SS
+
+        """
+        super().__init__(flush_size, time_column)
+        self.path = path
+        self.delimiter = delimiter
+        self.out_file = open(path, "w")
+        if columns is not None:
+            self.out_file.write(delimiter.join(columns) + "\n")
+
+    def format_value(self, value):
+        """
+        Formats a single field for the file. Dates are written as YYYY-MM-DD.
+
+        Parameters:
+            value (object): the field value
+
+        Returns:
+            field (string): the formatted field
+
+        """
+        if isinstance(value, datetime):
+            return(value.strftime("%Y-%m-%d"))
+        if isinstance(value, date):
+            return(value.isoformat())
+        return(str(value))
+
+    def write_batch(self, rows):
+        lines = [self.delimiter.join([self.format_value(value) for value in row]) for row in rows]
+        self.out_file.write("\n".join(lines) + "\n")
+        return
+
+    def close(self):
+        self.flush()
+        self.out_file.close()
+        return
+
+class MemorySink(EventSink):
+    """
+    A sink that collects every row in a list in memory
+
+    """
+    def __init__(self, flush_size = 5000):
+        super().__init__(flush_size)
+        self.collected_rows = []
+
+    def write_batch(self, rows):
+        self.collected_rows.extend(rows)
+        return
+
+class SpoolSink(EventSink):
+    """
+    A sink that pickles each batch of rows to a temporary spool file, so that rows produced in
+    one process can be streamed back in another with read_spool rather than held in memory
+
+    """
+    def __init__(self, flush_size = 5000, spool_dir = None):
+        """
+        Initialize a SpoolSink object
+
+        Parameters:
+            flush_size (int): the number of buffered rows that triggers an automatic flush
+            spool_dir (string): the directory for the spool file, defaults to the temp directory
+
+        """
+        super().__init__(flush_size)
+        handle, self.path = tempfile.mkstemp(suffix = ".spool", dir = spool_dir)
+        self.out_file = os.fdopen(handle, "wb")
+
+    def write_batch(self, rows):
+        pickle.dump(rows, self.out_file, protocol = pickle.HIGHEST_PROTOCOL)
+        return
+
+    def close(self):
+        self.flush()
+        self.out_file.close()
+        return
+
+def read_spool(path):
+    """
+    Reads back the rows written to a spool file by a SpoolSink, one batch at a time
+
+    Parameters:
+        path (string): the spool file
+
+    Returns:
+        rows (Generator<Tuple>): the rows, in the order they were written
+
+    """
+    with open(path, "rb") as spool_file:
+        while True:
+            try:
+                rows = pickle.load(spool_file)
+            except EOFError:
+                return
+            yield from rows
+
+class NullSink(EventSink):
+    """
+    A sink that discards every row, for benchmarking the simulation on its own
+
+    """
+    def write_batch(self, rows):
+        return
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import weakref
+import numpy as np
+
+class ItemCache(object):
+    """
+    The items table held in memory as arrays indexed by item_id, so that events can be given
+    their item's price and brand with an array lookup rather than a join in the database. The
+    items table is small and rarely changes, so it is read once and only read again after the
+    cache is invalidated, which must be done whenever items are added or their inventory or
+    prices change.
+
+    """
+    def __init__(self):
+        """
+        Initialize an empty ItemCache object
+
+        """
+        self.loaded = False
+
+    def load(self, mycursor):
+        """
+        Reads the items table into the cache
+
+        Parameters:
+            mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+        Returns:
+            None
+
+        """
+        mycursor.execute('''SELECT
+                                item_id,
+                                item_price,
+                                inventory,
+                                item_brand
+                            FROM
+                                items''')
+        self.load_rows(mycursor.fetchall())
+        return
+
+    def load_rows(self, item_rows):
+        """
+        Fills the cache from item rows
+
+        Parameters:
+            item_rows (List<Tuple>): the id, price, inventory and brand of each item
+
+        Returns:
+            None
+
+        """
+        item_ids = np.array([row[0] for row in item_rows], dtype = np.int64)
+        size = int(item_ids.max()) + 1 if len(item_ids) > 0 else 1
+
+        # Brands are numbered in name order, and ids without an item are given brand -1
+        self.brand_names = sorted(set(row[3] for row in item_rows))
+        brand_codes = {brand: code for code, brand in enumerate(self.brand_names)}
+
+        self.item_prices = np.zeros(size)
+        self.item_prices[item_ids] = [float(row[1]) for row in item_rows]
+        self.item_inventory = np.zeros(size, dtype = np.int64)
+        self.item_inventory[item_ids] = [int(row[2]) for row in item_rows]
+        self.item_brand_codes = np.full(size, -1, dtype = np.int64)
+        self.item_brand_codes[item_ids] = [brand_codes[row[3]] for row in item_rows]
+
+        self.loaded = True
+        return
+
+    def invalidate(self):
+        self.loaded = False
+        return
+
+    def get_item_ids(self):
+        """
+        Finds the ids of the items in stock
+
+        Returns:
+            item_ids (List<Tuple<int>>): the ids of the items with inventory remaining, in id order
+
+        """
+        return([(int(item_id),) for item_id in np.flatnonzero(self.item_inventory > 0)])
+
+    def select_known_items(self, product_ids, num_events):
+        """
+        Drops the products without a row in the items table, as an inner join with items would
+
+        Parameters:
+            product_ids (Array<int>): the item ids of the products
+            num_events (Array<int>): the number of events of each product
+
+        Returns:
+            product_ids (Array<int>): the item ids of the products in the items table
+            num_events (Array<int>): the number of events of each of those products
+
+        """
+        product_ids = np.asarray(product_ids, dtype = np.int64)
+        num_events = np.asarray(num_events)
+        known = (product_ids >= 0) & (product_ids < len(self.item_brand_codes))
+        known[known] = self.item_brand_codes[product_ids[known]] >= 0
+        return(product_ids[known], num_events[known])
+
+    def get_revenue(self, product_ids, num_purchases):
+        """
+        Totals the revenue of a number of purchases of each of several products. Products
+        without an item are left out.
+
+        Parameters:
+            product_ids (Array<int>): the item ids of the products
+            num_purchases (Array<int>): the number of purchases of each product
+
+        Returns:
+            revenue (float): the total price of the purchases
+
+        """
+        product_ids, num_purchases = self.select_known_items(product_ids, num_purchases)
+        return(float(np.dot(self.item_prices[product_ids], num_purchases)))
+
+    def get_brand_sales(self, product_ids, num_purchases):
+        """
+        Totals the revenue of a number of purchases of each of several products by brand.
+        Products without an item are left out.
+
+        Parameters:
+            product_ids (Array<int>): the item ids of the products
+            num_purchases (Array<int>): the number of purchases of each product
+
+        Returns:
+            brand_sales (List<Tuple<string, float>>): each brand with purchases and its revenue,
+                                                      in brand order
+
+        """
+        product_ids, num_purchases = self.select_known_items(product_ids, num_purchases)
+        brand_codes = self.item_brand_codes[product_ids]
+        brand_revenue = np.bincount(brand_codes, weights = self.item_prices[product_ids]*num_purchases,
+                                    minlength = len(self.brand_names))
+        brand_purchases = np.bincount(brand_codes, weights = num_purchases,
+                                      minlength = len(self.brand_names))
+        return([(brand, float(revenue)) for brand, revenue, purchases
+                in zip(self.brand_names, brand_revenue, brand_purchases) if purchases > 0])
+
+# The item caches of the process, one per cursor, so a process working with several databases
+# never reads one database's items for another. A cache is dropped along with its cursor.
+item_caches = weakref.WeakKeyDictionary()
+
+def get_item_cache(mycursor):
+    """
+    Returns the item cache of a cursor's database, reading the items table the first time and 
+    after the cache is invalidated
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+    Returns:
+        item_cache (ItemCache): the cursor's item cache
+
+    """
+    item_cache = item_caches.get(mycursor)
+    if item_cache is None:
+        item_cache = ItemCache()
+        item_caches[mycursor] = item_cache
+    if item_cache.loaded == False:
+        item_cache.load(mycursor)
+    return(item_cache)
+
+def invalidate_item_cache():
+    """
+    Marks every item cache of the process out of date, so the items table is read again the 
+    next time each is used. Call whenever items are added or their inventory or prices change.
+
+    Returns:
+        None
+
+    """
+    for item_cache in list(item_caches.values()):
+        item_cache.invalidate()
+    return
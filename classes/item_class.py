@@ -3,18 +3,33 @@
 
 @author: timpr
 """
+from classes.item_cache_class import invalidate_item_cache
+
+# Columns of the items table filled from the product list, in the order of each product's values
+ITEM_COLUMNS = ["item_name", "item_price", "item_size", "inventory", "item_brand", "item_type"]
+
+# Sizes every model is stocked in, and the further half sizes added as the catalog is scaled up,
+# nearest the usual sizes first
+BASE_ITEM_SIZES = ["10", "11"]
+EXTRA_ITEM_SIZES = ["10.5", "11.5", "9.5", "12", "9", "12.5", "8.5", "13", "8", "13.5", "7.5",
+                    "14", "7", "14.5", "6.5", "15", "6", "15.5", "5.5", "16", "5", "16.5", "4.5"]
 
 class ItemTable(object):
     """
     An item table class, corresponding to a MySQL table used to store item details on Tim's Shoes website
     
     """
-    def __init__(self, mycursor):
+    def __init__(self, mycursor, loader = None, scale_factor = 1):
         """
         Initialize an ItemTable object 
         
         Parameters:
             mycursor (MySQL Cursor): a cursor to perform database operations from Python
+            loader (EventSink): optional sink to write the items through, such as a BulkLoader,
+                                rather than inserting them with the cursor. If neither is given
+                                the items are only held in the product list.
+            scale_factor (float): multiplies the number of sizes each model is stocked in, 
+                                  from two at scale factor 1 up to every half size from 4.5 to 16.5
     
         """  
         self.mycursor = mycursor
@@ -211,10 +226,46 @@ class ItemTable(object):
                             ("Pole Vault Elite", "39.95", "11", "50", "Nike", "track and field"),
                             ("High Jump Elite", "149.95", "11", "50", "Nike", "track and field"),                            
                             ]
+        
+        # Stock every model in further sizes for larger scale factors, after the base sizes so
+        # that the base items keep their ids
+        num_sizes = min(max(round(len(BASE_ITEM_SIZES)*scale_factor), len(BASE_ITEM_SIZES)),
+                        len(BASE_ITEM_SIZES) + len(EXTRA_ITEM_SIZES))
+        models = [product for product in self.product_list if product[2] == BASE_ITEM_SIZES[0]]
+        for size in EXTRA_ITEM_SIZES[:num_sizes - len(BASE_ITEM_SIZES)]:
+            self.product_list.extend((name, price, size, inventory, brand, item_type) 
+                                     for name, price, _, inventory, brand, item_type in models)
                   
         self.sql = '''INSERT INTO items (item_name, item_price, item_size, inventory, item_brand, item_type) 
                     VALUES (%s, %s, %s, %s, %s, %s)'''
         
-        # Insert values into customer table        
-        self.mycursor.executemany(self.sql, self.product_list)  
+        # Insert values into items table, and have the item cache read the new items
+        if loader is not None:
+            loader.add_rows(self.product_list)
+            loader.close()
+            invalidate_item_cache()
+        elif self.mycursor is not None:
+            self.mycursor.executemany(self.sql, self.product_list)  
+            invalidate_item_cache()
+        
+    def get_item_rows(self):
+        """
+        Numbers the products in the order they are inserted, matching the ids the items table
+        assigns them
+        
+        Returns:
+            item_rows (List<Tuple>): the product list with each item's id prepended
+        
+        """
+        return([(item_id,) + product for item_id, product in enumerate(self.product_list, start = 1)])
+    
+    def get_item_ids(self):
+        """
+        Finds the ids of the items in stock, without querying the database
+        
+        Returns:
+            item_ids (List<Tuple<int>>): the ids of the items with inventory remaining
+        
+        """
+        return([(row[0],) for row in self.get_item_rows() if int(row[4]) > 0])
         
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+import shutil
+import numpy as np
+from classes.customer_store_class import CustomerStore, STORE_COLUMNS
+
+class MemmapCustomerStore(CustomerStore):
+    """
+    A customer store whose column arrays are memory-mapped files on disk, so the number of
+    customers is limited by disk space rather than memory. The operating system pages in the
+    parts of each column that are used, such as the day's returning customers, and the mapped
+    pages are released whenever the process grows past its resident memory budget.
+
+    """
+    def __init__(self, storage_dir, memory_budget_mb = None, initial_capacity = 2**20):
+        """
+        Initialize a MemmapCustomerStore object. Any customers left in the storage directory by
+        an earlier run are discarded.
+
+        Parameters:
+            storage_dir (string): the directory the column files are kept in
+            memory_budget_mb (float): the resident memory, in megabytes, above which the mapped
+                                      pages are released. None never releases them.
+            initial_capacity (int): the number of customers to allocate space for up front
+
+        """
+        self.storage_dir = storage_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.releases = 0
+        self.snapshot_dir = None
+
+        os.makedirs(storage_dir, exist_ok = True)
+        for column in STORE_COLUMNS:
+            if os.path.exists(self.get_column_path(column)):
+                os.remove(self.get_column_path(column))
+        super().__init__(initial_capacity)
+
+    def __getstate__(self):
+        """
+        Pickles the store attributes without the column arrays. The columns themselves are
+        restored from the snapshot written by the last call to checkpoint, so checkpoint must be
+        called before the store is pickled.
+
+        Returns:
+            state (Dict<string: object>): the store attributes, without the column arrays
+
+        """
+        state = self.__dict__.copy()
+        for column in self.columns:
+            del state[column]
+        return(state)
+
+    def __setstate__(self, state):
+        """
+        Restores a store from a checkpoint, copying the snapshot back over the column files and
+        extending them to the store's capacity. No other store may have the column files mapped,
+        so a resumed run restores the checkpoint's store instead of creating one of its own.
+
+        Parameters:
+            state (Dict<string: object>): the store attributes, as returned by __getstate__
+
+        Returns:
+            None
+
+        """
+        self.__dict__.update(state)
+        for column, dtype in self.columns.items():
+            path = self.get_column_path(column)
+            shutil.copyfile(os.path.join(self.snapshot_dir, column + ".dat"), path)
+            with open(path, "r+b") as column_file:
+                column_file.truncate(self.capacity*np.dtype(dtype).itemsize)
+        self.open_columns()
+        return
+
+    def checkpoint(self, snapshot_dir):
+        """
+        Snapshots the filled part of each column file, so a pickled store refers to the customers
+        as they were when the checkpoint was saved rather than as later days modify them
+
+        Parameters:
+            snapshot_dir (string): the directory the snapshot is written to
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        os.makedirs(snapshot_dir, exist_ok = True)
+        for column in self.columns:
+            getattr(self, column)[:self.num_customers].tofile(os.path.join(snapshot_dir, column + ".dat"))
+        self.snapshot_dir = snapshot_dir
+        return
+
+    def get_column_path(self, column):
+        return(os.path.join(self.storage_dir, column + ".dat"))
+
+    def grow(self, min_capacity):
+        """
+        Extends the column files so they can hold at least min_capacity customers. The files
+        are lengthened in place, so existing customers are not copied.
+
+        Parameters:
+            min_capacity (int): the number of customers the store must be able to hold
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        new_capacity = max(min_capacity, 2*self.capacity)
+        for column, dtype in self.columns.items():
+            path = self.get_column_path(column)
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as column_file:
+                column_file.truncate(new_capacity*np.dtype(dtype).itemsize)
+        self.capacity = new_capacity
+        self.open_columns()
+        return
+
+    def open_columns(self):
+        """
+        Maps each column file into memory, replacing any earlier mapping
+
+        Returns:
+            None
+
+        """
+        for column, dtype in self.columns.items():
+            setattr(self, column, np.memmap(self.get_column_path(column), dtype = dtype, mode = "r+",
+                                            shape = (self.capacity,)))
+        return
+
+    def flush(self):
+        """
+        Writes any modified pages of the column files back to disk
+
+        Returns:
+            None
+
+        """
+        for column in self.columns:
+            column_array = getattr(self, column, None)
+            if isinstance(column_array, np.memmap):
+                column_array.flush()
+        return
+
+    def release_memory(self):
+        """
+        Flushes the column files and remaps them, unmapping every page the process had paged in
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        self.open_columns()
+        self.releases += 1
+        return
+
+    def enforce_memory_budget(self):
+        """
+        Releases the mapped pages if the process's resident memory is over budget. Where the
+        resident memory cannot be read, the pages are released every time.
+
+        Returns:
+            None
+
+        """
+        if self.memory_budget_mb is None:
+            return
+        resident_mb = get_resident_memory_mb()
+        if resident_mb is None or resident_mb > self.memory_budget_mb:
+            self.release_memory()
+        return
+
+def get_resident_memory_mb():
+    """
+    Reads the current resident memory of the process from /proc, which is only available on Linux
+
+    Returns:
+        resident_mb (float): the resident set size in megabytes, or None where unavailable
+
+    """
+    try:
+        with open("/proc/self/statm") as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return(None)
+    return(resident_pages*os.sysconf("SC_PAGE_SIZE") / 2**20)
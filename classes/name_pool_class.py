@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import names
+import numpy as np
+import random as rand
+
+class NamePool(object):
+    """
+    Generates customer names and contact details in bulk. The name distributions bundled with
+    the names package are read into arrays once, rather than re-read and scanned for every name,
+    and are sampled the same way the package samples them.
+
+    """
+    def __init__(self, name_files = names.FILES):
+        """
+        Initialize a NamePool object
+
+        Parameters:
+            name_files (Dict<string: string>): the paths of the male first name, female first name
+                                               and last name distribution files, keyed as in
+                                               names.FILES
+
+        """
+        self.male_names, self.male_cumulative = self.load_names(name_files["first:male"])
+        self.female_names, self.female_cumulative = self.load_names(name_files["first:female"])
+        self.last_names, self.last_cumulative = self.load_names(name_files["last"])
+
+    def load_names(self, path):
+        """
+        Reads a name distribution file, each line holding a name, its frequency, the cumulative
+        frequency and its rank
+
+        Parameters:
+            path (string): the distribution file
+
+        Returns:
+            name_array (Array<string>): the capitalized names, followed by an empty name for draws
+                                        beyond the final cumulative frequency
+            cumulative (Array<float>): the cumulative frequency of each name
+
+        """
+        name_list = []
+        cumulative_list = []
+        with open(path) as name_file:
+            for line in name_file:
+                name, _, cumulative, _ = line.split()
+                name_list.append(name.capitalize())
+                cumulative_list.append(float(cumulative))
+
+        name_array = np.array(name_list + [""], dtype = object)
+        return(name_array, np.array(cumulative_list))
+
+    def sample_names(self, name_array, cumulative, num_names, rng):
+        """
+        Draws names from a distribution. As in the names package, a point is drawn uniformly
+        between 0 and 90 and the first name whose cumulative frequency exceeds it is chosen.
+
+        Parameters:
+            name_array (Array<string>): the names, as returned by load_names
+            cumulative (Array<float>): the cumulative frequency of each name
+            num_names (int): the number of names to draw
+            rng (numpy Generator): the random stream to draw from
+
+        Returns:
+            sampled_names (Array<string>): the drawn names
+
+        """
+        selected = rng.random(num_names) * 90
+        return(name_array[np.searchsorted(cumulative, selected, side = "right")])
+
+    def sample_first_names(self, num_names, rng):
+        """
+        Draws first names, choosing male or female with equal probability for each name
+
+        Parameters:
+            num_names (int): the number of names to draw
+            rng (numpy Generator): the random stream to draw from
+
+        Returns:
+            first_names (List<string>): the drawn first names
+
+        """
+        is_male = rng.random(num_names) < 0.5
+        first_names = self.sample_names(self.female_names, self.female_cumulative, num_names, rng)
+        first_names[is_male] = self.sample_names(self.male_names, self.male_cumulative,
+                                                 int(is_male.sum()), rng)
+        return(first_names.tolist())
+
+    def sample_last_names(self, num_names, rng):
+        return(self.sample_names(self.last_names, self.last_cumulative, num_names, rng).tolist())
+
+    def sample_phone_nums(self, num_phones, rng):
+        """
+        Draws ten digit phone numbers, held as integers and zero filled when formatted
+
+        Parameters:
+            num_phones (int): the number of phone numbers to draw
+            rng (numpy Generator): the random stream to draw from
+
+        Returns:
+            phone_nums (Array<int>): the drawn phone numbers
+
+        """
+        return(rng.integers(0, 10**10, size = num_phones, dtype = np.int64))
+
+    def sample_names_and_phones(self, num_customers, rng = None):
+        """
+        Draws the names and phone numbers for a batch of new customers. Their email addresses
+        follow from their names, so are only built when the customers are exported.
+
+        Parameters:
+            num_customers (int): the number of customers
+            rng (numpy Generator): the random stream to draw from, seeded from the global random
+                                   generator if None
+
+        Returns:
+            first_names (List<string>): the customers' first names
+            last_names (List<string>): the customers' last names
+            phone_nums (Array<int>): the customers' phone numbers
+
+        """
+        if rng is None:
+            rng = np.random.default_rng(rand.getrandbits(64))
+
+        first_names = self.sample_first_names(num_customers, rng)
+        last_names = self.sample_last_names(num_customers, rng)
+        phone_nums = self.sample_phone_nums(num_customers, rng)
+        return(first_names, last_names, phone_nums)
+
+    def sample_contacts(self, num_customers, rng = None):
+        """
+        Draws the names and contact details for a batch of new customers
+
+        Parameters:
+            num_customers (int): the number of customers
+            rng (numpy Generator): the random stream to draw from, seeded from the global random
+                                   generator if None
+
+        Returns:
+            first_names (List<string>): the customers' first names
+            last_names (List<string>): the customers' last names
+            emails (List<string>): the customers' email addresses
+            phone_nums (Array<int>): the customers' phone numbers
+
+        """
+        first_names, last_names, phone_nums = self.sample_names_and_phones(num_customers, rng)
+        emails = [first + "." + last + "@gmail.com" for first, last in zip(first_names, last_names)]
+        return(first_names, last_names, emails, phone_nums)
+
+# The name pool shared by every customer generator in the process, loaded on first use
+shared_name_pool = None
+
+def get_name_pool():
+    """
+    Returns the process wide name pool, loading the name distributions the first time
+
+    Returns:
+        name_pool (NamePool): the shared name pool
+
+    """
+    global shared_name_pool
+    if shared_name_pool is None:
+        shared_name_pool = NamePool()
+    return(shared_name_pool)
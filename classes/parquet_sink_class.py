@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from classes.event_sink_class import EventSink
+
+# Low cardinality text columns are dictionary encoded, storing each distinct value once
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Parquet schemas of the tables created by initiate_base_tables, in the column order of their rows
+EVENT_SCHEMA = pa.schema([("event_date", pa.date32()),
+                          ("event_time", pa.time32("s")),
+                          ("event_type", DICTIONARY_STRING),
+                          ("customer_id", pa.int32()),
+                          ("product_id", pa.int32()),
+                          ("device_type", DICTIONARY_STRING),
+                          ("device_info", DICTIONARY_STRING),
+                          ("order_number", pa.int32()),
+                          ("ab_test_notes", DICTIONARY_STRING)])
+
+CUSTOMER_SCHEMA = pa.schema([("customer_id", pa.int32()),
+                             ("customer_first_name", pa.string()),
+                             ("customer_last_name", pa.string()),
+                             ("customer_email", pa.string()),
+                             ("customer_phone", pa.string()),
+                             ("first_purchase_date", pa.date32()),
+                             ("last_purchase_date", pa.date32()),
+                             ("shoe_club_id", pa.string()),
+                             ("shoe_club_signup_date", pa.date32()),
+                             ("shoe_club_status", DICTIONARY_STRING)])
+
+ITEM_SCHEMA = pa.schema([("item_id", pa.int32()),
+                         ("item_name", pa.string()),
+                         ("item_price", pa.float32()),
+                         ("item_size", pa.float32()),
+                         ("inventory", pa.int32()),
+                         ("item_brand", DICTIONARY_STRING),
+                         ("item_type", DICTIONARY_STRING)])
+
+class ParquetSink(EventSink):
+    """
+    A sink that writes rows to Parquet files. Rows can be partitioned by the month of a date
+    column, giving one directory per month in the key=value layout that Parquet readers expect.
+    Rows are expected to arrive in date order, so only the current month's file is kept open.
+
+    """
+    def __init__(self, root_dir, schema, partition_column = None, flush_size = 5000,
+                 row_group_size = 100000):
+        """
+        Initialize a ParquetSink object
+
+        Parameters:
+            root_dir (string): the directory the Parquet files are written under
+            schema (pyarrow Schema): the column names and types, in the order of the values in each row
+            partition_column (string): an optional date column to partition the files by month
+            flush_size (int): the number of buffered rows that triggers an automatic flush
+            row_group_size (int): the number of rows collected before a row group is written
+
+        """
+        super().__init__(flush_size)
+        self.root_dir = root_dir
+        self.schema = schema
+        self.partition_column = partition_column
+        self.row_group_size = row_group_size
+
+        if partition_column is not None:
+            self.partition_position = schema.names.index(partition_column)
+            self.partition_name = partition_column.replace("_date", "") + "_month"
+
+        self.current_partition = None
+        self.writer = None
+        self.pending_rows = []
+        self.part_counts = {}
+        self.files_written = 0
+
+    def get_partition(self, row):
+        if self.partition_column is None:
+            return("")
+        return(self.partition_name + "=" + row[self.partition_position].strftime("%Y-%m"))
+
+    def write_batch(self, rows):
+        """
+        Collects a batch of rows for its month, starting a new file whenever the month changes
+
+        Parameters:
+            rows (List<Tuple>): the rows to write
+
+        Returns:
+            None
+
+        """
+        for row in rows:
+            partition = self.get_partition(row)
+            if partition != self.current_partition:
+                self.close_partition()
+                self.current_partition = partition
+            self.pending_rows.append(row)
+            if len(self.pending_rows) >= self.row_group_size:
+                self.write_row_group()
+        return
+
+    def write_row_group(self):
+        """
+        Converts the collected rows to columns of the schema's types and writes them to the
+        current month's file as one row group
+
+        Returns:
+            None
+
+        """
+        if len(self.pending_rows) == 0:
+            return
+
+        columns = list(zip(*self.pending_rows))
+        arrays = []
+        for column, field in zip(columns, self.schema):
+            array = pa.array(column)
+            if pa.types.is_time32(field.type) and pa.types.is_integer(array.type):
+                # Times held as seconds since midnight only cast to time32 from 32 bit integers
+                array = array.cast(pa.int32())
+            arrays.append(array.cast(field.type))
+        row_group = pa.Table.from_arrays(arrays, schema = self.schema)
+
+        if self.writer is None:
+            self.writer = self.open_writer(self.current_partition)
+        self.writer.write_table(row_group)
+        self.pending_rows = []
+        return
+
+    def open_writer(self, partition):
+        """
+        Opens a new Parquet file in a partition's directory. A partition that is revisited gets
+        an additional part file rather than overwriting the earlier one.
+
+        Parameters:
+            partition (string): the partition directory name, empty if the rows are not partitioned
+
+        Returns:
+            writer (pyarrow ParquetWriter): the writer for the new file
+
+        """
+        partition_dir = os.path.join(self.root_dir, partition)
+        os.makedirs(partition_dir, exist_ok = True)
+
+        part_number = self.part_counts.get(partition, 0)
+        self.part_counts[partition] = part_number + 1
+        self.files_written += 1
+
+        path = os.path.join(partition_dir, "part-" + str(part_number).zfill(5) + ".parquet")
+        return(pq.ParquetWriter(path, self.schema, compression = "snappy"))
+
+    def close_partition(self):
+        self.write_row_group()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        return
+
+    def sync(self):
+        """
+        Writes out every collected row, closing the current file so that it can be read
+
+        Returns:
+            None
+
+        """
+        self.flush()
+        self.close_partition()
+        return
+
+    def close(self):
+        self.sync()
+        return
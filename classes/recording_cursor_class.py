@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import re
+
+class RecordingCursor(object):
+    """
+    A stand-in for a MySQL cursor that keeps inserted rows in memory instead of writing them
+    to a database. Used to run the simulation in worker processes that have no database connection.
+
+    """
+    def __init__(self, keep_rows = True):
+        """
+        Initialize a RecordingCursor object
+
+        Parameters:
+            keep_rows (boolean): false to only count the rows inserted into each table, so that
+                                 long simulations can be run without holding every row in memory
+
+        """
+        self.keep_rows = keep_rows
+        self.rows = {}
+        self.row_counts = {}
+        self.statements = 0
+        self.result = []
+        self.insert_pattern = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+
+    def execute(self, sql, params = None):
+        """
+        Records the row of an INSERT statement. Any other statement returns no results.
+
+        Parameters:
+            sql (string): the SQL statement
+            params (Tuple): the values for the statement placeholders
+
+        Returns:
+            None
+
+        """
+        self.statements += 1
+        self.result = []
+        table = self.get_insert_table(sql)
+        if table is not None and params is not None:
+            self.row_counts[table] = self.row_counts.get(table, 0) + 1
+            if self.keep_rows == True:
+                self.rows.setdefault(table, []).append(tuple(params))
+        return
+
+    def executemany(self, sql, seq_params):
+        """
+        Records the rows of a batched INSERT statement
+
+        Parameters:
+            sql (string): the SQL statement
+            seq_params (List<Tuple>): the values for each row
+
+        Returns:
+            None
+
+        """
+        self.statements += 1
+        self.result = []
+        table = self.get_insert_table(sql)
+        if table is not None:
+            if self.keep_rows == True:
+                table_rows = self.rows.setdefault(table, [])
+                num_rows = len(table_rows)
+                table_rows.extend(tuple(params) for params in seq_params)
+                num_rows = len(table_rows) - num_rows
+            else:
+                num_rows = sum(1 for params in seq_params)
+            self.row_counts[table] = self.row_counts.get(table, 0) + num_rows
+        return
+
+    def fetchall(self):
+        return(self.result)
+
+    def get_insert_table(self, sql):
+        """
+        Finds the table an INSERT statement writes to
+
+        Parameters:
+            sql (string): the SQL statement
+
+        Returns:
+            table (string): the table name, or None if the statement is not an INSERT
+
+        """
+        match = self.insert_pattern.match(sql)
+        if match is None:
+            return(None)
+        return(match.group(1))
+
+    def get_rows(self, table):
+        return(self.rows.get(table, []))
+
+    def get_row_count(self, table):
+        return(self.row_counts.get(table, 0))
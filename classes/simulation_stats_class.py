@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import time
+import numpy as np
+
+# Per-day counters recorded by the simulator, in the order they are reported
+DAILY_COUNTERS = ["new_customers", "returning_customers", "clickthroughs", "purchases",
+                  "bug_suppressed_clicks", "wrapped_purchases"]
+
+# Upper edges of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+def get_latency_histogram(latencies):
+    """
+    Counts latencies into buckets on a roughly logarithmic scale
+
+    Parameters:
+        latencies (List<float>): the latencies, in seconds
+
+    Returns:
+        histogram (List<Tuple<string, int>>): the label of each bucket, such as "<=2.5ms", and the
+                                              number of latencies in it
+
+    """
+    edges = [0.0] + [bucket/1000 for bucket in LATENCY_BUCKETS_MS] + [np.inf]
+    counts, _ = np.histogram(latencies, bins = edges)
+    labels = ["<=" + str(bucket) + "ms" for bucket in LATENCY_BUCKETS_MS] + [">" + str(LATENCY_BUCKETS_MS[-1]) + "ms"]
+    return(list(zip(labels, counts.tolist())))
+
+class SimulationStats(object):
+    """
+    Instrumentation for a simulation run: wall clock time spent in each phase of the simulation
+    loop, per-day event counters and the latency of each batch written by the sinks. A simulator
+    only records stats when given a SimulationStats object, so runs without one pay nothing.
+
+    """
+    def __init__(self, log_interval_days = None):
+        """
+        Initialize a SimulationStats object
+
+        Parameters:
+            log_interval_days (int): optionally print a progress line every few simulated days
+
+        """
+        self.log_interval_days = log_interval_days
+        self.phase_times = {}
+        self.current_phase = None
+        self.phase_start = None
+
+        self.dates = []
+        self.daily_counts = {counter: [] for counter in DAILY_COUNTERS}
+        self.sinks = {}
+        self.run_start = time.perf_counter()
+
+    def start_phase(self, phase):
+        """
+        Starts timing a phase of the simulation, ending the phase currently being timed
+
+        Parameters:
+            phase (string): the phase name, such as "new_customers" or "event_writes"
+
+        Returns:
+            None
+
+        """
+        now = time.perf_counter()
+        if self.current_phase is not None:
+            self.phase_times[self.current_phase] = (self.phase_times.get(self.current_phase, 0.0) +
+                                                    now - self.phase_start)
+        self.current_phase = phase
+        self.phase_start = now
+        return
+
+    def stop_phase(self):
+        self.start_phase(None)
+        return
+
+    def add_sink(self, name, sink):
+        self.sinks[name] = sink
+        return
+
+    def record_day(self, event_date, day_counts):
+        """
+        Records the counters of a simulated day, printing a progress line if one is due
+
+        Parameters:
+            event_date (datetime): the simulated day
+            day_counts (Dict<string: int>): the day's value of each counter in DAILY_COUNTERS
+
+        Returns:
+            None
+
+        """
+        self.dates.append(event_date)
+        for counter in DAILY_COUNTERS:
+            self.daily_counts[counter].append(day_counts[counter])
+
+        if self.log_interval_days is not None and len(self.dates) % self.log_interval_days == 0:
+            print(self.get_progress_string(self.log_interval_days))
+        return
+
+    def get_totals(self, num_days = None):
+        """
+        Totals the per-day counters
+
+        Parameters:
+            num_days (int): the number of most recent days to total, or None for every day
+
+        Returns:
+            totals (Dict<string: int>): the total of each counter
+
+        """
+        start = 0 if num_days is None else max(len(self.dates) - num_days, 0)
+        return({counter: sum(counts[start:]) for counter, counts in self.daily_counts.items()})
+
+    def get_progress_string(self, num_days):
+        """
+        Formats the counters of the most recent days and the time spent so far for printing
+
+        Parameters:
+            num_days (int): the number of most recent days to describe
+
+        Returns:
+            progress_string (string): a single line description of the recent days
+
+        """
+        totals = self.get_totals(num_days)
+        elapsed = time.perf_counter() - self.run_start
+        return(self.dates[-1].strftime("%Y-%m-%d") + " (day " + str(len(self.dates)) + ", " +
+               str(round(elapsed, 1)) + "s): last " + str(num_days) + " days " +
+               ", ".join(str(totals[counter]) + " " + counter.replace("_", " ")
+                         for counter in DAILY_COUNTERS))
+
+    def get_summary(self):
+        """
+        Summarizes the run: the time spent in each phase, the counter totals and, for each sink,
+        the time spent formatting times and the latency histogram of its batch writes
+
+        Returns:
+            summary (Dict<string: object>): phase times in seconds, counter totals and sink stats
+
+        """
+        sink_stats = {}
+        for name, sink in self.sinks.items():
+            sink_stats[name] = {"rows_written": sink.rows_written,
+                                "batches": len(sink.flush_times),
+                                "write_time": sum(sink.flush_times),
+                                "format_time": sink.format_time,
+                                "latency_histogram": get_latency_histogram(sink.flush_times)}
+
+        self.summary = {"days": len(self.dates),
+                        "phase_times": dict(self.phase_times),
+                        "totals": self.get_totals(),
+                        "sinks": sink_stats}
+        return(self.summary)
+
+    def get_summary_string(self):
+        """
+        Formats the run summary for printing
+
+        Returns:
+            summary_string (string): a multi line description of the run
+
+        """
+        summary = self.get_summary()
+        total_time = sum(summary["phase_times"].values())
+
+        lines = ["Simulated " + str(summary["days"]) + " days: " +
+                 ", ".join(str(summary["totals"][counter]) + " " + counter.replace("_", " ")
+                           for counter in DAILY_COUNTERS)]
+        for phase, phase_time in sorted(summary["phase_times"].items(), key = lambda item: -item[1]):
+            lines.append("  " + phase + ": " + str(round(phase_time, 3)) + "s (" +
+                         str(round(100*phase_time/total_time, 1) if total_time > 0 else 0.0) + "%)")
+        for name, sink_stats in summary["sinks"].items():
+            lines.append("  " + name + " sink: " + str(sink_stats["rows_written"]) + " rows in " +
+                         str(sink_stats["batches"]) + " batches, " +
+                         str(round(sink_stats["write_time"], 3)) + "s writing including " +
+                         str(round(sink_stats["format_time"], 3)) + "s formatting times")
+            lines.append("    batch latency: " +
+                         ", ".join(label + " " + str(count)
+                                   for label, count in sink_stats["latency_histogram"] if count > 0))
+        self.summary_string = "\n".join(lines)
+        return(self.summary_string)
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import sqlite3
+from datetime import date, datetime
+from classes.event_buffer_class import EventBuffer
+
+class StorageBackend(object):
+    """
+    A database that Tim's Shoes data is stored in. Backends open connections whose cursors
+    accept the MySQL style %s placeholders used throughout the simulator and reports, and
+    describe the dialect differences the table definitions and bulk loads need.
+
+    """
+    dialect = None
+
+    def __init__(self):
+        self.connection = None
+
+    def connect(self, bulk_load = False):
+        """
+        Opens a connection to the database
+
+        Parameters:
+            bulk_load (boolean): true to tune the connection for loading large volumes of rows
+
+        Returns:
+            connection (Connection): a DB-API connection to the database
+
+        """
+        raise NotImplementedError
+
+    def create_bulk_loader(self, mycursor, table, columns, flush_size = 5000, duplicates = None,
+                           time_column = None):
+        """
+        Creates the fastest available sink for loading rows into a table
+
+        Parameters:
+            mycursor (Cursor): a cursor to perform database operations from Python
+            table (string): the table the rows are loaded into
+            columns (List<string>): the table columns, in the order of the values in each row
+            flush_size (int): the number of buffered rows written at a time
+            duplicates (string): "REPLACE" or "IGNORE" to handle rows with an existing primary key,
+                                 or None to treat them as errors
+            time_column (int): the position of a column holding seconds since midnight, to be
+                               written as HH:MM:SS
+
+        Returns:
+            loader (EventSink): the sink to write the rows through
+
+        """
+        raise NotImplementedError
+
+    def get_upsert_sql(self, table, columns, key_columns):
+        return(get_upsert_sql(self.dialect, table, columns, key_columns))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        return
+
+class MySQLBackend(StorageBackend):
+    """
+    A MySQL server, reached through mysql.connector
+
+    """
+    dialect = "mysql"
+
+    def __init__(self, host, user, password, database, connection_timeout = 28800):
+        """
+        Initialize a MySQLBackend object
+
+        Parameters:
+            host (string): the server host name
+            user (string): the user to log in as
+            password (string): the user's password
+            database (string): the database schema to use
+            connection_timeout (int): the connection timeout in seconds
+
+        """
+        super().__init__()
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+        self.connection_timeout = connection_timeout
+
+    def connect(self, bulk_load = False):
+        # Only needed when MySQL is used, so SQLite runs do not require the connector
+        import mysql.connector
+
+        self.connection = mysql.connector.connect(host = self.host,
+                                                  user = self.user,
+                                                  password = self.password,
+                                                  database = self.database,
+                                                  connection_timeout = self.connection_timeout,
+                                                  allow_local_infile = bulk_load
+                                                  )
+        return(self.connection)
+
+    def create_bulk_loader(self, mycursor, table, columns, flush_size = 5000, duplicates = None,
+                           time_column = None):
+        # Imported here to keep the bulk loader's staging files out of SQLite runs
+        from classes.bulk_loader_class import BulkLoader
+        return(BulkLoader(mycursor, table, columns, flush_size, duplicates = duplicates,
+                          time_column = time_column))
+
+class SQLiteCursor(sqlite3.Cursor):
+    """
+    An SQLite cursor that accepts %s placeholders, so queries written for MySQL run unchanged
+
+    """
+    def execute(self, sql, parameters = ()):
+        return(super().execute(sql.replace("%s", "?"), parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        return(super().executemany(sql.replace("%s", "?"), seq_of_parameters))
+
+class SQLiteConnection(sqlite3.Connection):
+    """
+    An SQLite connection whose cursors accept %s placeholders
+
+    """
+    def cursor(self, factory = SQLiteCursor):
+        return(super().cursor(factory))
+
+class SQLiteBackend(StorageBackend):
+    """
+    An embedded SQLite database file, for running the simulation and reports in-process
+    without a database server
+
+    """
+    dialect = "sqlite"
+
+    def __init__(self, path):
+        """
+        Initialize an SQLiteBackend object
+
+        Parameters:
+            path (string): the database file, or ":memory:" for a temporary in-memory database
+
+        """
+        super().__init__()
+        self.path = path
+
+    def connect(self, bulk_load = False):
+        # Store dates as YYYY-MM-DD text, as MySQL DATE columns compare against date strings,
+        # and read DATE columns back as dates
+        sqlite3.register_adapter(datetime, format_sqlite_datetime)
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_converter("DATE", parse_sqlite_date)
+
+        self.connection = sqlite3.connect(self.path, detect_types = sqlite3.PARSE_DECLTYPES,
+                                          factory = SQLiteConnection)
+
+        # Write ahead logging lets reports read while the simulation writes
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        if bulk_load == True:
+            # Trade crash safety for load speed; a failed load is simply regenerated
+            self.connection.execute("PRAGMA synchronous = OFF")
+            self.connection.execute("PRAGMA temp_store = MEMORY")
+            self.connection.execute("PRAGMA cache_size = -262144")
+        else:
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        return(self.connection)
+
+    def create_bulk_loader(self, mycursor, table, columns, flush_size = 5000, duplicates = None,
+                           time_column = None):
+        # SQLite has no separate bulk loader, but executemany runs in-process without round trips
+        verb = "INSERT OR " + duplicates if duplicates is not None else "INSERT"
+        sql = (verb + " INTO " + table + " (" + ", ".join(columns) + ") VALUES (" +
+               ", ".join(["%s"]*len(columns)) + ")")
+        return(EventBuffer(mycursor, sql, flush_size, time_column))
+
+def get_upsert_sql(dialect, table, columns, key_columns):
+    """
+    Builds a parameterised statement that inserts a row, or updates the other columns of the row
+    with the same key in place. Unlike REPLACE, the existing row is not deleted and reinserted,
+    so its index entries are left alone, and MySQL still batches the statement in executemany.
+
+    Parameters:
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        table (string): the table the rows are written to
+        columns (List<string>): the table columns, in the order of the values in each row
+        key_columns (List<string>): the columns of the primary key
+
+    Returns:
+        sql (string): the upsert statement
+
+    """
+    sql = ("INSERT INTO " + table + " (" + ", ".join(columns) + ") VALUES (" +
+           ", ".join(["%s"]*len(columns)) + ")")
+    update_columns = [column for column in columns if column not in key_columns]
+    if dialect == "sqlite":
+        return(sql + " ON CONFLICT (" + ", ".join(key_columns) + ") DO UPDATE SET " +
+               ", ".join(column + " = excluded." + column for column in update_columns))
+    return(sql + " ON DUPLICATE KEY UPDATE " +
+           ", ".join(column + " = VALUES(" + column + ")" for column in update_columns))
+
+def format_sqlite_datetime(value):
+    """
+    Formats a datetime for SQLite. The simulator uses midnight datetimes for dates, which are
+    stored as plain dates.
+
+    Parameters:
+        value (datetime): the datetime to store
+
+    Returns:
+        text (string): the date, or date and time, in ISO format
+
+    """
+    if value.time() == datetime.min.time():
+        return(value.strftime("%Y-%m-%d"))
+    return(value.isoformat(" "))
+
+def parse_sqlite_date(value):
+    return(date.fromisoformat(value.decode()[:10]))
+
+def create_backend(name = "mysql", database = "timsshoes"):
+    """
+    Creates the storage backend for the Tim's Shoes database
+
+    Parameters:
+        name (string): the backend, either "mysql" for the local MySQL server or "sqlite" for
+                       an SQLite file in the working directory
+        database (string): the database schema name, or SQLite file name without extension
+
+    Returns:
+        backend (StorageBackend): the storage backend
+
+    """
+    if name == "sqlite":
+        return(SQLiteBackend(database + ".db"))
+    return(MySQLBackend(host = "localhost",
+                        user = "root",
+                        password = "Tt556677",
+                        database = database,
+                        connection_timeout = 28800))
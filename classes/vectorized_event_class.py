@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import numpy as np
+from classes.event_class import EventsTable, SECONDS_PER_DAY, RETURNING_FRACTION
+
+class VectorizedEventsTable(EventsTable):
+    """
+    An events table that simulates each day with NumPy arrays, drawing the whole day's products,
+    devices, test groups and purchase outcomes at once rather than one customer at a time.
+    Follows the same statistical model as EventsTable.
+
+    """
+    def prepare_simulation(self):
+        """
+        Builds the random generator and array lookup tables used by the vectorized engine, then
+        sets up the simulator as usual
+
+        Returns:
+            None
+
+        """
+        self.np_rng = np.random.default_rng(self.shard_seed)
+        self.item_id_array = np.array([item[0] for item in self.item_ids])
+
+        # Device makes are padded into a single table indexed by [device type, make]
+        self.device_types = ["computer", "phone", "tablet"]
+        self.device_info_counts = np.array([len(self.device_dict[d]) for d in self.device_types])
+        self.device_info_table = np.full((len(self.device_types), self.device_info_counts.max()),
+                                         "", dtype = object)
+        for i, device_type in enumerate(self.device_types):
+            self.device_info_table[i, :self.device_info_counts[i]] = self.device_dict[device_type]
+        self.device_type_array = np.array(self.device_types, dtype = object)
+
+        super().prepare_simulation()
+        return
+
+    def get_rng_state(self):
+        """
+        Captures the state of the random generators used by the simulation, including the
+        NumPy generator
+
+        Returns:
+            rng_state (Dict<string: object>): the state of each random generator
+
+        """
+        self.rng_state = super().get_rng_state()
+        self.rng_state["numpy"] = self.np_rng.bit_generator.state
+        return(self.rng_state)
+
+    def set_rng_state(self, rng_state):
+        """
+        Restores the random generators used by the simulation to a captured state, including
+        the NumPy generator
+
+        Parameters:
+            rng_state (Dict<string: object>): the state of each random generator
+
+        Returns:
+            None
+
+        """
+        super().set_rng_state(rng_state)
+        if "numpy" in rng_state:
+            self.np_rng.bit_generator.state = rng_state["numpy"]
+        return
+
+    def simulate_day(self):
+        """
+        Randomly generates the new customers and the clickthrough and purchase events for the
+        current day as arrays
+
+        Returns:
+            None
+
+        """
+        # Randomly generate new customers making their first purchase on the day
+        self.start_stats_phase("new_customers")
+        self.num_current_customers = len(self.customers)
+        self.new_customers = self.generate_new_customers(self.num_current_customers, self.date)
+        num_new = len(self.new_customers)
+
+        self.start_stats_phase("event_draws")
+
+        if num_new > 0:
+            new_ids = self.customers.get_customer_ids(self.new_customers)
+
+            # Every new customer clicks through and purchases the viewed product
+            products, device_types, device_infos, click_secs = self.draw_clickthroughs(num_new)
+            purchase_secs = self.draw_purchase_times(click_secs)
+            notes = np.full(num_new, "", dtype = object)
+            self.log_event_arrays(click_secs, "clickthrough", new_ids, products, device_types,
+                                  device_infos, notes)
+            self.log_event_arrays(purchase_secs, "purchase", new_ids, products, device_types,
+                                  device_infos, notes)
+
+            # Randomly select some new customers to sign up for the shoe club
+            joins = self.np_rng.random(num_new) < self.shoe_club_join_prob
+            self.allocate_shoe_club_memberships(self.new_customers[joins])
+
+            self.customer_id_allocation += num_new
+
+        # Select a subset of the existing customers to view an item on the day
+        if self.num_current_customers > 0:
+            ret_indexes = self.draw_returning_customer_indexes(self.num_current_customers)
+            products, device_types, device_infos, click_secs = self.draw_clickthroughs(len(ret_indexes))
+
+            # Drop clickthroughs from devices impacted by the day's bug
+            impacted = self.bug_impacted(device_types, device_infos)
+            self.num_returning_customers = len(ret_indexes)
+            self.bug_suppressed_clicks = int(impacted.sum())
+            unaffected = ~impacted
+            ret_indexes = ret_indexes[unaffected]
+            products = products[unaffected]
+            device_types = device_types[unaffected]
+            device_infos = device_infos[unaffected]
+            click_secs = click_secs[unaffected]
+            num_ret = len(ret_indexes)
+
+            ret_ids = self.customers.get_customer_ids(ret_indexes)
+
+            # Split customers into the A/B test and control groups, and decide who purchases
+            in_test = self.np_rng.random(num_ret) < 0.5
+            purchase_probs = np.where(in_test, self.test_conversion_prob, self.control_conversion_prob)
+            purchases = self.np_rng.random(num_ret) < purchase_probs
+            notes = np.where(in_test, self.test_label + "_test", self.test_label + "_control").astype(object)
+
+            self.log_event_arrays(click_secs, "clickthrough", ret_ids, products, device_types,
+                                  device_infos, notes)
+
+            purchase_secs = self.draw_purchase_times(click_secs[purchases])
+            self.log_event_arrays(purchase_secs, "purchase", ret_ids[purchases], products[purchases],
+                                  device_types[purchases], device_infos[purchases], notes[purchases])
+
+            purchasers = ret_indexes[purchases]
+            self.customers.set_last_purchase_date(purchasers, self.date)
+
+            # Randomly select some purchasing customers to sign up for or churn from the shoe club
+            club_draws = self.np_rng.random(len(purchasers))
+            members = self.customers.is_shoe_club_member(purchasers)
+            self.allocate_shoe_club_memberships(purchasers[~members & (club_draws < self.shoe_club_join_prob)])
+            self.customers.set_shoe_club_status(purchasers[members & (club_draws < 0.005)], False)
+        return
+
+    def allocate_shoe_club_memberships(self, customers):
+        """
+        Assign shoe club membership parameters to customers joining the shoe club. Mutates
+        the customer store
+
+        Parameters:
+            customers (Array<int>): the customer store indexes of customers joining the shoe club
+
+        Returns:
+            None
+
+        """
+        self.customers.set_shoe_club_id(customers, self.np_rng.integers(0, 1000, len(customers)))
+        self.customers.set_shoe_club_signup_date(customers, self.date)
+        self.customers.set_shoe_club_status(customers, True)
+        return
+
+    def draw_returning_customer_indexes(self, num_current_customers):
+        """
+        Draws the indexes of the returning customers for the day, sampled without replacement
+
+        Parameters:
+            num_current_customers (int): current number of registered customers
+
+        Returns:
+            returning_customer_indexes (Array<int>): unique indexes into the customer store
+
+        """
+        num_ret_custs = int(self.np_rng.random()*RETURNING_FRACTION*num_current_customers)
+        self.returning_customer_indexes = self.np_rng.choice(num_current_customers - 1,
+                                                             size = num_ret_custs,
+                                                             replace = False)
+        return(self.returning_customer_indexes)
+
+    def draw_clickthroughs(self, num_events):
+        """
+        Draws the viewed product, user device and click time for a number of clickthroughs
+
+        Parameters:
+            num_events (int): the number of clickthroughs to draw
+
+        Returns:
+            products (Array<int>): the ids of the viewed products
+            device_types (Array<int>): indexes into the device type list
+            device_infos (Array<int>): indexes into the device make list for each device type
+            click_secs (Array<int>): the click times, in seconds since midnight
+
+        """
+        products = self.item_id_array[self.np_rng.integers(0, len(self.item_id_array), num_events)]
+        device_types = self.np_rng.integers(0, len(self.device_types), num_events)
+        device_infos = (self.np_rng.random(num_events) *
+                        self.device_info_counts[device_types]).astype(np.int64)
+
+        # Random hour (0-24) and minute (0-60) offsets from the current time of day
+        click_secs = (self.click_time_origin_secs + 3600*self.np_rng.integers(0, 25, num_events) +
+                      60*self.np_rng.integers(0, 61, num_events)) % SECONDS_PER_DAY
+        return(products, device_types, device_infos, click_secs)
+
+    def draw_purchase_times(self, click_secs):
+        """
+        Draws purchase times a small amount of time after the corresponding clickthroughs.
+        Purchases that run past midnight are counted, and keep the click's date with the time
+        wrapped into the early hours.
+
+        Parameters:
+            click_secs (Array<int>): the click times, in seconds since midnight
+
+        Returns:
+            purchase_secs (Array<int>): the purchase times, in seconds since midnight
+
+        """
+        purchase_secs = click_secs + 60*self.np_rng.integers(0, 61, len(click_secs))
+        wrapped = purchase_secs >= SECONDS_PER_DAY
+        self.wrapped_purchases += int(wrapped.sum())
+        purchase_secs[wrapped] -= SECONDS_PER_DAY
+        return(purchase_secs)
+
+    def bug_impacted(self, device_types, device_infos):
+        """
+        Determines which events are on devices impacted by the current day's bug
+
+        Parameters:
+            device_types (Array<int>): indexes into the device type list
+            device_infos (Array<int>): indexes into the device make list for each device type
+
+        Returns:
+            impacted (Array<bool>): true for events that the bug prevents
+
+        """
+        if self.impacted_device_type == "":
+            return(np.zeros(len(device_types), dtype = bool))
+
+        impacted_type = self.device_types.index(self.impacted_device_type)
+        impacted_makes = np.isin(self.device_info_table[impacted_type], self.impacted_device_info)
+        impacted = np.zeros(len(device_types), dtype = bool)
+        same_type = device_types == impacted_type
+        impacted[same_type] = impacted_makes[device_infos[same_type]]
+        return(impacted)
+
+    def log_event_arrays(self, event_secs, event_type, customer_ids, products, device_types,
+                         device_infos, ab_test_notes):
+        """
+        Adds a batch of events of the same type to the current day's event records
+
+        Parameters:
+            event_secs (Array<int>): the event times, in seconds since midnight
+            event_type (string): the type of the events (clickthrough or purchase)
+            customer_ids (Array<int>): the unique ids of the customers making the events
+            products (Array<int>): the ids of the products involved in the events
+            device_types (Array<int>): indexes into the device type list
+            device_infos (Array<int>): indexes into the device make list for each device type
+            ab_test_notes (Array<string>): identifier tags linking events to tests
+
+        Returns:
+            None
+
+        """
+        num_events = len(event_secs)
+        rows = zip([self.date]*num_events,
+                   event_secs.tolist(),
+                   [event_type]*num_events,
+                   customer_ids.tolist(),
+                   products.tolist(),
+                   self.device_type_array[device_types].tolist(),
+                   self.device_info_table[device_types, device_infos].tolist(),
+                   ["0"]*num_events,
+                   ab_test_notes.tolist())
+        self.day_events.extend(rows)
+        return
@@ -4,40 +4,208 @@
 @author: timpr
 """
 
-import mysql.connector
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from modules.initiate_tables import initiate_base_tables
-from classes.event_class import EventsTable
-from classes.item_class import ItemTable
+from modules.initiate_tables import (initiate_base_tables, create_secondary_indexes, 
+                                     drop_secondary_indexes)
+from classes.event_class import EventsTable, EVENT_COLUMNS, EVENT_TIME_COLUMN
+from classes.vectorized_event_class import VectorizedEventsTable
+from classes.item_class import ItemTable, ITEM_COLUMNS
+from classes.customer_store_class import CUSTOMER_COLUMNS, CUSTOMER_INSERT_SQL
+from classes.event_buffer_class import EventBuffer
+from modules.sharded_simulation import run_sharded_simulation
+from modules.resume_simulation import load_resume_state
+from modules.partition_maintenance import maintain_event_partitions
+from modules.daily_metrics import update_daily_metrics
+from classes.checkpointer_class import Checkpointer
+from classes.event_sink_class import FileSink
+from classes.event_encoder_class import COMPACT_EVENT_COLUMNS
+from classes.simulation_stats_class import SimulationStats
+from classes.memmap_customer_store_class import MemmapCustomerStore
+from classes.storage_backend_class import create_backend
 
 
 if __name__ == "__main__":
-    # Establish connection to timsshoes MySQL database schema
-    mydb = mysql.connector.connect(host="localhost",
-                                   user="root",
-                                   password="Tt556677",
-                                   database = "timsshoes",
-                                   connection_timeout = 28800
-                                   )
+    # Set to True to load rows with the backend's native bulk loader (LOAD DATA LOCAL INFILE for 
+    # MySQL), rather than inserting them through the connector
+    bulk_load = False
+    
+    # Establish connection to the timsshoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect(bulk_load = bulk_load)
         
     mycursor = mydb.cursor()
     
-    # mycursor.execute('''DROP TABLE customers, events, items''')
-    
-    # Initate tables for database
-    initiate_base_tables(mycursor)
+    # mycursor.execute('''DROP TABLE customers, events, items, simulation_run''')
     
     # Date of business launch
     start_date = datetime.strptime("2018-01-01", "%Y-%m-%d")
-                         
-    # Populate items table
-    item_table = ItemTable(mycursor)
+    
+    # Multiplies the daily traffic, and so the number of customers and events, and the number of 
+    # sizes each item is stocked in. modules/row_count_estimates.py estimates the rows produced by
+    # each scale factor. Resumed runs must use the scale factor of the original run.
+    scale_factor = 1
+    
+    # Set to a directory to keep the customers in memory-mapped files there rather than in memory,
+    # releasing the paged in customers whenever the process uses more than memory_budget_mb 
+    # megabytes. Needed once the customers outgrow the generator's memory. A run resumed from a 
+    # checkpoint restores the checkpoint's own store instead.
+    customer_store_dir = None
+    memory_budget_mb = 4096
+    
+    # Set to True to partition the events table by month of event_date (MySQL only), so that
+    # date filtered reports only read the partitions they need and old months can be dropped or
+    # archived whole. Partitions are kept partition_months_ahead months ahead of today.
+    partition_events = False
+    partition_months_ahead = 3
+    
+    # Set to True to store each event's type, device and A/B test as small integer codes, with
+    # their names in lookup tables, which roughly halves the size of the events table. The reports
+    # take the same setting. Resumed runs must use the schema of the original run.
+    compact_schema = False
+    event_columns = COMPACT_EVENT_COLUMNS if compact_schema == True else EVENT_COLUMNS
+    
+    # Set to True to extend an existing database up to today, rather than generating it from scratch
+    resume = False
+    
+    # Save the simulator state and commit every 30 simulated days, so that a run which 
+    # dies can be resumed from its last checkpoint
+    checkpointer = Checkpointer("simulation_checkpoint.pkl", mydb, interval_days = 30)
+    
+    if resume == True:
+        # Continue from the last checkpoint, or failing that from the day after the latest event 
+        # in the database
+        resume_state = checkpointer.load(mycursor)
+        customer_store = None
+        if resume_state is None:
+            if customer_store_dir is not None:
+                customer_store = MemmapCustomerStore(customer_store_dir, memory_budget_mb)
+            resume_state = load_resume_state(mycursor, start_date, customers = customer_store,
+                                             compact_schema = compact_schema)
+    else:
+        resume_state = None
+        if customer_store_dir is not None:
+            customer_store = MemmapCustomerStore(customer_store_dir, memory_budget_mb)
+        else:
+            customer_store = None
+        
+        # Initate tables for database
+        if partition_events == True:
+            partition_months = (start_date, datetime.today() + timedelta(days = 31*partition_months_ahead))
+        else:
+            partition_months = None
+        initiate_base_tables(mycursor, backend.dialect, partition_months, compact_schema)
+        
+        # Checkpoints left by an earlier run do not match the new tables
+        checkpointer.start_run(mycursor)
+                             
+        # Populate items table
+        if bulk_load == True:
+            item_loader = backend.create_bulk_loader(mycursor, "items", ITEM_COLUMNS)
+            item_table = ItemTable(mycursor, loader = item_loader, scale_factor = scale_factor)
+            print(item_loader.get_summary_string())
+        else:
+            item_table = ItemTable(mycursor, scale_factor = scale_factor)
+    
+    # Number of buffered events written to the database per batch
+    flush_size = 5000
+    
+    # Simulation engine, either "python" (one customer at a time) or "vectorized" (NumPy arrays)
+    engine = "python"
+    
+    # Number of worker processes the customer population is split across, and the seed for
+    # their random streams. A seed of None gives a different single process run every time.
+    # Resumed runs always use a single process.
+    num_shards = 1
+    seed = None
+    
+    # Set to a file path to write simulated events to a tab-separated file instead of the events table
+    events_file = None
+    if events_file is not None:
+        event_sink = FileSink(events_file, flush_size, columns = event_columns,
+                              time_column = EVENT_TIME_COLUMN)
+    elif bulk_load == True:
+        event_sink = backend.create_bulk_loader(mycursor, "events", event_columns, flush_size,
+                                                time_column = EVENT_TIME_COLUMN)
+    else:
+        event_sink = None
+    
+    # New customers are inserted, and customers already written by a checkpoint are updated in 
+    # place with the backend's upsert when they change. Failed customer writes are retried row by
+    # row and counted in the summary.
+    if bulk_load == True:
+        customer_sink = backend.create_bulk_loader(mycursor, "customers", CUSTOMER_COLUMNS, flush_size)
+    else:
+        customer_sink = EventBuffer(mycursor, CUSTOMER_INSERT_SQL, flush_size, isolate_errors = True)
+    customer_upsert_sink = EventBuffer(mycursor, backend.get_upsert_sql("customers", CUSTOMER_COLUMNS, 
+                                                                        ["customer_id"]),
+                                       flush_size, isolate_errors = True)
+    
+    # Make sure every month up to the end of the run has its partition
+    if partition_events == True and backend.dialect == "mysql":
+        maintain_event_partitions(mycursor, future_months = partition_months_ahead)
+    
+    # The report indexes are built once the simulation has finished loading the tables. Set to 
+    # True to also drop them before a resumed run and rebuild them afterwards, which is quicker 
+    # when the run adds a large share of the rows.
+    rebuild_indexes = False
+    if resume_state is not None and rebuild_indexes == True:
+        drop_secondary_indexes(mycursor, backend.dialect, compact_schema)
+    
+    # Set to True to time each phase of the simulation and count each day's events, printing 
+    # progress every log_interval_days simulated days (None to only print the final summary).
+    # Stats are not collected for sharded runs.
+    collect_stats = False
+    log_interval_days = 30
+    stats = SimulationStats(log_interval_days) if collect_stats == True else None
     
     # Populate events table
-    events_table = EventsTable(mycursor, start_date)
+    if num_shards > 1 and resume_state is None:
+        event_sink = run_sharded_simulation(mycursor, start_date, seed, num_shards, engine, flush_size,
+                                            sink = event_sink, customer_sink = customer_sink,
+                                            scale_factor = scale_factor, compact_schema = compact_schema)
+    elif engine == "vectorized":
+        event_sink = VectorizedEventsTable(mycursor, start_date, flush_size, seed,
+                                           resume_state = resume_state,
+                                           checkpointer = checkpointer,
+                                           sink = event_sink,
+                                           customer_sink = customer_sink,
+                                           customer_upsert_sink = customer_upsert_sink,
+                                           dialect = backend.dialect,
+                                           stats = stats,
+                                           scale_factor = scale_factor,
+                                           customer_store = customer_store,
+                                           compact_schema = compact_schema).event_sink
+    else:
+        event_sink = EventsTable(mycursor, start_date, flush_size, seed,
+                                 resume_state = resume_state,
+                                 checkpointer = checkpointer,
+                                 sink = event_sink,
+                                 customer_sink = customer_sink,
+                                 customer_upsert_sink = customer_upsert_sink,
+                                 dialect = backend.dialect,
+                                 stats = stats,
+                                 scale_factor = scale_factor,
+                                 customer_store = customer_store,
+                                 compact_schema = compact_schema).event_sink
+    print(event_sink.get_summary_string())
+    print(customer_sink.get_summary_string())
+    print(customer_upsert_sink.get_summary_string())
+    if stats is not None:
+        print(stats.get_summary_string())
     
     # Save additions to MySQL database
     mydb.commit()
+    
+    # Build the indexes used by the reports
+    print("Built indexes: " + str(create_secondary_indexes(mycursor, backend.dialect, compact_schema)))
+    mydb.commit()
+    
+    # Set to True to add the new events to the daily_metrics rollup, which the reports can read 
+    # in place of the events table. Only events written since the last update are read.
+    update_rollup = True
+    if update_rollup == True:
+        print("Rolled up events: " + str(update_daily_metrics(mycursor, backend.dialect, compact_schema)))
+        mydb.commit()
 
 
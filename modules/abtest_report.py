@@ -5,15 +5,20 @@
 """
 import matplotlib.pyplot as plt
 import scipy.stats as scs
-import mysql.connector
+from classes.storage_backend_class import create_backend
+from classes.event_encoder_class import AB_TEST_GROUPS, get_ab_test_id
+from modules.daily_metrics import get_ab_test_counts
 
-def produce_abtest_report(mycursor, test_name):
+def produce_abtest_report(mycursor, test_name, compact_schema = False, use_rollup = False):
     """
     Produces a html report summarizing the results of an A/B test
     
     Parameters:
         mycursor (MySQL Cursor): a cursor to perform database operations from Python
         test_name (string): the name of the A/B test, referenced in the database
+        compact_schema (boolean): true if the events table uses the compact schema
+        use_rollup (boolean): true to read the event counts from the daily_metrics rollup, 
+                              kept up to date with update_daily_metrics, rather than the events
         
     Returns:
         None
@@ -24,65 +29,96 @@ def produce_abtest_report(mycursor, test_name):
     control_string = test_name + "_control"
     test_string = test_name + "_test"
     
-    # Create a temporary table to store data for querying
-    mycursor.execute('''CREATE TABLE ab_test_summary AS 
-                          SELECT 
-                    	      event_date, 
-                              event_type, 
-                              product_id, 
-                              device_type, 
-                              device_info, 
-                              ab_test_notes 
-                          FROM 
-                    	     events 
-                          WHERE 
-                    	     ab_test_notes = "''' + test_string + '''"  
-                          OR
-                             ab_test_notes = "''' + control_string + '''"''')
+    if use_rollup == True:
+        # Read each group's event counts from the daily_metrics rollup
+        test_counts = get_ab_test_counts(mycursor, test_name, compact_schema)
+        num_control_clickthroughs = test_counts.get(("control", "clickthrough"), 0)
+        num_test_clickthroughs = test_counts.get(("test", "clickthrough"), 0)
+        num_control_purchases = test_counts.get(("control", "purchase"), 0)
+        num_test_purchases = test_counts.get(("test", "purchase"), 0)
+    else:
+        # Create a temporary table to store data for querying
+        if compact_schema == True:
+            # The compact schema identifies the groups by the test id and a group bit
+            group_column = "ab_test_group"
+            control_group = AB_TEST_GROUPS.index("control")
+            test_group = AB_TEST_GROUPS.index("test")
+            mycursor.execute('''CREATE TABLE ab_test_summary AS 
+                                  SELECT 
+                            	      events.event_date AS event_date, 
+                                      event_types.event_type AS event_type, 
+                                      events.product_id AS product_id, 
+                                      events.ab_test_group AS ab_test_group 
+                                  FROM 
+                            	     events 
+                                  INNER JOIN 
+                                     event_types 
+                                  ON 
+                                     events.event_type_id = event_types.event_type_id 
+                                  WHERE 
+                            	     events.ab_test_id = %s''', (get_ab_test_id(test_name),))
+        else:
+            group_column = "ab_test_notes"
+            control_group = control_string
+            test_group = test_string
+            mycursor.execute('''CREATE TABLE ab_test_summary AS 
+                                  SELECT 
+                            	      event_date, 
+                                      event_type, 
+                                      product_id, 
+                                      device_type, 
+                                      device_info, 
+                                      ab_test_notes 
+                                  FROM 
+                            	     events 
+                                  WHERE 
+                            	     ab_test_notes = %s  
+                                  OR
+                                     ab_test_notes = %s''', (test_string, control_string))
          
-    # Total control group clickthroughs during test
-    mycursor.execute('''SELECT 
-                            COUNT(event_date) 
-                        FROM 
-                            ab_test_summary 
-                        WHERE 
-                            event_type = "clickthrough"
-                        AND
-                            ab_test_notes = "''' + control_string + '''"''')                           
-    num_control_clickthroughs = mycursor.fetchall()[0][0]
+        # Total control group clickthroughs during test
+        mycursor.execute('''SELECT 
+                                COUNT(event_date) 
+                            FROM 
+                                ab_test_summary 
+                            WHERE 
+                                event_type = 'clickthrough'
+                            AND
+                                ''' + group_column + ''' = %s''', (control_group,))                           
+        num_control_clickthroughs = mycursor.fetchall()[0][0]
 
-    # Total test group clickthroughs during test
-    mycursor.execute('''SELECT 
-                            COUNT(event_date) 
-                        FROM 
-                            ab_test_summary 
-                        WHERE 
-                            event_type = "clickthrough"
-                        AND
-                            ab_test_notes = "''' + test_string + '''"''')
-    num_test_clickthroughs = mycursor.fetchall()[0][0]
+        # Total test group clickthroughs during test
+        mycursor.execute('''SELECT 
+                                COUNT(event_date) 
+                            FROM 
+                                ab_test_summary 
+                            WHERE 
+                                event_type = 'clickthrough'
+                            AND
+                                ''' + group_column + ''' = %s''', (test_group,))
+        num_test_clickthroughs = mycursor.fetchall()[0][0]
     
-    # Total control group purchases during test
-    mycursor.execute('''SELECT 
-                            COUNT(event_date) 
-                        FROM 
-                            ab_test_summary 
-                        WHERE 
-                            event_type = "purchase"
-                        AND
-                            ab_test_notes = "''' + control_string + '''"''')  
-    num_control_purchases = mycursor.fetchall()[0][0]    
+        # Total control group purchases during test
+        mycursor.execute('''SELECT 
+                                COUNT(event_date) 
+                            FROM 
+                                ab_test_summary 
+                            WHERE 
+                                event_type = 'purchase'
+                            AND
+                                ''' + group_column + ''' = %s''', (control_group,))  
+        num_control_purchases = mycursor.fetchall()[0][0]    
      
-    # Total test group purchases during test
-    mycursor.execute('''SELECT 
-                            COUNT(event_date) 
-                        FROM 
-                            ab_test_summary 
-                        WHERE 
-                            event_type = "purchase"
-                        AND
-                            ab_test_notes = "''' + test_string + '''"''')  
-    num_test_purchases = mycursor.fetchall()[0][0]                   
+        # Total test group purchases during test
+        mycursor.execute('''SELECT 
+                                COUNT(event_date) 
+                            FROM 
+                                ab_test_summary 
+                            WHERE 
+                                event_type = 'purchase'
+                            AND
+                                ''' + group_column + ''' = %s''', (test_group,))  
+        num_test_purchases = mycursor.fetchall()[0][0]
     
     # Calculate test statistics
     # Refer to https://en.wikipedia.org/wiki/Statistical_hypothesis_testing
@@ -107,7 +143,8 @@ def produce_abtest_report(mycursor, test_name):
     generate_html_report(pA, pB, nA, nB, z, test_outcome, test_name, plot_name)
     
     # Delete temporary table to clean up database
-    mycursor.execute("DROP TABLE ab_test_summary") 
+    if use_rollup == False:
+        mycursor.execute("DROP TABLE ab_test_summary") 
         
     return
 
@@ -166,7 +203,8 @@ def create_distribution_plots(nA, nB, pA, pB, plot_name):
     
     return
 
-def generate_html_report(pA, pB, nA, nB, z, test_outcome, test_name, plot_name):
+def generate_html_report(pA, pB, nA, nB, z, test_outcome, test_name, plot_name, 
+                         report_name = "ab_test_report.html"):
     """
     Writes A/B test summary report to html
     
@@ -179,6 +217,7 @@ def generate_html_report(pA, pB, nA, nB, z, test_outcome, test_name, plot_name):
         test_outcome (string): the conclusion drawn from the test
         test_name (string): the name of the active A/B test
         plot_name (string): the filename of the plot chart associated with the test
+        report_name (string): the filename to write the report to
     
     Returns:
         None
@@ -283,18 +322,21 @@ def generate_html_report(pA, pB, nA, nB, z, test_outcome, test_name, plot_name):
     
     css_file = open("ab_test_styles.css", "w")
     css_file.write(css_string)
-    html_file = open("ab_test_report.html", "w")
+    html_file = open(report_name, "w")
     html_file.write(html_string)
     
     return
 
 if __name__ == "__main__":
-    mydb = mysql.connector.connect(host="localhost",
-                                   user="root",
-                                   password="Tt556677",
-                                   database = "timsshoes",
-                                   connection_timeout = 28800
-                                   )    
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
     mycursor = mydb.cursor()
     
-    produce_abtest_report(mycursor, "Test_50")
\ No newline at end of file
+    # Set to True if the database was generated with the compact events schema
+    compact_schema = False
+    
+    # Set to True to read the daily_metrics rollup rather than the events table
+    use_rollup = False
+    
+    produce_abtest_report(mycursor, "Test_50", compact_schema, use_rollup)
\ No newline at end of file
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+from modules.initiate_tables import initiate_base_tables, create_secondary_indexes
+from modules.daily_metrics import update_daily_metrics
+from modules.daily_report import produce_daily_report
+from modules.kpi_report import produce_kpi_snapshot_report
+from modules.abtest_report import produce_abtest_report
+from modules.shoe_club_growth_report import produce_shoe_club_growth_report
+from classes.event_class import EventsTable, EVENT_COLUMNS, EVENT_TIME_COLUMN
+from classes.vectorized_event_class import VectorizedEventsTable
+from classes.item_class import ItemTable, ITEM_COLUMNS
+from classes.customer_store_class import CUSTOMER_COLUMNS
+from classes.recording_cursor_class import RecordingCursor
+from classes.storage_backend_class import SQLiteBackend, create_backend
+
+# Peak memory is read from the operating system's resource usage, which Windows does not provide
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Date the simulated website goes live in every benchmark
+BENCHMARK_START_DATE = datetime(2018, 1, 1)
+
+# Reports benchmarked against each database, in the order they are run
+REPORT_NAMES = ["daily_report", "kpi_report", "abtest_report", "shoe_club_growth_report"]
+
+def get_peak_rss_mb():
+    """
+    Finds the largest resident memory the current process has used so far
+
+    Returns:
+        peak_rss_mb (float): the peak resident set size in megabytes, or None where unavailable
+
+    """
+    if resource is None:
+        return(None)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes and macOS bytes
+    if sys.platform == "darwin":
+        return(peak_rss / 2**20)
+    return(peak_rss / 2**10)
+
+def connect_target(target, work_dir, bulk_load = False):
+    """
+    Opens the database a benchmark runs against
+
+    Parameters:
+        target (string): "recording" for an in-process RecordingCursor, "sqlite" for an SQLite
+                         file in the working directory or "mysql" for the local MySQL server
+        work_dir (string): the directory benchmark databases and reports are written to
+        bulk_load (boolean): true to tune the connection for loading large volumes of rows
+
+    Returns:
+        backend (StorageBackend): the storage backend, None for the recording cursor
+        mydb (Connection): the database connection, None for the recording cursor
+        mycursor (Cursor): the cursor to benchmark with
+
+    """
+    if target == "recording":
+        # Only count the inserted rows, so memory use reflects the simulator rather than the cursor
+        return(None, None, RecordingCursor(keep_rows = False))
+
+    if target == "sqlite":
+        backend = SQLiteBackend(os.path.join(work_dir, "benchmark.db"))
+    else:
+        backend = create_backend("mysql", database = "timsshoes_benchmark")
+    mydb = backend.connect(bulk_load = bulk_load)
+    return(backend, mydb, mydb.cursor())
+
+def reset_database(backend, mycursor):
+    """
+    Drops the tables of an earlier benchmark and creates empty ones
+
+    Parameters:
+        backend (StorageBackend): the storage backend holding the benchmark database
+        mycursor (Cursor): a cursor to perform database operations from Python
+
+    Returns:
+        None
+
+    """
+    for table in ["customers", "events", "items", "daily_metrics", "daily_metrics_watermark",
+                  "simulation_run"]:
+        mycursor.execute('''DROP TABLE IF EXISTS ''' + table)
+    initiate_base_tables(mycursor, backend.dialect)
+    return
+
+def benchmark_item_table(case):
+    """
+    Times the creation of the items table
+
+    Parameters:
+        case (Dict<string: object>): the benchmark settings, as built by get_benchmark_cases
+
+    Returns:
+        result (Dict<string: object>): the number of items and the wall time in seconds
+
+    """
+    backend, mydb, mycursor = connect_target(case["target"], case["work_dir"], case["bulk_load"])
+    if backend is not None:
+        reset_database(backend, mycursor)
+
+    start_time = time.perf_counter()
+    if case["bulk_load"] == True and backend is not None:
+        ItemTable(mycursor, loader = backend.create_bulk_loader(mycursor, "items", ITEM_COLUMNS))
+    else:
+        ItemTable(mycursor)
+    if mydb is not None:
+        mydb.commit()
+    wall_time = time.perf_counter() - start_time
+
+    if mydb is not None:
+        mycursor.execute('''SELECT COUNT(*) FROM items''')
+        num_items = mycursor.fetchall()[0][0]
+        backend.close()
+    else:
+        num_items = mycursor.get_row_count("items")
+    return({"items": num_items, "wall_time": wall_time})
+
+def benchmark_events_table(case):
+    """
+    Times the simulation of the events and customers tables over a number of years. Database
+    targets are left holding the simulated tables and their report indexes, for the report 
+    benchmarks that follow.
+
+    Parameters:
+        case (Dict<string: object>): the benchmark settings, as built by get_benchmark_cases
+
+    Returns:
+        result (Dict<string: object>): the number of events and customers, the wall time in
+                                       seconds, the events simulated per second and the time
+                                       taken to build the indexes and the daily_metrics rollup
+
+    """
+    backend, mydb, mycursor = connect_target(case["target"], case["work_dir"], case["bulk_load"])
+    if backend is not None:
+        reset_database(backend, mycursor)
+    item_table = ItemTable(mycursor)
+    if mydb is not None:
+        mydb.commit()
+
+    if case["bulk_load"] == True and backend is not None:
+        event_sink = backend.create_bulk_loader(mycursor, "events", EVENT_COLUMNS, case["flush_size"],
+                                                time_column = EVENT_TIME_COLUMN)
+        customer_sink = backend.create_bulk_loader(mycursor, "customers", CUSTOMER_COLUMNS,
+                                                   case["flush_size"])
+    else:
+        event_sink = None
+        customer_sink = None
+
+    if case["engine"] == "vectorized":
+        table_class = VectorizedEventsTable
+    else:
+        table_class = EventsTable
+    end_date = BENCHMARK_START_DATE + timedelta(days = round(365*case["years"]))
+
+    start_time = time.perf_counter()
+    events_table = table_class(mycursor, BENCHMARK_START_DATE, case["flush_size"], case["seed"],
+                               item_ids = item_table.get_item_ids(), end_date = end_date,
+                               sink = event_sink, customer_sink = customer_sink)
+    if mydb is not None:
+        mydb.commit()
+    wall_time = time.perf_counter() - start_time
+
+    num_events = events_table.event_sink.rows_written
+    num_customers = events_table.customer_sink.rows_written if events_table.customer_sink is not None else 0
+    result = {"events": num_events,
+              "customers": num_customers,
+              "wall_time": wall_time,
+              "events_per_sec": num_events / wall_time if wall_time > 0 else 0.0}
+
+    if backend is not None:
+        index_start = time.perf_counter()
+        create_secondary_indexes(mycursor, backend.dialect)
+        mydb.commit()
+        result["index_time"] = time.perf_counter() - index_start
+
+        rollup_start = time.perf_counter()
+        update_daily_metrics(mycursor, backend.dialect)
+        mydb.commit()
+        result["rollup_time"] = time.perf_counter() - rollup_start
+        backend.close()
+    return(result)
+
+def benchmark_report(case):
+    """
+    Times one of the reports against the database left by the preceding events table benchmark.
+    Report dates are chosen from the end of the simulated period, so every scale reports on a
+    period with data.
+
+    Parameters:
+        case (Dict<string: object>): the benchmark settings, as built by get_benchmark_cases
+
+    Returns:
+        result (Dict<string: object>): the number of events in the database, the wall time in
+                                       seconds and the events covered per second
+
+    """
+    backend, mydb, mycursor = connect_target(case["target"], case["work_dir"])
+    mycursor.execute('''SELECT COUNT(*) FROM events''')
+    num_events = mycursor.fetchall()[0][0]
+
+    # Reports write their pages and plots to the working directory
+    os.chdir(case["work_dir"])
+
+    num_days = round(365*case["years"])
+    report_date = BENCHMARK_START_DATE + timedelta(days = num_days - 1)
+
+    start_time = time.perf_counter()
+    if case["report"] == "daily_report":
+        produce_daily_report(mycursor, report_date, use_rollup = case["use_rollup"])
+    elif case["report"] == "kpi_report":
+        produce_kpi_snapshot_report(mycursor, report_date, use_rollup = case["use_rollup"])
+    elif case["report"] == "abtest_report":
+        # The last A/B test to run for its full two weeks
+        produce_abtest_report(mycursor, "Test_" + str((num_days - 1) // 14), 
+                              use_rollup = case["use_rollup"])
+    else:
+        # A 30 day window ending a month before the end, leaving room for the plotted margins
+        camp_end_date = report_date - timedelta(days = 31)
+        produce_shoe_club_growth_report(mycursor, camp_end_date - timedelta(days = 30), camp_end_date)
+    wall_time = time.perf_counter() - start_time
+
+    backend.close()
+    return({"events": num_events,
+            "wall_time": wall_time,
+            "events_per_sec": num_events / wall_time if wall_time > 0 else 0.0})
+
+def run_benchmark_case(case):
+    """
+    Runs a single benchmark and measures the peak memory of the process it ran in. A benchmark
+    that fails records its error rather than stopping the suite.
+
+    Parameters:
+        case (Dict<string: object>): the benchmark settings, as built by get_benchmark_cases
+
+    Returns:
+        result (Dict<string: object>): the benchmark measurements, with the peak resident memory
+                                       in megabytes
+
+    """
+    benchmark_functions = {"item_table": benchmark_item_table,
+                           "events_table": benchmark_events_table,
+                           "report": benchmark_report}
+    try:
+        result = benchmark_functions[case["kind"]](case)
+    except Exception as error:
+        result = {"error": repr(error)}
+    result["peak_rss_mb"] = get_peak_rss_mb()
+    return(result)
+
+def get_benchmark_cases(scales, engines, targets, work_dir, seed = 0, flush_size = 5000,
+                        bulk_load = False, use_rollup = False):
+    """
+    Lists the benchmarks to run. The items table is benchmarked once per target. The simulator
+    is benchmarked for every scale, engine and target, and each database it fills is then used to
+    benchmark the reports. Reports need query results, so they are skipped for the recording cursor.
+
+    Parameters:
+        scales (List<float>): the numbers of years to simulate
+        engines (List<string>): the simulation engines, "python" and/or "vectorized"
+        targets (List<string>): the cursors to benchmark against, "recording", "sqlite" and/or "mysql"
+        work_dir (string): the directory benchmark databases and reports are written to
+        seed (int): the seed for every simulation, so runs are comparable
+        flush_size (int): the number of buffered events written at a time
+        bulk_load (boolean): true to load database targets with the backend's bulk loader
+        use_rollup (boolean): true for the reports to read the daily_metrics rollup rather than
+                              the events table
+
+    Returns:
+        cases (List<Dict<string: object>>): the settings of each benchmark, in the order to run them
+
+    """
+    base_case = {"work_dir": work_dir, "seed": seed, "flush_size": flush_size, "bulk_load": bulk_load,
+                 "use_rollup": use_rollup}
+
+    cases = []
+    for target in targets:
+        cases.append(dict(base_case, name = "item_table/" + target, kind = "item_table", target = target))
+
+    for years in scales:
+        for engine in engines:
+            for target in targets:
+                suffix = "/" + target + "/" + str(years) + "y"
+                cases.append(dict(base_case, name = "events_table/" + engine + suffix,
+                                  kind = "events_table", target = target, engine = engine,
+                                  years = years))
+                if target == "recording":
+                    continue
+                for report in REPORT_NAMES:
+                    cases.append(dict(base_case, name = report + "/" + engine + suffix, kind = "report",
+                                      target = target, engine = engine, years = years, report = report))
+    return(cases)
+
+def run_benchmarks(cases):
+    """
+    Runs each benchmark in a fresh worker process, so that its peak memory is measured on its own
+
+    Parameters:
+        cases (List<Dict<string: object>>): the benchmarks, as built by get_benchmark_cases
+
+    Returns:
+        results (Dict<string: Dict>): the measurements of each benchmark, keyed by benchmark name
+
+    """
+    results = {}
+    for case in cases:
+        os.makedirs(case["work_dir"], exist_ok = True)
+        with Pool(1) as pool:
+            results[case["name"]] = pool.apply(run_benchmark_case, (case,))
+        print(format_result(case["name"], results[case["name"]]))
+    return(results)
+
+def format_result(name, result):
+    """
+    Formats a benchmark result for printing
+
+    Parameters:
+        name (string): the benchmark name
+        result (Dict<string: object>): the benchmark measurements
+
+    Returns:
+        result_string (string): a single line description of the benchmark result
+
+    """
+    if "error" in result:
+        return(name + ": failed with " + result["error"])
+
+    result_string = name + ": " + str(round(result["wall_time"], 3)) + "s"
+    if "events_per_sec" in result:
+        result_string += ", " + str(int(result["events_per_sec"])) + " events/s"
+    if result["peak_rss_mb"] is not None:
+        result_string += ", peak RSS " + str(round(result["peak_rss_mb"], 1)) + " MB"
+    return(result_string)
+
+def save_baseline(results, path):
+    """
+    Writes benchmark results to a JSON baseline file, with a note of the machine they were
+    recorded on
+
+    Parameters:
+        results (Dict<string: Dict>): the measurements of each benchmark, keyed by benchmark name
+        path (string): the baseline file
+
+    Returns:
+        None
+
+    """
+    baseline = {"recorded": datetime.now().isoformat(timespec = "seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results}
+    with open(path, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent = 2, sort_keys = True)
+    return
+
+def load_baseline(path):
+    """
+    Reads the benchmark results of a JSON baseline file
+
+    Parameters:
+        path (string): the baseline file
+
+    Returns:
+        results (Dict<string: Dict>): the baseline measurements keyed by benchmark name, or None
+                                      if there is no baseline file
+
+    """
+    if not os.path.exists(path):
+        return(None)
+    with open(path) as baseline_file:
+        return(json.load(baseline_file)["results"])
+
+def find_regressions(results, baseline_results, threshold = 0.2):
+    """
+    Compares benchmark results with a baseline. A benchmark has regressed if its wall time or
+    peak memory grew, or its events per second fell, by more than the threshold, and a benchmark
+    that failed is always reported.
+
+    Parameters:
+        results (Dict<string: Dict>): the measurements of each benchmark, keyed by benchmark name
+        baseline_results (Dict<string: Dict>): the baseline measurements, keyed by benchmark name
+        threshold (float): the allowed relative change, e.g. 0.2 for 20%
+
+    Returns:
+        regressions (List<string>): a description of each regression found
+
+    """
+    regressions = []
+    for name, result in results.items():
+        # A failed benchmark measured nothing, so it is reported whatever the baseline holds
+        if "error" in result:
+            regressions.append(name + ": failed with " + result["error"])
+            continue
+        baseline = baseline_results.get(name)
+        if baseline is None or "error" in baseline:
+            continue
+
+        # Larger is worse for time and memory, smaller is worse for throughput
+        for metric, higher_is_worse in [("wall_time", True), ("peak_rss_mb", True),
+                                        ("events_per_sec", False)]:
+            if result.get(metric) is None or not baseline.get(metric):
+                continue
+            change = result[metric] / baseline[metric] - 1
+            if (change > threshold and higher_is_worse) or (-change > threshold and not higher_is_worse):
+                regressions.append(name + ": " + metric + " changed from " +
+                                   str(round(baseline[metric], 3)) + " to " +
+                                   str(round(result[metric], 3)) + " (" +
+                                   str(round(100*change, 1)) + "%)")
+    return(regressions)
+
+if __name__ == "__main__":
+    # Numbers of simulated years to benchmark at
+    scales = [1, 3, 8]
+
+    # Simulation engines, "python" and/or "vectorized"
+    engines = ["python", "vectorized"]
+
+    # Cursors to benchmark against: "recording" keeps rows in process, "sqlite" writes to a local
+    # SQLite file and "mysql" to the timsshoes_benchmark schema on the local MySQL server
+    targets = ["recording", "sqlite"]
+
+    # Directory for the benchmark databases and reports, and the baseline file results are compared
+    # with. The committed baseline was recorded from the repository root with these settings.
+    work_dir = "benchmark_output"
+    baseline_path = "benchmark_baseline.json"
+
+    # Relative change in a measurement that is flagged as a regression
+    threshold = 0.2
+
+    # Set to True to replace the baseline with this run's results
+    update_baseline = False
+
+    cases = get_benchmark_cases(scales, engines, targets, os.path.abspath(work_dir))
+    results = run_benchmarks(cases)
+
+    # A failed benchmark fails the run, rather than leaving a gap in the baseline or comparison
+    failures = [name for name, result in results.items() if "error" in result]
+    if len(failures) > 0:
+        raise RuntimeError(str(len(failures)) + " benchmarks failed: " + ", ".join(failures))
+
+    baseline_results = load_baseline(baseline_path)
+    if baseline_results is None or update_baseline == True:
+        save_baseline(results, baseline_path)
+        print("Saved baseline to " + baseline_path)
+    else:
+        regressions = find_regressions(results, baseline_results, threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        print(str(len(regressions)) + " regressions against " + baseline_path)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from classes.storage_backend_class import create_backend
+from classes.event_encoder_class import EVENT_TYPES, AB_TEST_GROUPS
+from modules.daily_metrics import get_all_ab_test_counts
+from modules.abtest_report import create_distribution_plots, generate_html_report
+
+def produce_bulk_abtest_report(mycursor, compact_schema = False, use_rollup = False,
+                               per_test_pages = True):
+    """
+    Produces a html report summarizing the results of every A/B test, from a single grouped
+    count of the events of each test, and optionally a report page for each test
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        compact_schema (boolean): true if the events table uses the compact schema
+        use_rollup (boolean): true to read the event counts from the daily_metrics rollup,
+                              kept up to date with update_daily_metrics, rather than the events
+        per_test_pages (boolean): true to also write a report and distribution plot for each test
+
+    Returns:
+        test_names (List<string>): the names of the tests reported on, in test order
+
+    """
+    if use_rollup == True:
+        test_counts = get_all_ab_test_counts(mycursor, compact_schema)
+    else:
+        test_counts = get_ab_test_event_counts(mycursor, compact_schema)
+    test_names, clickthroughs, purchases = get_ab_test_arrays(test_counts)
+
+    # Calculate test statistics for every test at once
+    pA, pB, nA, nB, z = calculate_test_statistics(clickthroughs, purchases)
+
+    # A group without clickthroughs, or a test without purchases, gives no z score, and the test
+    # is inconclusive
+    adopt_change = np.abs(np.nan_to_num(z)) > 1.96
+    test_outcomes = np.where(adopt_change, "Adopt test change", "Test inconclusive")
+
+    report_names = [None]*len(test_names)
+    if per_test_pages == True:
+        for i in range(len(test_names)):
+            # Tests without a z score have nothing to plot
+            if np.isfinite(z[i]) == False:
+                continue
+            report_names[i] = "ab_test_report_" + test_names[i] + ".html"
+            plot_name = "distribution_plots_" + test_names[i] + ".png"
+
+            # Draw each test's plot on a figure of its own
+            plt.figure()
+            create_distribution_plots(int(nA[i]), int(nB[i]), float(pA[i]), float(pB[i]), plot_name)
+            plt.close()
+            generate_html_report(float(pA[i]), float(pB[i]), int(nA[i]), int(nB[i]), float(z[i]),
+                                 str(test_outcomes[i]), test_names[i], plot_name, report_names[i])
+
+    # Generate HTML report summarizing every test
+    generate_summary_html_report(test_names, pA, pB, nA, nB, z, test_outcomes, report_names)
+
+    return(test_names)
+
+def get_ab_test_event_counts(mycursor, compact_schema = False):
+    """
+    Counts the events of each group of every A/B test in one pass over the events table
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        test_counts (Dict<Tuple<string, string, string>: int>): the number of events for each
+                                                                test, such as "Test_50", group
+                                                                and event type
+
+    """
+    if compact_schema == True:
+        mycursor.execute('''SELECT
+                                ab_test_id,
+                                ab_test_group,
+                                event_type_id,
+                                COUNT(*)
+                            FROM
+                                events
+                            WHERE
+                                ab_test_id > 0
+                            GROUP BY
+                                ab_test_id,
+                                ab_test_group,
+                                event_type_id''')
+        return({("Test_" + str(test_id), AB_TEST_GROUPS[group], EVENT_TYPES[event_type_id - 1]): num_events
+                for test_id, group, event_type_id, num_events in mycursor.fetchall()})
+
+    mycursor.execute('''SELECT
+                            ab_test_notes,
+                            event_type,
+                            COUNT(*)
+                        FROM
+                            events
+                        WHERE
+                            ab_test_notes <> ''
+                        GROUP BY
+                            ab_test_notes,
+                            event_type''')
+    return({tuple(note.rsplit("_", 1)) + (event_type,): num_events
+            for note, event_type, num_events in mycursor.fetchall()})
+
+def get_ab_test_arrays(test_counts):
+    """
+    Arranges the event counts of every A/B test into arrays, one row per test
+
+    Parameters:
+        test_counts (Dict<Tuple<string, string, string>: int>): the number of events for each
+                                                                test, group and event type
+
+    Returns:
+        test_names (List<string>): the name of each test, in test order
+        clickthroughs (Array<int>): the clickthroughs of each test's control and test groups
+        purchases (Array<int>): the purchases of each test's control and test groups
+
+    """
+    test_names = sorted(set(key[0] for key in test_counts), key = lambda name: int(name.split("_")[1]))
+    test_rows = {test_name: i for i, test_name in enumerate(test_names)}
+
+    clickthroughs = np.zeros((len(test_names), len(AB_TEST_GROUPS)), dtype = np.int64)
+    purchases = np.zeros((len(test_names), len(AB_TEST_GROUPS)), dtype = np.int64)
+    for (test_name, group, event_type), num_events in test_counts.items():
+        if event_type == "clickthrough":
+            clickthroughs[test_rows[test_name], AB_TEST_GROUPS.index(group)] = num_events
+        elif event_type == "purchase":
+            purchases[test_rows[test_name], AB_TEST_GROUPS.index(group)] = num_events
+    return(test_names, clickthroughs, purchases)
+
+def calculate_test_statistics(clickthroughs, purchases):
+    """
+    Calculates the conversion rates and z score of every A/B test at once
+    Refer to https://en.wikipedia.org/wiki/Statistical_hypothesis_testing
+
+    Parameters:
+        clickthroughs (Array<int>): the clickthroughs of each test's control and test groups
+        purchases (Array<int>): the purchases of each test's control and test groups
+
+    Returns:
+        pA (Array<float>): the conversion rate of each test's control group
+        pB (Array<float>): the conversion rate of each test's test group
+        nA (Array<int>): the clickthroughs of each test's control group
+        nB (Array<int>): the clickthroughs of each test's test group
+        z (Array<float>): the z score of each test, nan if it cannot be calculated
+
+    """
+    nA = clickthroughs[:, AB_TEST_GROUPS.index("control")]
+    nB = clickthroughs[:, AB_TEST_GROUPS.index("test")]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        pA = purchases[:, AB_TEST_GROUPS.index("control")] / nA
+        pB = purchases[:, AB_TEST_GROUPS.index("test")] / nB
+        p_hat = (nA*pA + nB*pB)/(nA + nB)
+        z = (pA - pB)/(p_hat*(1-p_hat)*((1/nA) + (1/nB)))**0.5
+    return(pA, pB, nA, nB, z)
+
+def generate_summary_html_report(test_names, pA, pB, nA, nB, z, test_outcomes, report_names):
+    """
+    Writes the summary of every A/B test to html
+
+    Parameters:
+        test_names (List<string>): the name of each test
+        pA (Array<float>): the conversion rate of each test's control group
+        pB (Array<float>): the conversion rate of each test's test group
+        nA (Array<int>): the clickthroughs of each test's control group
+        nB (Array<int>): the clickthroughs of each test's test group
+        z (Array<float>): the z score of each test
+        test_outcomes (Array<string>): the conclusion drawn from each test
+        report_names (List<string>): the filename of each test's own report, or None if it has none
+
+    Returns:
+        None
+
+    """
+    table_rows = ''''''
+    for i in range(len(test_names)):
+        if report_names[i] is not None:
+            test_cell = '''<a href = "''' + report_names[i] + '''">''' + test_names[i] + '''</a>'''
+        else:
+            test_cell = test_names[i]
+        table_rows += '''
+                                 <tr>
+                                     <td>''' + test_cell + '''</td>
+                                     <td>''' + str(int(nA[i])) + '''</td>
+                                     <td>''' + str(int(nB[i])) + '''</td>
+                                     <td>''' + str(round(100*float(pA[i]),1)) + '''%</td>
+                                     <td>''' + str(round(100*float(pB[i]),1)) + '''%</td>
+                                     <td>''' + str(round(abs(float(z[i])),3)) + '''</td>
+                                     <td>''' + str(test_outcomes[i]) + '''</td>
+                                 </tr>'''
+
+    html_string = '''
+                 <html>
+                     <head>
+                         <link rel = "stylesheet" href = "ab_test_summary_styles.css">
+                         <title>Tim's Shoes</title>
+                     </head>
+                     <body>
+                         <div class = "topdiv">
+                             <h1>Tim's Shoes</h1>
+                             <p>A/B Test Summary Report - ''' + str(len(test_names)) + ''' Tests<p>
+                         </div>
+                         <div>
+                             <h3></h3>
+                             <table class = "summarytable">
+                                 <tr>
+                                     <th>TEST</th>
+                                     <th>CONTROL GROUP SAMPLE SIZE</th>
+                                     <th>TEST GROUP SAMPLE SIZE</th>
+                                     <th>CONTROL GROUP CONVERSION RATE</th>
+                                     <th>TEST GROUP CONVERSION RATE</th>
+                                     <th>TEST Z SCORE (|z|)</th>
+                                     <th>TEST OUTCOME RECOMMENDATION</th>
+                                 </tr>''' + table_rows + '''
+                             </table>
+                         </div>
+                     </body>
+                 </html>
+                 '''
+
+    css_string = '''
+                .topdiv {
+                  /*Styling the top "header" for my page*/
+                  border-top-style: solid;
+                  border-bottom-style: solid;
+                  border-color: black;
+                  border-width: 1px;
+                  padding-left: 5px;
+                  font-family: "Courier New", Courier, monospace;
+                  text-align: center;
+                }
+
+                h1 {
+                  text-align: center;
+                  color: black;
+                }
+
+                .summarytable {
+                  margin-left: auto;
+                  margin-right: auto;
+                  width: 90%;
+                  text-align: center;
+                  border: 1px solid black;
+                  border-collapse: collapse;
+                  font-family: "Courier New", Courier, monospace;
+                  font-size: 16px
+                }
+
+                .summarytable th, .summarytable td {
+                  border: 1px solid black;
+                  padding: 5px;
+                }
+
+                '''
+
+    css_file = open("ab_test_summary_styles.css", "w")
+    css_file.write(css_string)
+    html_file = open("ab_test_summary_report.html", "w")
+    html_file.write(html_string)
+
+    return
+
+if __name__ == "__main__":
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
+    mycursor = mydb.cursor()
+
+    # Set to True if the database was generated with the compact events schema
+    compact_schema = False
+
+    # Set to True to read the daily_metrics rollup rather than the events table
+    use_rollup = False
+
+    # Set to False to write only the summary report, without a page for each test
+    per_test_pages = True
+
+    produce_bulk_abtest_report(mycursor, compact_schema, use_rollup, per_test_pages)
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+from datetime import datetime
+import numpy as np
+
+from classes.storage_backend_class import create_backend
+from classes.event_encoder_class import EVENT_TYPES, AB_TEST_GROUPS, get_ab_test_id, get_event_type_id
+
+def get_rollup_test_columns(compact_schema = False):
+    # The rollup keys events by A/B test the same way as the events table
+    if compact_schema == True:
+        return(["ab_test_id", "ab_test_group"])
+    return(["ab_test_notes"])
+
+def initiate_daily_metrics_tables(mycursor, compact_schema = False):
+    """
+    Sets up the daily_metrics rollup, holding the number of events and the purchase revenue for
+    each date, event type, item brand, device type and A/B test group, and the watermark table
+    recording the last event rolled up. Existing tables are left as they are.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        compact_schema (boolean): true if the events table uses the compact schema, in which case
+                                  the A/B test is keyed by test id and group rather than the note
+
+    Returns:
+        None
+
+    """
+    if compact_schema == True:
+        test_columns = '''ab_test_id SMALLINT,
+                          ab_test_group TINYINT,'''
+    else:
+        test_columns = '''ab_test_notes VARCHAR(64),'''
+    key_columns = ["event_date", "event_type", "item_brand", "device_type"] + get_rollup_test_columns(compact_schema)
+
+    mycursor.execute('''CREATE TABLE IF NOT EXISTS daily_metrics (event_date DATE,
+                                                                  event_type VARCHAR(32),
+                                                                  item_brand VARCHAR(64),
+                                                                  device_type VARCHAR(32),
+                                                                  ''' + test_columns + '''
+                                                                  num_events INT,
+                                                                  revenue DOUBLE,
+                                                                  PRIMARY KEY (''' + ", ".join(key_columns) + '''))''')
+
+    mycursor.execute('''CREATE TABLE IF NOT EXISTS daily_metrics_watermark (last_event_id INT)''')
+    mycursor.execute('''SELECT COUNT(*) FROM daily_metrics_watermark''')
+    if mycursor.fetchall()[0][0] == 0:
+        mycursor.execute('''INSERT INTO daily_metrics_watermark (last_event_id) VALUES (0)''')
+    return
+
+def get_daily_metrics_watermark(mycursor):
+    mycursor.execute('''SELECT last_event_id FROM daily_metrics_watermark''')
+    return(mycursor.fetchall()[0][0])
+
+def update_daily_metrics(mycursor, dialect = "mysql", compact_schema = False, batch_events = 1000000):
+    """
+    Adds the events written since the last update to the daily_metrics rollup. Events are read
+    in ranges of event_id above the watermark, so each update only reads the new events however
+    large the events table grows, and a load can be rolled up as often as is convenient. Events
+    deleted after they were rolled up stay in the rollup; rebuild_daily_metrics starts it afresh.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        compact_schema (boolean): true if the events table uses the compact schema
+        batch_events (int): the range of event ids rolled up per statement, limiting the rows
+                            each statement locks
+
+    Returns:
+        num_events (int): the number of events rolled up
+
+    """
+    initiate_daily_metrics_tables(mycursor, compact_schema)
+    watermark = get_daily_metrics_watermark(mycursor)
+
+    mycursor.execute('''SELECT COUNT(*), MAX(event_id) FROM events WHERE event_id > %s''', (watermark,))
+    num_events, last_event_id = mycursor.fetchall()[0]
+    if num_events == 0:
+        return(0)
+
+    # Decode the compact schema's event types and devices, so every rollup holds the names
+    test_columns = get_rollup_test_columns(compact_schema)
+    if compact_schema == True:
+        event_type_column = '''event_types.event_type'''
+        device_type_column = '''devices.device_type'''
+        name_joins = '''INNER JOIN
+                            event_types
+                        ON
+                            events.event_type_id = event_types.event_type_id
+                        INNER JOIN
+                            device_types AS devices
+                        ON
+                            events.device_type_id = devices.device_type_id'''
+    else:
+        event_type_column = '''events.event_type'''
+        device_type_column = '''events.device_type'''
+        name_joins = ''''''
+    key_columns = ["event_date", "event_type", "item_brand", "device_type"] + test_columns
+    group_columns = ('''events.event_date, ''' + event_type_column + ''', items.item_brand, ''' + 
+                     device_type_column + ''', ''' + ", ".join("events." + column for column in test_columns))
+
+    # Add to the totals of existing keys rather than replacing them
+    if dialect == "sqlite":
+        merge_clause = ('''ON CONFLICT (''' + ", ".join(key_columns) + ''') DO UPDATE SET
+                               num_events = num_events + excluded.num_events,
+                               revenue = revenue + excluded.revenue''')
+    else:
+        merge_clause = '''ON DUPLICATE KEY UPDATE
+                              num_events = num_events + VALUES(num_events),
+                              revenue = revenue + VALUES(revenue)'''
+
+    for first_event_id in range(watermark, last_event_id, batch_events):
+        mycursor.execute('''INSERT INTO daily_metrics (''' + ", ".join(key_columns) + ''', num_events, revenue)
+                            SELECT
+                                ''' + group_columns + ''',
+                                COUNT(*),
+                                SUM(CASE WHEN ''' + event_type_column + ''' = 'purchase'
+                                         THEN items.item_price ELSE 0 END)
+                            FROM
+                                events
+                            INNER JOIN
+                                items
+                            ON
+                                events.product_id = items.item_id
+                            ''' + name_joins + '''
+                            WHERE
+                                events.event_id > %s
+                            AND
+                                events.event_id <= %s
+                            GROUP BY
+                                ''' + group_columns + '''
+                            ''' + merge_clause, (first_event_id, min(first_event_id + batch_events, last_event_id)))
+
+    mycursor.execute('''UPDATE daily_metrics_watermark SET last_event_id = %s''', (last_event_id,))
+    return(num_events)
+
+def rebuild_daily_metrics(mycursor, dialect = "mysql", compact_schema = False):
+    """
+    Empties the daily_metrics rollup and rolls up every event again
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        num_events (int): the number of events rolled up
+
+    """
+    initiate_daily_metrics_tables(mycursor, compact_schema)
+    mycursor.execute('''DELETE FROM daily_metrics''')
+    mycursor.execute('''UPDATE daily_metrics_watermark SET last_event_id = 0''')
+    return(update_daily_metrics(mycursor, dialect, compact_schema))
+
+def rewind_daily_metrics(mycursor, from_date):
+    """
+    Removes a date and every later date from the daily_metrics rollup, for when the events from
+    that date on have been deleted, and moves the watermark back to the last event before the
+    date. Regenerated events may reuse the deleted events' ids, and the rewound watermark makes
+    sure they are rolled up by the next update.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        from_date (datetime): the first date whose events were deleted
+
+    Returns:
+        rewound (boolean): true if the rollup was rewound, false if no rollup has been built
+
+    """
+    try:
+        watermark = get_daily_metrics_watermark(mycursor)
+    except Exception:
+        # The rollup tables do not exist yet, so there is nothing to rewind
+        return(False)
+
+    date_string = datetime.strftime(from_date, "%Y-%m-%d")
+    mycursor.execute('''DELETE FROM daily_metrics WHERE event_date >= %s''', (date_string,))
+    mycursor.execute('''SELECT MAX(event_id) FROM events WHERE event_date < %s''', (date_string,))
+    last_event_id = mycursor.fetchall()[0][0]
+    if last_event_id is None:
+        last_event_id = 0
+    mycursor.execute('''UPDATE daily_metrics_watermark SET last_event_id = %s''',
+                     (min(watermark, last_event_id),))
+    return(True)
+
+def get_event_totals(mycursor, first_date, last_date):
+    """
+    Totals the events and purchase revenue of each event type over a range of dates from the rollup
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        first_date (datetime): the first date to include
+        last_date (datetime): the last date to include
+
+    Returns:
+        event_totals (Dict<string: Tuple<int, float>>): the number of events and the revenue of
+                                                        each event type, such as "purchase"
+
+    """
+    mycursor.execute('''SELECT
+                            event_type,
+                            SUM(num_events),
+                            SUM(revenue)
+                        FROM
+                            daily_metrics
+                        WHERE
+                            event_date >= %s
+                        AND
+                            event_date <= %s
+                        GROUP BY
+                            event_type''', (datetime.strftime(first_date, "%Y-%m-%d"),
+                                            datetime.strftime(last_date, "%Y-%m-%d")))
+    event_totals = {event_type: (int(num_events), revenue)
+                    for event_type, num_events, revenue in mycursor.fetchall()}
+    return(event_totals)
+
+def get_brand_sales(mycursor, first_date, last_date):
+    """
+    Totals the purchase revenue of each brand over a range of dates from the rollup
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        first_date (datetime): the first date to include
+        last_date (datetime): the last date to include
+
+    Returns:
+        brand_sales (List<Tuple<string, float>>): each brand with purchases and its revenue,
+                                                  in brand order
+
+    """
+    mycursor.execute('''SELECT
+                            item_brand,
+                            SUM(revenue)
+                        FROM
+                            daily_metrics
+                        WHERE
+                            event_date >= %s
+                        AND
+                            event_date <= %s
+                        AND
+                            event_type = 'purchase'
+                        GROUP BY
+                            item_brand
+                        ORDER BY
+                            item_brand''', (datetime.strftime(first_date, "%Y-%m-%d"),
+                                            datetime.strftime(last_date, "%Y-%m-%d")))
+    return(mycursor.fetchall())
+
+def get_product_event_counts(mycursor, first_date, last_date, compact_schema = False):
+    """
+    Counts the events of each product and event type over a range of dates, reading only the
+    events table. Prices and brands are left to an ItemCache, so no join with items is needed.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        first_date (datetime): the first date to include
+        last_date (datetime): the last date to include
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        product_counts (Dict<string: Tuple<Array<int>, Array<int>>>): for each event type, the
+                                                                      product ids with events and
+                                                                      the number of events of each
+
+    """
+    event_type_column = "event_type_id" if compact_schema == True else "event_type"
+    mycursor.execute('''SELECT
+                            product_id,
+                            ''' + event_type_column + ''',
+                            COUNT(*)
+                        FROM
+                            events
+                        WHERE
+                            event_date >= %s
+                        AND
+                            event_date <= %s
+                        GROUP BY
+                            product_id,
+                            ''' + event_type_column, (datetime.strftime(first_date, "%Y-%m-%d"),
+                                                     datetime.strftime(last_date, "%Y-%m-%d")))
+    rows = mycursor.fetchall()
+
+    product_counts = {}
+    for event_type in EVENT_TYPES:
+        event_type_value = get_event_type_id(event_type) if compact_schema == True else event_type
+        type_rows = [row for row in rows if row[1] == event_type_value]
+        product_counts[event_type] = (np.array([row[0] for row in type_rows], dtype = np.int64),
+                                      np.array([row[2] for row in type_rows], dtype = np.int64))
+    return(product_counts)
+
+def get_ab_test_counts(mycursor, test_name, compact_schema = False):
+    """
+    Counts the events of each group of an A/B test from the rollup
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        test_name (string): the name of the A/B test, such as "Test_50"
+        compact_schema (boolean): true if the rollup was built from the compact schema
+
+    Returns:
+        test_counts (Dict<Tuple<string, string>: int>): the number of events for each group,
+                                                        "control" or "test", and event type
+
+    """
+    if compact_schema == True:
+        mycursor.execute('''SELECT
+                                ab_test_group,
+                                event_type,
+                                SUM(num_events)
+                            FROM
+                                daily_metrics
+                            WHERE
+                                ab_test_id = %s
+                            GROUP BY
+                                ab_test_group,
+                                event_type''', (get_ab_test_id(test_name),))
+        return({(AB_TEST_GROUPS[group], event_type): int(num_events)
+                for group, event_type, num_events in mycursor.fetchall()})
+
+    mycursor.execute('''SELECT
+                            ab_test_notes,
+                            event_type,
+                            SUM(num_events)
+                        FROM
+                            daily_metrics
+                        WHERE
+                            ab_test_notes = %s
+                        OR
+                            ab_test_notes = %s
+                        GROUP BY
+                            ab_test_notes,
+                            event_type''', (test_name + "_control", test_name + "_test"))
+    return({(note[len(test_name) + 1:], event_type): int(num_events)
+            for note, event_type, num_events in mycursor.fetchall()})
+
+def get_all_ab_test_counts(mycursor, compact_schema = False):
+    """
+    Counts the events of each group of every A/B test from the rollup
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        compact_schema (boolean): true if the rollup was built from the compact schema
+
+    Returns:
+        test_counts (Dict<Tuple<string, string, string>: int>): the number of events for each
+                                                                test, such as "Test_50", group
+                                                                and event type
+
+    """
+    if compact_schema == True:
+        mycursor.execute('''SELECT
+                                ab_test_id,
+                                ab_test_group,
+                                event_type,
+                                SUM(num_events)
+                            FROM
+                                daily_metrics
+                            WHERE
+                                ab_test_id > 0
+                            GROUP BY
+                                ab_test_id,
+                                ab_test_group,
+                                event_type''')
+        return({("Test_" + str(test_id), AB_TEST_GROUPS[group], event_type): int(num_events)
+                for test_id, group, event_type, num_events in mycursor.fetchall()})
+
+    mycursor.execute('''SELECT
+                            ab_test_notes,
+                            event_type,
+                            SUM(num_events)
+                        FROM
+                            daily_metrics
+                        WHERE
+                            ab_test_notes <> ''
+                        GROUP BY
+                            ab_test_notes,
+                            event_type''')
+    return({tuple(note.rsplit("_", 1)) + (event_type,): int(num_events)
+            for note, event_type, num_events in mycursor.fetchall()})
+
+if __name__ == "__main__":
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
+    mycursor = mydb.cursor()
+
+    # Set to True if the database was generated with the compact events schema
+    compact_schema = False
+
+    # Roll up the events written since the last update
+    print("Rolled up " + str(update_daily_metrics(mycursor, backend.dialect, compact_schema)) + " events")
+    mydb.commit()
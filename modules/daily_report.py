@@ -6,10 +6,14 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-import mysql.connector
 from datetime import datetime
+from classes.storage_backend_class import create_backend
+from classes.event_encoder_class import get_event_type_sql, get_event_type_condition
+from classes.item_cache_class import get_item_cache
+from modules.daily_metrics import get_event_totals, get_brand_sales, get_product_event_counts
 
-def produce_daily_report(mycursor, report_date):
+def produce_daily_report(mycursor, report_date, compact_schema = False, use_rollup = False, 
+                         item_cache = None, use_temp_tables = False):
     """
     Produces a html report for a particular date, summarizing sales 
     data and comparing to historical values 
@@ -17,62 +21,92 @@ def produce_daily_report(mycursor, report_date):
     Parameters:
         mycursor (MySQL Cursor): a cursor to perform database operations from Python
         report_date (datetime): the date that the report is being run on.
+        compact_schema (boolean): true if the events table uses the compact schema
+        use_rollup (boolean): true to read the day's totals from the daily_metrics rollup, 
+                              kept up to date with update_daily_metrics, rather than the events
+        item_cache (ItemCache): optionally count the day's events by product and look up their
+                                prices and brands in the cache, rather than joining with items
+        use_temp_tables (boolean): true to copy the day's events into a daily_summary table and
+                                   query it, rather than totalling them in a single query
         
     Returns:
         None
     
     """
-    # Create a temporary table to store daily data for querying
     date_string = datetime.strftime(report_date, "%Y-%m-%d")
-    mycursor.execute('''CREATE TABLE daily_summary AS 
-                          SELECT 
-                    	      events.event_date AS event_date, 
-                              events.event_type AS event_type, 
-                              events.product_id AS product_id, 
-                              items.item_price AS item_price, 
-                              items.item_brand AS item_brand 
+    if use_rollup == True:
+        # Read the day's totals from the daily_metrics rollup
+        event_totals = get_event_totals(mycursor, report_date, report_date)
+        num_clickthroughs = event_totals.get("clickthrough", (0, 0.0))[0]
+        num_purchases = event_totals.get("purchase", (0, 0.0))[0]
+        brand_sales = get_brand_sales(mycursor, report_date, report_date)
+    elif item_cache is not None:
+        # Count the day's events by product, and map each product's price and brand in memory
+        # Products without an item are dropped, as the join with items would drop them
+        product_counts = get_product_event_counts(mycursor, report_date, report_date, compact_schema)
+        num_clickthroughs = int(item_cache.select_known_items(*product_counts["clickthrough"])[1].sum())
+        num_purchases = int(item_cache.select_known_items(*product_counts["purchase"])[1].sum())
+        brand_sales = item_cache.get_brand_sales(*product_counts["purchase"])
+    elif use_temp_tables == True:
+        # Create a temporary table to store daily data for querying
+        event_type_column, event_type_join = get_event_type_sql(compact_schema)
+        mycursor.execute('''CREATE TABLE daily_summary AS 
+                              SELECT 
+                        	      events.event_date AS event_date, 
+                                  ''' + event_type_column + ''' AS event_type, 
+                                  events.product_id AS product_id, 
+                                  items.item_price AS item_price, 
+                                  items.item_brand AS item_brand 
+                              FROM 
+                        	     events 
+                              INNER JOIN 
+                    	         items 
+                              ON 
+                        	     events.product_id = items.item_id 
+                              ''' + event_type_join + '''
+                              WHERE 
+                        	     events.event_date = %s''', (date_string,))
+            
+        # Extract key output for the day
+        # No. of clickthroughs
+        mycursor.execute('''SELECT 
+                             COUNT(event_date) 
                           FROM 
-                    	     events 
-                          INNER JOIN 
-                	         items 
-                          ON 
-                    	     events.product_id = items.item_id 
+                              daily_summary 
                           WHERE 
-                    	     events.event_date = "''' + date_string + '''"''')
+                              event_type = 'clickthrough' ''')
+        num_clickthroughs = mycursor.fetchall()[0][0]
         
-    # Extract key output for the day
-    # No. of clickthroughs
-    mycursor.execute('''SELECT 
-                         COUNT(event_date) 
-                      FROM 
-                          daily_summary 
-                      WHERE 
-                          event_type = "clickthrough"''')
-    num_clickthroughs = mycursor.fetchall()[0][0]
-    
-    # No. of purchases
-    mycursor.execute('''SELECT 
-                            COUNT(event_date) 
-                        FROM 
-                            daily_summary 
-                        WHERE 
-                            event_type = "purchase"''')
-    num_purchases = mycursor.fetchall()[0][0]
+        # No. of purchases
+        mycursor.execute('''SELECT 
+                                COUNT(event_date) 
+                            FROM 
+                                daily_summary 
+                            WHERE 
+                                event_type = 'purchase' ''')
+        num_purchases = mycursor.fetchall()[0][0]
+        
+        # Sales by brand
+        mycursor.execute('''SELECT 
+                              item_brand, 
+                              SUM(item_price) 
+                          FROM 
+        	                  daily_summary 
+                          WHERE 
+                              event_type = 'purchase' 
+                          GROUP BY 
+        	                  item_brand''')
+        brand_sales = mycursor.fetchall()
+        
+        # Delete temporary table to clean up database
+        mycursor.execute("DROP TABLE daily_summary") 
+    else:
+        # Total the day's clickthroughs, purchases and revenue of each brand in one query
+        num_clickthroughs, num_purchases, brand_sales = get_daily_brand_totals(mycursor, report_date, 
+                                                                               compact_schema)
     
     purchase_conversion_rate = round(100*(num_purchases/num_clickthroughs),2)
     
-    # Sales by brand
-    mycursor.execute('''SELECT 
-                          item_brand, 
-                          SUM(item_price) 
-                      FROM 
-    	                  daily_summary 
-                      WHERE 
-                          event_type = 'purchase' 
-                      GROUP BY 
-    	                  item_brand''')
-    brand_sales = mycursor.fetchall()
-
     # Calculate total daily revenue    
     total_revenue= 0
     for brand in brand_sales:
@@ -89,12 +123,52 @@ def produce_daily_report(mycursor, report_date):
                           purchase_conversion_rate, 
                           total_revenue,
                           chart_name)
-    
-    # Delete temporary table to clean up database
-    mycursor.execute("DROP TABLE daily_summary") 
         
     return
 
+def get_daily_brand_totals(mycursor, report_date, compact_schema = False):
+    """
+    Totals a day's events by item brand in a single query, with conditional counts giving the 
+    clickthroughs, purchases and purchase revenue of each brand together
+    
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        report_date (datetime): the date to total
+        compact_schema (boolean): true if the events table uses the compact schema
+        
+    Returns:
+        num_clickthroughs (int): the number of clickthroughs on the day
+        num_purchases (int): the number of purchases on the day
+        brand_sales (List<Tuple<string, float>>): each brand with purchases and its revenue,
+                                                  in brand order
+    
+    """
+    clickthrough_condition = get_event_type_condition("clickthrough", compact_schema)
+    purchase_condition = get_event_type_condition("purchase", compact_schema)
+    mycursor.execute('''SELECT 
+                            items.item_brand, 
+                            SUM(CASE WHEN ''' + clickthrough_condition + ''' THEN 1 ELSE 0 END), 
+                            SUM(CASE WHEN ''' + purchase_condition + ''' THEN 1 ELSE 0 END), 
+                            SUM(CASE WHEN ''' + purchase_condition + ''' THEN items.item_price ELSE 0 END) 
+                        FROM 
+                            events 
+                        INNER JOIN 
+                            items 
+                        ON 
+                            events.product_id = items.item_id 
+                        WHERE 
+                            events.event_date = %s 
+                        GROUP BY 
+                            items.item_brand 
+                        ORDER BY 
+                            items.item_brand''', (datetime.strftime(report_date, "%Y-%m-%d"),))
+    brand_rows = mycursor.fetchall()
+    
+    num_clickthroughs = sum(int(row[1]) for row in brand_rows)
+    num_purchases = sum(int(row[2]) for row in brand_rows)
+    brand_sales = [(row[0], row[3]) for row in brand_rows if row[2] > 0]
+    return(num_clickthroughs, num_purchases, brand_sales)
+
 def create_pie_chart(brand_sales, chart_name):
     """
     Creates a pie chart with associated labeling for daily sales
@@ -231,13 +305,23 @@ def generate_html_report(report_pie, num_clickthroughs, num_purchases,
     return
 
 if __name__ == "__main__":
-    mydb = mysql.connector.connect(host="localhost",
-                                   user="root",
-                                   password="Tt556677",
-                                   database = "timsshoes",
-                                   connection_timeout = 28800
-                                   )    
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
     mycursor = mydb.cursor()
     
+    # Set to True if the database was generated with the compact events schema
+    compact_schema = False
+    
+    # Set to True to read the daily_metrics rollup rather than the events table
+    use_rollup = False
+    
+    # Set to True to look up item prices and brands in memory rather than joining with items
+    use_item_cache = False
+    item_cache = get_item_cache(mycursor) if use_item_cache == True else None
+    
+    # Set to True to query a temporary daily_summary table rather than a single query
+    use_temp_tables = False
+    
     test_date = datetime.strptime('2020-06-03', "%Y-%m-%d")
-    produce_daily_report(mycursor, test_date)
\ No newline at end of file
+    produce_daily_report(mycursor, test_date, compact_schema, use_rollup, item_cache, use_temp_tables)
\ No newline at end of file
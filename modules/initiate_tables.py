@@ -3,18 +3,39 @@
 
 @author: timpr
 """
+import uuid
+from modules.partition_maintenance import get_partition_clause
+from classes.event_encoder_class import LOOKUP_TABLES
 
-def initiate_base_tables(mycursor):
+def initiate_base_tables(mycursor, dialect = "mysql", partition_months = None, compact_schema = False):
     """
     Sets up tables for use in Tim's shoes database schema
 
     Parameters:
         mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        partition_months (Tuple<date, date>): optionally partition the events table by month of 
+                                              event_date, from the first to the last month given,
+                                              with an overflow partition for later events. 
+                                              MySQL only; ignored for SQLite.
+        compact_schema (boolean): true to store the event type, device and A/B test of each 
+                                  event as small integer codes, with the names held in lookup
+                                  tables, rather than as strings
      
     Returns:
         None
 
     """
+    # Give the database a run id of its own, so checkpoints can be matched to the run that saved them
+    mycursor.execute('''CREATE TABLE simulation_run (run_id VARCHAR(32))''')
+    mycursor.execute('''INSERT INTO simulation_run (run_id) VALUES (%s)''', (uuid.uuid4().hex,))
+    
+    # SQLite only auto increments a column declared exactly as INTEGER PRIMARY KEY
+    if dialect == "sqlite":
+        auto_increment_key = "INTEGER PRIMARY KEY"
+    else:
+        auto_increment_key = "INT AUTO_INCREMENT PRIMARY KEY"
+    
     # Initiate columns for customers table
     mycursor.execute('''CREATE TABLE customers (customer_id INT PRIMARY KEY,
                                                 customer_first_name VARCHAR(255),
@@ -28,7 +49,7 @@ def initiate_base_tables(mycursor):
                                                 shoe_club_status VARCHAR(255))''')    
 
     # Initiate columns for items table
-    mycursor.execute('''CREATE TABLE items (item_id INT AUTO_INCREMENT PRIMARY KEY, 
+    mycursor.execute('''CREATE TABLE items (item_id ''' + auto_increment_key + ''', 
                                             item_name VARCHAR(255), 
                                             item_price FLOAT,
                                             item_size FLOAT,
@@ -36,8 +57,21 @@ def initiate_base_tables(mycursor):
                                             item_brand VARCHAR(255), 
                                             item_type VARCHAR(255))''')
         
+    # A partitioned table's primary key must include the partitioning column
+    if partition_months is not None and dialect == "mysql":
+        event_key = "INT AUTO_INCREMENT"
+        event_table_options = (''', PRIMARY KEY (event_id, event_date))''' + 
+                               get_partition_clause(partition_months[0], partition_months[1]))
+    else:
+        event_key = auto_increment_key
+        event_table_options = ''')'''
+    
+    if compact_schema == True:
+        initiate_compact_events_table(mycursor, event_key, event_table_options)
+        return
+    
     # Initiate columns for events table
-    mycursor.execute('''CREATE TABLE events (event_id INT AUTO_INCREMENT PRIMARY KEY, 
+    mycursor.execute('''CREATE TABLE events (event_id ''' + event_key + ''', 
                                              event_date DATE, 
                                              event_time TIME, 
                                              event_type VARCHAR(255), 
@@ -46,6 +80,170 @@ def initiate_base_tables(mycursor):
                                              device_type VARCHAR(255), 
                                              device_info VARCHAR(255),
                                              order_number INT,
-                                             ab_test_notes VARCHAR(255))''')
+                                             ab_test_notes VARCHAR(255)''' + event_table_options)
+    
+    return
+
+def get_run_id(mycursor):
+    """
+    Reads the run id given to the database when its tables were initiated
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+    Returns:
+        run_id (string): the run id, or None for a database initiated before run ids were kept
+
+    """
+    try:
+        mycursor.execute('''SELECT run_id FROM simulation_run''')
+    except Exception:
+        return(None)
+    run_rows = mycursor.fetchall()
+    if len(run_rows) == 0:
+        return(None)
+    return(run_rows[0][0])
+
+def initiate_compact_events_table(mycursor, event_key, event_table_options):
+    """
+    Sets up the compact variant of the events table, which replaces the string columns with 
+    TINYINT and SMALLINT codes, and the lookup tables giving the name of each code. The A/B test
+    note is split into the test id and a group bit (0 control, 1 test), with test id 0 for events 
+    outside any test. Rows are roughly half the size, so more of the table stays in memory.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        event_key (string): the type and key declaration of the event_id column
+        event_table_options (string): the end of the CREATE TABLE statement, with any keys 
+                                      and partitioning
+     
+    Returns:
+        None
+
+    """
+    for table, id_column, value_column, values in LOOKUP_TABLES:
+        mycursor.execute('''CREATE TABLE ''' + table + ''' (''' + id_column + ''' TINYINT PRIMARY KEY, 
+                                                       ''' + value_column + ''' VARCHAR(255))''')
+        mycursor.executemany('''INSERT INTO ''' + table + ''' (''' + id_column + ''', ''' + 
+                             value_column + ''') VALUES (%s, %s)''', 
+                             [(i + 1, value) for i, value in enumerate(values)])
     
-    return
\ No newline at end of file
+    mycursor.execute('''CREATE TABLE events (event_id ''' + event_key + ''', 
+                                             event_date DATE, 
+                                             event_time TIME, 
+                                             event_type_id TINYINT, 
+                                             customer_id INT, 
+                                             product_id INT, 
+                                             device_type_id TINYINT, 
+                                             device_info_id TINYINT,
+                                             order_number INT,
+                                             ab_test_id SMALLINT,
+                                             ab_test_group TINYINT''' + event_table_options)
+    return
+
+# Secondary indexes serving the report queries: events by date for the daily and KPI reports, 
+# events by A/B test for the A/B test report, and customers by shoe club signup date for the 
+# shoe club growth report. Each is given as (table, index name, indexed columns).
+SECONDARY_INDEXES = [("events", "idx_events_date_type", ["event_date", "event_type"]),
+                     ("events", "idx_events_test_type", ["ab_test_notes", "event_type"]),
+                     ("customers", "idx_customers_signup_status", ["shoe_club_signup_date", 
+                                                                   "shoe_club_status"])]
+
+# The same indexes on the compact events table
+COMPACT_SECONDARY_INDEXES = [("events", "idx_events_date_type", ["event_date", "event_type_id"]),
+                             ("events", "idx_events_test_type", ["ab_test_id", "ab_test_group", 
+                                                                 "event_type_id"]),
+                             SECONDARY_INDEXES[2]]
+
+def get_secondary_indexes(compact_schema = False):
+    if compact_schema == True:
+        return(COMPACT_SECONDARY_INDEXES)
+    return(SECONDARY_INDEXES)
+
+def get_existing_indexes(mycursor, table, dialect = "mysql"):
+    """
+    Finds the names of the indexes on a table
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        table (string): the table name
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+
+    Returns:
+        index_names (Set<string>): the names of the table's indexes
+
+    """
+    if dialect == "sqlite":
+        mycursor.execute('''SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s''',
+                         (table,))
+    else:
+        mycursor.execute('''SELECT DISTINCT 
+                                index_name 
+                            FROM 
+                                information_schema.statistics 
+                            WHERE 
+                                table_schema = DATABASE() 
+                            AND 
+                                table_name = %s''', (table,))
+    return(set(row[0] for row in mycursor.fetchall()))
+
+def create_secondary_indexes(mycursor, dialect = "mysql", compact_schema = False):
+    """
+    Builds any of the report indexes that do not exist yet. Indexes are built once the tables
+    are loaded, as sorting the finished table is far quicker than updating the indexes on every
+    insert. MySQL builds all the missing indexes of a table in a single pass.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        created (List<string>): the names of the indexes built
+
+    """
+    created = []
+    for table in ["events", "customers"]:
+        existing = get_existing_indexes(mycursor, table, dialect)
+        missing = [(name, columns) for index_table, name, columns in get_secondary_indexes(compact_schema)
+                   if index_table == table and name not in existing]
+        if len(missing) == 0:
+            continue
+
+        if dialect == "sqlite":
+            for name, columns in missing:
+                mycursor.execute('''CREATE INDEX ''' + name + ''' ON ''' + table + 
+                                 ''' (''' + ", ".join(columns) + ''')''')
+        else:
+            mycursor.execute('''ALTER TABLE ''' + table + ''' ''' + 
+                             ", ".join('''ADD INDEX ''' + name + ''' (''' + ", ".join(columns) + ''')'''
+                                       for name, columns in missing))
+        created.extend(name for name, columns in missing)
+    return(created)
+
+def drop_secondary_indexes(mycursor, dialect = "mysql", compact_schema = False):
+    """
+    Drops the report indexes, so that a large load into existing tables does not maintain them
+    row by row. Rebuild them afterwards with create_secondary_indexes.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        dialect (string): the SQL dialect of the database, either "mysql" or "sqlite"
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        dropped (List<string>): the names of the indexes dropped
+
+    """
+    dropped = []
+    for table in ["events", "customers"]:
+        existing = get_existing_indexes(mycursor, table, dialect)
+        for index_table, name, columns in get_secondary_indexes(compact_schema):
+            if index_table != table or name not in existing:
+                continue
+            if dialect == "sqlite":
+                mycursor.execute('''DROP INDEX ''' + name)
+            else:
+                mycursor.execute('''DROP INDEX ''' + name + ''' ON ''' + table)
+            dropped.append(name)
+    return(dropped)
@@ -4,16 +4,28 @@
 @author: timpr
 """
 
-import mysql.connector
 from datetime import datetime, timedelta
+from classes.storage_backend_class import create_backend
+from classes.event_encoder_class import get_event_type_sql, get_event_type_condition
+from classes.item_cache_class import get_item_cache
+from modules.daily_metrics import get_event_totals, get_product_event_counts
 
-def produce_kpi_snapshot_report(mycursor, report_date):
+def produce_kpi_snapshot_report(mycursor, report_date, compact_schema = False, use_rollup = False,
+                                item_cache = None, use_temp_tables = False):
     """
     Produces a html report for a particular date summarizing kpis  
     
     Parameters:
         mycursor (MySQL Cursor): a cursor to perform database operations from Python
         report_date (datetime): the date that the report is being run on.
+        compact_schema (boolean): true if the events table uses the compact schema
+        use_rollup (boolean): true to read the event totals from the daily_metrics rollup, 
+                              kept up to date with update_daily_metrics, rather than the events
+        item_cache (ItemCache): optionally count the events by product and look up their prices
+                                in the cache, rather than joining with items
+        use_temp_tables (boolean): true to copy the week's and month's events into weekly_events
+                                   and monthly_events tables and query them, rather than totalling
+                                   the month's events in a single pass
         
     Returns:
         None
@@ -21,90 +33,120 @@ def produce_kpi_snapshot_report(mycursor, report_date):
     """
     # mycursor.execute("DROP TABLE weekly_events, monthly_events")     
     
-    # Create a temporary table to store daily data for querying
     current_date_string = datetime.strftime(report_date, "%Y-%m-%d")
     previous_week_string = datetime.strftime(report_date - timedelta(days = 7), "%Y-%m-%d")
     previous_month_string = datetime.strftime(report_date - timedelta(days = 30), "%Y-%m-%d")
-    mycursor.execute('''CREATE TABLE weekly_events AS 
-                          SELECT 
-                    	      events.event_date AS event_date, 
-                              events.event_type AS event_type, 
-                              events.product_id AS product_id, 
-                              items.item_price AS item_price, 
-                              items.item_brand AS item_brand 
+    if use_rollup == True:
+        # Read the week's and month's totals from the daily_metrics rollup
+        weekly_totals = get_event_totals(mycursor, report_date - timedelta(days = 6), report_date)
+        monthly_totals = get_event_totals(mycursor, report_date - timedelta(days = 29), report_date)
+        weekly_successful_orders, weekly_revenue = weekly_totals.get("purchase", (0, 0.0))
+        weekly_average_order = weekly_revenue / weekly_successful_orders
+        monthly_conversion = (monthly_totals.get("purchase", (0, 0.0))[0] / 
+                              monthly_totals.get("clickthrough", (0, 0.0))[0])
+        monthly_shoe_members = get_new_shoe_club_members(mycursor, previous_month_string, 
+                                                         current_date_string)
+    elif item_cache is not None:
+        # Count the week's and month's events by product, and map each product's price in memory.
+        # Products without an item are dropped, as the join with items would drop them.
+        weekly_counts = get_product_event_counts(mycursor, report_date - timedelta(days = 6), 
+                                                 report_date, compact_schema)
+        monthly_counts = get_product_event_counts(mycursor, report_date - timedelta(days = 29), 
+                                                  report_date, compact_schema)
+        weekly_purchases = item_cache.select_known_items(*weekly_counts["purchase"])
+        weekly_successful_orders = int(weekly_purchases[1].sum())
+        weekly_average_order = item_cache.get_revenue(*weekly_purchases) / weekly_successful_orders
+        monthly_conversion = (int(item_cache.select_known_items(*monthly_counts["purchase"])[1].sum()) / 
+                              int(item_cache.select_known_items(*monthly_counts["clickthrough"])[1].sum()))
+        monthly_shoe_members = get_new_shoe_club_members(mycursor, previous_month_string, 
+                                                         current_date_string)
+    elif use_temp_tables == True:
+        # Create a temporary table to store daily data for querying
+        event_type_column, event_type_join = get_event_type_sql(compact_schema)
+        mycursor.execute('''CREATE TABLE weekly_events AS 
+                              SELECT 
+                        	      events.event_date AS event_date, 
+                                  ''' + event_type_column + ''' AS event_type, 
+                                  events.product_id AS product_id, 
+                                  items.item_price AS item_price, 
+                                  items.item_brand AS item_brand 
+                              FROM 
+                        	      events 
+                              INNER JOIN 
+                    	          items 
+                              ON 
+                        	      events.product_id = items.item_id 
+                              ''' + event_type_join + '''
+                              WHERE 
+                        	      events.event_date > %s
+                              AND
+                                  events.event_date <= %s''', (previous_week_string, current_date_string))
+    
+        mycursor.execute('''CREATE TABLE monthly_events AS 
+                              SELECT 
+                        	      events.event_date AS event_date, 
+                                  ''' + event_type_column + ''' AS event_type, 
+                                  events.product_id AS product_id, 
+                                  items.item_price AS item_price, 
+                                  items.item_brand AS item_brand 
+                              FROM 
+                        	      events 
+                              INNER JOIN 
+                    	          items 
+                              ON 
+                        	      events.product_id = items.item_id 
+                              ''' + event_type_join + '''
+                              WHERE 
+                        	      events.event_date > %s
+                              AND
+                                  events.event_date <= %s''', (previous_month_string, current_date_string))        
+    
+        # Weekly succesful orders
+        mycursor.execute('''SELECT 
+                             COUNT(event_date) 
                           FROM 
-                    	      events 
-                          INNER JOIN 
-                	          items 
-                          ON 
-                    	      events.product_id = items.item_id 
+                              weekly_events 
                           WHERE 
-                    	      events.event_date > "''' + previous_week_string + '''"
-                          AND
-                              events.event_date <= "''' + current_date_string + '''"''')
-    
-    mycursor.execute('''CREATE TABLE monthly_events AS 
-                          SELECT 
-                    	      events.event_date AS event_date, 
-                              events.event_type AS event_type, 
-                              events.product_id AS product_id, 
-                              items.item_price AS item_price, 
-                              items.item_brand AS item_brand 
+                              event_type = 'purchase' ''')
+        weekly_successful_orders = mycursor.fetchall()[0][0]
+    
+        # Weekly average order value
+        mycursor.execute('''SELECT 
+                                SUM(item_price) 
+                            FROM 
+                                weekly_events
+                            WHERE 
+                                event_type = 'purchase' ''')
+        weekly_average_order = mycursor.fetchall()[0][0] / weekly_successful_orders
+        
+        # Monthly conversion rate
+        mycursor.execute('''SELECT 
+                              COUNT(*) 
                           FROM 
-                    	      events 
-                          INNER JOIN 
-                	          items 
-                          ON 
-                    	      events.product_id = items.item_id 
+        	                  monthly_events 
                           WHERE 
-                    	      events.event_date > "''' + previous_month_string + '''"
-                          AND
-                              events.event_date <= "''' + current_date_string + '''"''')        
-    
-    # Weekly succesful orders
-    mycursor.execute('''SELECT 
-                         COUNT(event_date) 
-                      FROM 
-                          weekly_events 
-                      WHERE 
-                          event_type = "purchase"''')
-    weekly_successful_orders = mycursor.fetchall()[0][0]
-    
-    # Weekly average order value
-    mycursor.execute('''SELECT 
-                            SUM(item_price) 
-                        FROM 
-                            weekly_events
-                        WHERE 
-                            event_type = "purchase"''')
-    weekly_average_order = mycursor.fetchall()[0][0] / weekly_successful_orders
+                              event_type = 'clickthrough' ''')
+        monthly_clicks = mycursor.fetchall()[0][0]
+        mycursor.execute('''SELECT 
+                              COUNT(*) 
+                          FROM 
+        	                  monthly_events 
+                          WHERE 
+                              event_type = 'purchase' ''')
+        monthly_conversion = mycursor.fetchall()[0][0] / monthly_clicks   
+        monthly_shoe_members = get_new_shoe_club_members(mycursor, previous_month_string, 
+                                                         current_date_string)
         
-    # Monthly conversion rate
-    mycursor.execute('''SELECT 
-                          COUNT(*) 
-                      FROM 
-    	                  monthly_events 
-                      WHERE 
-                          event_type = "clickthrough"''')
-    monthly_clicks = mycursor.fetchall()[0][0]
-    mycursor.execute('''SELECT 
-                          COUNT(*) 
-                      FROM 
-    	                  monthly_events 
-                      WHERE 
-                          event_type = "purchase"''')
-    monthly_conversion = mycursor.fetchall()[0][0] / monthly_clicks   
+        # Delete temporary tables to clean up database
+        mycursor.execute("DROP TABLE weekly_events") 
+        mycursor.execute("DROP TABLE monthly_events") 
+    else:
+        # Total the week's orders and the month's conversions in a single pass over the month
+        (weekly_successful_orders, weekly_revenue, monthly_clicks, monthly_purchases, 
+         monthly_shoe_members) = get_kpi_totals(mycursor, report_date, compact_schema)
+        weekly_average_order = weekly_revenue / weekly_successful_orders
+        monthly_conversion = monthly_purchases / monthly_clicks
 
-    # Monthly shoe club members
-    mycursor.execute('''SELECT 
-                          COUNT(*) 
-                      FROM 
-    	                  customers 
-                      WHERE 
-                          shoe_club_signup_date > "''' + previous_month_string + '''" 
-                      AND
-                          shoe_club_signup_date <= "''' + current_date_string + '''"''')    
-    monthly_shoe_members = mycursor.fetchall()[0][0]
     image_name = "kpi_image.png"
     
     # Generate HTML report summarizing results
@@ -114,11 +156,87 @@ def produce_kpi_snapshot_report(mycursor, report_date):
                           monthly_shoe_members,
                           image_name) 
     
-    # Delete temporary tables to clean up database
-    mycursor.execute("DROP TABLE weekly_events, monthly_events") 
+    return
+
+def get_new_shoe_club_members(mycursor, first_date_string, last_date_string):
+    """
+    Counts the customers joining the shoe club after one date and up to another
+    
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        first_date_string (string): the day before the first signup date to count, as YYYY-MM-DD
+        last_date_string (string): the last signup date to count, as YYYY-MM-DD
+        
+    Returns:
+        num_members (int): the number of new shoe club members
     
+    """
+    mycursor.execute('''SELECT 
+                          COUNT(*) 
+                      FROM 
+    	                  customers 
+                      WHERE 
+                          shoe_club_signup_date > %s 
+                      AND
+                          shoe_club_signup_date <= %s''', (first_date_string, last_date_string))    
+    return(mycursor.fetchall()[0][0])
+
+def get_kpi_totals(mycursor, report_date, compact_schema = False):
+    """
+    Totals the events of the 30 days up to a date in a single pass, with conditional sums over 
+    event_date picking out the last 7 days, and counts the month's new shoe club members in the 
+    same query
     
-    return
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        report_date (datetime): the last date to total
+        compact_schema (boolean): true if the events table uses the compact schema
+        
+    Returns:
+        weekly_orders (int): the number of purchases in the last 7 days
+        weekly_revenue (float): the revenue of the purchases in the last 7 days
+        monthly_clicks (int): the number of clickthroughs in the last 30 days
+        monthly_purchases (int): the number of purchases in the last 30 days
+        monthly_shoe_members (int): the number of new shoe club members in the last 30 days
+    
+    """
+    current_date_string = datetime.strftime(report_date, "%Y-%m-%d")
+    previous_week_string = datetime.strftime(report_date - timedelta(days = 7), "%Y-%m-%d")
+    previous_month_string = datetime.strftime(report_date - timedelta(days = 30), "%Y-%m-%d")
+    clickthrough_condition = get_event_type_condition("clickthrough", compact_schema)
+    purchase_condition = get_event_type_condition("purchase", compact_schema)
+    weekly_purchase_condition = purchase_condition + ''' AND events.event_date > %s'''
+    
+    mycursor.execute('''SELECT 
+                            SUM(CASE WHEN ''' + weekly_purchase_condition + ''' THEN 1 ELSE 0 END), 
+                            SUM(CASE WHEN ''' + weekly_purchase_condition + ''' THEN items.item_price ELSE 0 END), 
+                            SUM(CASE WHEN ''' + clickthrough_condition + ''' THEN 1 ELSE 0 END), 
+                            SUM(CASE WHEN ''' + purchase_condition + ''' THEN 1 ELSE 0 END), 
+                            (SELECT 
+                                 COUNT(*) 
+                             FROM 
+                                 customers 
+                             WHERE 
+                                 shoe_club_signup_date > %s 
+                             AND 
+                                 shoe_club_signup_date <= %s) 
+                        FROM 
+                            events 
+                        INNER JOIN 
+                            items 
+                        ON 
+                            events.product_id = items.item_id 
+                        WHERE 
+                            events.event_date > %s 
+                        AND 
+                            events.event_date <= %s''', (previous_week_string, previous_week_string, 
+                                                       previous_month_string, current_date_string, 
+                                                       previous_month_string, current_date_string))
+    weekly_orders, weekly_revenue, monthly_clicks, monthly_purchases, monthly_shoe_members = mycursor.fetchall()[0]
+    
+    # Sums over no events are NULL
+    return(int(weekly_orders or 0), weekly_revenue or 0, int(monthly_clicks or 0), 
+           int(monthly_purchases or 0), monthly_shoe_members)
 
 
 def generate_html_report(weekly_successful_orders, weekly_average_order, 
@@ -230,13 +348,24 @@ def generate_html_report(weekly_successful_orders, weekly_average_order,
     return
 
 if __name__ == "__main__":
-    mydb = mysql.connector.connect(host="localhost",
-                                   user="root",
-                                   password="Tt556677",
-                                   database = "timsshoes",
-                                   connection_timeout = 28800
-                                   )    
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
     mycursor = mydb.cursor()
     
+    # Set to True if the database was generated with the compact events schema
+    compact_schema = False
+    
+    # Set to True to read the daily_metrics rollup rather than the events table
+    use_rollup = False
+    
+    # Set to True to look up item prices in memory rather than joining with items
+    use_item_cache = False
+    item_cache = get_item_cache(mycursor) if use_item_cache == True else None
+    
+    # Set to True to query temporary weekly_events and monthly_events tables rather than a single pass
+    use_temp_tables = False
+    
     test_date = datetime.strptime('2020-06-03', "%Y-%m-%d")
-    produce_kpi_snapshot_report(mycursor, test_date)
\ No newline at end of file
+    produce_kpi_snapshot_report(mycursor, test_date, compact_schema, use_rollup, item_cache, 
+                                use_temp_tables)
\ No newline at end of file
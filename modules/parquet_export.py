@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import os
+from datetime import datetime
+
+from classes.parquet_sink_class import ParquetSink, EVENT_SCHEMA, CUSTOMER_SCHEMA, ITEM_SCHEMA
+from classes.event_class import EventsTable
+from classes.vectorized_event_class import VectorizedEventsTable
+from classes.item_class import ItemTable
+from classes.event_encoder_class import EventEncoder, COMPACT_EVENT_COLUMNS
+from classes.storage_backend_class import create_backend
+
+def export_database_to_parquet(mycursor, output_dir, fetch_size = 100000, compact_schema = False):
+    """
+    Exports the events, customers and items tables to Parquet, streaming each table out of
+    the database in chunks. Events are partitioned by the month of their event date and
+    customers by the month of their first purchase. Events in the compact schema are decoded,
+    so the Parquet files have the same layout whichever schema the database uses.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        output_dir (string): the directory the tables are written under, one subdirectory per table
+        fetch_size (int): the number of rows read from the database at a time
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        row_counts (Dict<string: int>): the number of rows exported from each table
+
+    """
+    table_exports = [("events", EVENT_SCHEMA, "event_date", "event_id"),
+                     ("customers", CUSTOMER_SCHEMA, "first_purchase_date", "customer_id"),
+                     ("items", ITEM_SCHEMA, None, "item_id")]
+
+    event_encoder = EventEncoder()
+
+    row_counts = {}
+    for table, schema, partition_column, order_column in table_exports:
+        columns = schema.names
+        if table == "events" and compact_schema == True:
+            columns = COMPACT_EVENT_COLUMNS
+        table_sink = ParquetSink(os.path.join(output_dir, table), schema, partition_column, fetch_size)
+        mycursor.execute('''SELECT ''' + ", ".join(columns) + ''' FROM ''' + table +
+                         ''' ORDER BY ''' + order_column)
+
+        rows = mycursor.fetchmany(fetch_size)
+        while len(rows) > 0:
+            if table == "events":
+                rows = parse_event_times(rows)
+                if compact_schema == True:
+                    rows = event_encoder.decode_rows(rows)
+            table_sink.add_rows(rows)
+            rows = mycursor.fetchmany(fetch_size)
+
+        table_sink.close()
+        row_counts[table] = table_sink.rows_written
+    return(row_counts)
+
+def parse_event_times(rows):
+    """
+    Converts the event times read from the database back to the seconds since midnight the 
+    simulator produces. MySQL returns TIME columns as time deltas and SQLite as HH:MM:SS strings.
+
+    Parameters:
+        rows (List<Tuple>): event rows as read from the database
+
+    Returns:
+        rows (List<Tuple>): the event rows with times in seconds since midnight
+
+    """
+    parsed_rows = []
+    for row in rows:
+        if isinstance(row[1], str):
+            hours, minutes, seconds = row[1].split(":")
+            event_secs = 3600*int(hours) + 60*int(minutes) + int(seconds)
+        else:
+            event_secs = int(row[1].total_seconds())
+        parsed_rows.append(row[:1] + (event_secs,) + row[2:])
+    return(parsed_rows)
+
+def simulate_to_parquet(output_dir, start_date, engine = "python", flush_size = 5000, seed = None,
+                        end_date = None, scale_factor = 1):
+    """
+    Simulates the website from its launch date and writes the events, customers and items
+    straight to Parquet, without a database
+
+    Parameters:
+        output_dir (string): the directory the tables are written under, one subdirectory per table
+        start_date (datetime): the date the website went live
+        engine (string): the simulation engine, either "python" or "vectorized"
+        flush_size (int): the number of buffered events handed to the Parquet writer at a time
+        seed (int): an optional seed making the simulation reproducible
+        end_date (datetime): the date to simulate up to, defaults to today
+        scale_factor (float): multiplies the daily traffic and the number of item sizes
+
+    Returns:
+        row_counts (Dict<string: int>): the number of rows written for each table
+
+    """
+    item_table = ItemTable(None, scale_factor = scale_factor)
+    item_sink = ParquetSink(os.path.join(output_dir, "items"), ITEM_SCHEMA)
+    item_sink.add_rows(item_table.get_item_rows())
+    item_sink.close()
+
+    event_sink = ParquetSink(os.path.join(output_dir, "events"), EVENT_SCHEMA, "event_date", flush_size)
+    customer_sink = ParquetSink(os.path.join(output_dir, "customers"), CUSTOMER_SCHEMA,
+                                "first_purchase_date", flush_size)
+    if engine == "vectorized":
+        table_class = VectorizedEventsTable
+    else:
+        table_class = EventsTable
+    table_class(None, start_date, flush_size, seed, item_ids = item_table.get_item_ids(),
+                end_date = end_date, sink = event_sink, customer_sink = customer_sink,
+                scale_factor = scale_factor)
+
+    row_counts = {"events": event_sink.rows_written,
+                  "customers": customer_sink.rows_written,
+                  "items": item_sink.rows_written}
+    return(row_counts)
+
+if __name__ == "__main__":
+    output_dir = "timsshoes_parquet"
+
+    # Set to True to export the existing database tables, or False to simulate straight to Parquet
+    from_database = True
+
+    if from_database == True:
+        # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+        backend = create_backend("mysql")
+        mydb = backend.connect()
+        mycursor = mydb.cursor()
+
+        # Set to True if the database was generated with the compact events schema
+        compact_schema = False
+        row_counts = export_database_to_parquet(mycursor, output_dir, compact_schema = compact_schema)
+    else:
+        start_date = datetime.strptime("2018-01-01", "%Y-%m-%d")
+        row_counts = simulate_to_parquet(output_dir, start_date, engine = "vectorized")
+    print(row_counts)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+from datetime import datetime, date, timedelta
+
+from classes.storage_backend_class import create_backend
+
+# Name of the catch-all partition holding events beyond the last monthly partition
+OVERFLOW_PARTITION = "pmax"
+
+def to_date(day):
+    # Datetimes cannot be compared with dates, so partition bounds are always handled as dates
+    if isinstance(day, datetime):
+        return(day.date())
+    return(day)
+
+def get_month_start(day):
+    return(date(day.year, day.month, 1))
+
+def get_next_month_start(day):
+    return(get_month_start(get_month_start(day) + timedelta(days = 32)))
+
+def get_partition_name(month_start):
+    return("p" + month_start.strftime("%Y%m"))
+
+def get_partition_definitions(first_month, last_month):
+    """
+    Builds the definitions of monthly RANGE COLUMNS partitions on event_date. Each partition
+    holds the events of one calendar month.
+
+    Parameters:
+        first_month (date): a day in the first month to partition
+        last_month (date): a day in the last month to partition
+
+    Returns:
+        definitions (List<string>): one partition definition per month, in date order
+
+    """
+    definitions = []
+    month_start = get_month_start(first_month)
+    last_month = to_date(last_month)
+    while month_start <= last_month:
+        next_month_start = get_next_month_start(month_start)
+        definitions.append('''PARTITION ''' + get_partition_name(month_start) +
+                           ''' VALUES LESS THAN (\'''' + next_month_start.strftime("%Y-%m-%d") + '''\')''')
+        month_start = next_month_start
+    return(definitions)
+
+def get_partition_clause(first_month, last_month):
+    """
+    Builds the PARTITION BY clause for the events table: one partition per month from the first
+    to the last month, and an overflow partition for any later events
+
+    Parameters:
+        first_month (date): a day in the first month to partition
+        last_month (date): a day in the last month to partition
+
+    Returns:
+        partition_clause (string): the clause to append to CREATE TABLE events
+
+    """
+    definitions = get_partition_definitions(first_month, last_month)
+    definitions.append('''PARTITION ''' + OVERFLOW_PARTITION + ''' VALUES LESS THAN (MAXVALUE)''')
+    return(''' PARTITION BY RANGE COLUMNS(event_date) (''' + ", ".join(definitions) + ''')''')
+
+def get_event_partitions(mycursor):
+    """
+    Lists the monthly partitions of the events table
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+
+    Returns:
+        partitions (List<Tuple<string, date>>): the name of each monthly partition and the first
+                                                date after it, in date order. Empty if the table
+                                                is not partitioned.
+
+    """
+    mycursor.execute('''SELECT
+                            partition_name,
+                            partition_description
+                        FROM
+                            information_schema.partitions
+                        WHERE
+                            table_schema = DATABASE()
+                        AND
+                            table_name = 'events'
+                        AND
+                            partition_name IS NOT NULL
+                        ORDER BY
+                            partition_ordinal_position''')
+    partitions = []
+    for name, description in mycursor.fetchall():
+        if name == OVERFLOW_PARTITION:
+            continue
+        partitions.append((name, datetime.strptime(description.strip("'"), "%Y-%m-%d").date()))
+    return(partitions)
+
+def add_future_partitions(mycursor, through_date):
+    """
+    Creates monthly partitions up to and including the month of a date, by splitting them off
+    the overflow partition. The overflow partition should be empty, so the split only changes
+    the table's metadata.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        through_date (date): a day in the last month that needs a partition
+
+    Returns:
+        added (List<string>): the names of the partitions created
+
+    """
+    partitions = get_event_partitions(mycursor)
+    if len(partitions) == 0:
+        return([])
+
+    # The month after the last partition is the first one without a partition
+    first_month = partitions[-1][1]
+    definitions = get_partition_definitions(first_month, through_date)
+    if len(definitions) == 0:
+        return([])
+
+    definitions.append('''PARTITION ''' + OVERFLOW_PARTITION + ''' VALUES LESS THAN (MAXVALUE)''')
+    mycursor.execute('''ALTER TABLE events REORGANIZE PARTITION ''' + OVERFLOW_PARTITION +
+                     ''' INTO (''' + ", ".join(definitions) + ''')''')
+    return([definition.split()[1] for definition in definitions[:-1]])
+
+def archive_partition(mycursor, partition_name):
+    """
+    Moves a partition's events into their own archive table, named after the partition, by
+    exchanging the partition with an empty copy of the events table. The rows are not copied,
+    so archiving is a metadata operation however many events the month holds.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        partition_name (string): the partition to archive, such as "p201801"
+
+    Returns:
+        archive_table (string): the name of the table now holding the partition's events
+
+    """
+    archive_table = "events_archive_" + partition_name[1:]
+    mycursor.execute('''CREATE TABLE ''' + archive_table + ''' LIKE events''')
+    mycursor.execute('''ALTER TABLE ''' + archive_table + ''' REMOVE PARTITIONING''')
+    mycursor.execute('''ALTER TABLE events EXCHANGE PARTITION ''' + partition_name +
+                     ''' WITH TABLE ''' + archive_table)
+    return(archive_table)
+
+def retire_partitions(mycursor, before_date, archive = True):
+    """
+    Removes the monthly partitions whose events all fall before a date, optionally archiving
+    their events first. Dropping a partition removes its events without a row by row DELETE.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        before_date (date): partitions ending on or before this date are removed
+        archive (boolean): true to keep each partition's events in an archive table, false to
+                           discard them
+
+    Returns:
+        retired (List<string>): the names of the partitions removed
+
+    """
+    before_date = to_date(before_date)
+    retired = [name for name, end_date in get_event_partitions(mycursor) if end_date <= before_date]
+    if len(retired) == 0:
+        return([])
+
+    if archive == True:
+        for partition_name in retired:
+            archive_partition(mycursor, partition_name)
+    mycursor.execute('''ALTER TABLE events DROP PARTITION ''' + ", ".join(retired))
+    return(retired)
+
+def maintain_event_partitions(mycursor, today = None, future_months = 3, retention_months = None,
+                              archive = True):
+    """
+    Rolls the events table's partitions forward: creates partitions for the coming months and,
+    if a retention period is given, retires the partitions older than it
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        today (date): the current date, defaults to today
+        future_months (int): the number of months after the current one to create partitions for
+        retention_months (int): the number of whole months before the current one to keep, or
+                                None to keep every partition
+        archive (boolean): true to move retired partitions to archive tables, false to drop them
+
+    Returns:
+        added (List<string>): the names of the partitions created
+        retired (List<string>): the names of the partitions removed
+
+    """
+    today = to_date(today) if today is not None else date.today()
+
+    last_month = get_month_start(today)
+    for _ in range(future_months):
+        last_month = get_next_month_start(last_month)
+    added = add_future_partitions(mycursor, last_month)
+
+    retired = []
+    if retention_months is not None:
+        # Step back from the current month to the start of the oldest month to keep
+        oldest_month = get_month_start(today)
+        for _ in range(retention_months):
+            oldest_month = get_month_start(oldest_month - timedelta(days = 1))
+        retired = retire_partitions(mycursor, oldest_month, archive)
+    return(added, retired)
+
+if __name__ == "__main__":
+    # Storage backend holding the Tim's Shoes database. Partitioning is only available on MySQL.
+    backend = create_backend("mysql")
+    mydb = backend.connect()
+    mycursor = mydb.cursor()
+
+    # Keep three months of partitions ahead of today, and archive events older than two years
+    added, retired = maintain_event_partitions(mycursor, future_months = 3, retention_months = 24)
+    print("Added partitions: " + str(added))
+    print("Retired partitions: " + str(retired))
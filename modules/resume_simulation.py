@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+from datetime import datetime, timedelta
+
+from classes.customer_store_class import CustomerStore, date_to_day_number
+from classes.event_class import TEST_CONVERSION_PROBS, CAMPAIGN_JOIN_PROBS
+from classes.event_encoder_class import EVENT_TYPES, AB_TEST_GROUPS, get_ab_test_id
+from modules.daily_metrics import rewind_daily_metrics
+
+def load_resume_state(mycursor, launch_date, fetch_size = 50000, customers = None, 
+                      compact_schema = False):
+    """
+    Reads the state of an existing Tim's Shoes database so that the simulation can be extended
+    from the day after the latest event, rather than regenerated from the launch date
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        launch_date (datetime): the date the website went live
+        fetch_size (int): the number of customer rows read from the database at a time
+        customers (CustomerStore): an empty store to load the customers into, such as a 
+                                   MemmapCustomerStore. Defaults to an in-memory store.
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        resume_state (Dict<string: object>): the simulator state to resume from, or None if the
+                                             events table is empty
+
+    """
+    # Sorting rather than taking MAX keeps the column's date type on every backend
+    mycursor.execute('''SELECT
+                            event_date
+                        FROM
+                            events
+                        ORDER BY
+                            event_date DESC
+                        LIMIT 1''')
+    last_event_rows = mycursor.fetchall()
+    if len(last_event_rows) == 0:
+        return(None)
+    last_event_date = last_event_rows[0][0]
+
+    last_event_date = datetime.combine(last_event_date, datetime.min.time())
+    day_counter = (last_event_date - launch_date).days + 1
+
+    # Make sure the events of the resumed days are rolled up, whatever ids they are given
+    rewind_daily_metrics(mycursor, last_event_date + timedelta(days = 1))
+
+    # Load the existing customers into a customer store
+    if customers is None:
+        customers = CustomerStore()
+    mycursor.execute('''SELECT
+                            customer_id,
+                            customer_first_name,
+                            customer_last_name,
+                            customer_email,
+                            customer_phone,
+                            first_purchase_date,
+                            last_purchase_date,
+                            shoe_club_id,
+                            shoe_club_signup_date,
+                            shoe_club_status
+                        FROM
+                            customers
+                        ORDER BY
+                            customer_id''')
+    customer_rows = mycursor.fetchmany(fetch_size)
+    while len(customer_rows) > 0:
+        customers.add_customer_rows(customer_rows)
+        customer_rows = mycursor.fetchmany(fetch_size)
+
+    if len(customers) > 0:
+        customer_id_allocation = int(customers.get_customer_ids(len(customers) - 1)) + 1
+    else:
+        customer_id_allocation = 1
+
+    test_label, test_conversion_prob = get_active_ab_test(mycursor, day_counter, compact_schema)
+    shoe_club_join_prob, camp_days_rem = get_active_campaign(customers, launch_date, day_counter)
+
+    resume_state = {"date": last_event_date + timedelta(days = 1),
+                    "day_counter": day_counter,
+                    "customers": customers,
+                    "customer_id_allocation": customer_id_allocation,
+                    "test_conversion_prob": test_conversion_prob,
+                    "test_label": test_label,
+                    "shoe_club_join_prob": shoe_club_join_prob,
+                    "camp_days_rem": camp_days_rem
+                    }
+    return(resume_state)
+
+def get_active_ab_test(mycursor, day_counter, compact_schema = False):
+    """
+    Determines the A/B test running on a given day and estimates its test group conversion rate
+    from the events logged so far. The estimate is rounded to the nearest rate a test can be given.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        day_counter (int): the day number, counted from the stores opening day
+        compact_schema (boolean): true if the events table uses the compact schema
+
+    Returns:
+        test_label (string): the label of the active A/B test
+        test_conversion_prob (float): the purchase probability for the test group
+
+    """
+    test_label = "Test_" + str(int((day_counter-1)/14 + 1))
+
+    if compact_schema == True:
+        mycursor.execute('''SELECT
+                                event_type_id,
+                                COUNT(*)
+                            FROM
+                                events
+                            WHERE
+                                ab_test_id = %s
+                            AND
+                                ab_test_group = %s
+                            GROUP BY
+                                event_type_id''', (get_ab_test_id(test_label), AB_TEST_GROUPS.index("test")))
+        event_counts = {EVENT_TYPES[event_type_id - 1]: count 
+                        for event_type_id, count in mycursor.fetchall()}
+    else:
+        mycursor.execute('''SELECT
+                                event_type,
+                                COUNT(*)
+                            FROM
+                                events
+                            WHERE
+                                ab_test_notes = %s
+                            GROUP BY
+                                event_type''', (test_label + "_test",))
+        event_counts = dict(mycursor.fetchall())
+
+    num_clickthroughs = event_counts.get("clickthrough", 0)
+    if num_clickthroughs == 0:
+        return(test_label, TEST_CONVERSION_PROBS[len(TEST_CONVERSION_PROBS) // 2])
+
+    conversion_rate = event_counts.get("purchase", 0) / num_clickthroughs
+    return(test_label, get_nearest_value(TEST_CONVERSION_PROBS, conversion_rate))
+
+def get_active_campaign(customers, launch_date, day_counter):
+    """
+    Determines whether a shoe club growth campaign is running at the end of a given day and, if so,
+    estimates its join rate from the share of the campaign's new customers who joined the shoe
+    club on their first purchase
+
+    Parameters:
+        customers (CustomerStore): the existing customers
+        launch_date (datetime): the date the website went live
+        day_counter (int): the day number, counted from the stores opening day
+
+    Returns:
+        shoe_club_join_prob (float): the current probability of a customer joining the shoe club
+        camp_days_rem (int): the number of days of the campaign remaining
+
+    """
+    days_into_campaign = day_counter % 365
+    if day_counter < 365 or days_into_campaign >= 30:
+        return(0.25, 0)
+
+    campaign_start_date = launch_date + timedelta(days = day_counter - days_into_campaign - 1)
+    num_customers = len(customers)
+    campaign_customers = (customers.first_purchase_date[:num_customers] >=
+                          date_to_day_number(campaign_start_date))
+    if campaign_customers.sum() == 0:
+        return(0.25, 30 - days_into_campaign)
+
+    joined_on_first_purchase = (customers.shoe_club_signup_date[:num_customers][campaign_customers] ==
+                                customers.first_purchase_date[:num_customers][campaign_customers])
+    return(get_nearest_value(CAMPAIGN_JOIN_PROBS, joined_on_first_purchase.mean()),
+           30 - days_into_campaign)
+
+def get_nearest_value(values, estimate):
+    """
+    Finds the value in a list closest to an estimate
+
+    Parameters:
+        values (List<float>): the candidate values
+        estimate (float): the estimated value
+
+    Returns:
+        nearest_value (float): the candidate closest to the estimate
+
+    """
+    return(min(values, key = lambda value: abs(value - estimate)))
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+from datetime import datetime
+
+from classes.event_class import (BASE_DAILY_CUSTOMERS, CUSTOMER_GROWTH_DIVISOR, RETURNING_FRACTION,
+                                 TEST_CONVERSION_PROBS)
+from classes.item_class import ItemTable
+
+# Purchase probability of a returning customer, who is equally likely to be in the A/B test's
+# control group or its test group
+RETURNING_PURCHASE_PROB = 0.5*0.7 + 0.5*sum(TEST_CONVERSION_PROBS)/len(TEST_CONVERSION_PROBS)
+
+def expected_floor(limit):
+    """
+    Finds the expected value of int(limit*U), for U drawn uniformly between 0 and 1, which is
+    how the simulator draws its daily customer numbers
+
+    Parameters:
+        limit (float): the upper limit of the draw
+
+    Returns:
+        expected_value (float): the expected number drawn
+
+    """
+    whole = int(limit)
+    if whole == 0:
+        return(0.0)
+    return(whole - whole*(whole + 1)/(2*limit))
+
+def estimate_row_counts(start_date, end_date, scale_factor = 1):
+    """
+    Estimates the number of rows a simulation produces by following the expected daily numbers
+    of new and returning customers. New customers grow the customer base by about
+    5*scale_factor + N/400 a day, so the customer base grows exponentially with a 400 day time
+    constant and every row count grows in proportion to the scale factor. Clicks lost to bugs are
+    ignored, so estimates are a fraction of a percent high. At scale factors of 0.1 or less the
+    daily draw of new customers never reaches one, so no rows are produced.
+
+    Parameters:
+        start_date (datetime): the date the website went live
+        end_date (datetime): the date the simulation runs up to
+        scale_factor (float): the simulation's scale factor
+
+    Returns:
+        row_counts (Dict<string: float>): the expected number of events, clickthroughs,
+                                          purchases, customers and items
+
+    """
+    base_daily_customers = BASE_DAILY_CUSTOMERS*scale_factor
+    num_customers = 0.0
+    num_clickthroughs = 0.0
+    num_purchases = 0.0
+
+    for _ in range((end_date - start_date).days):
+        new_customers = expected_floor(base_daily_customers + num_customers/CUSTOMER_GROWTH_DIVISOR)
+        returning_customers = expected_floor(RETURNING_FRACTION*num_customers)
+
+        # New customers always purchase, returning customers only sometimes
+        num_clickthroughs += new_customers + returning_customers
+        num_purchases += new_customers + RETURNING_PURCHASE_PROB*returning_customers
+        num_customers += new_customers
+
+    row_counts = {"events": num_clickthroughs + num_purchases,
+                  "clickthroughs": num_clickthroughs,
+                  "purchases": num_purchases,
+                  "customers": num_customers,
+                  "items": len(ItemTable(None, scale_factor = scale_factor).product_list)}
+    return(row_counts)
+
+def find_scale_factor(target_events, start_date, end_date):
+    """
+    Finds the scale factor expected to produce a number of events over a simulated period,
+    for sizing a load test ahead of time
+
+    Parameters:
+        target_events (float): the number of events wanted
+        start_date (datetime): the date the website went live
+        end_date (datetime): the date the simulation runs up to
+
+    Returns:
+        scale_factor (float): the scale factor, to three significant figures
+
+    """
+    # Events grow almost in proportion to the scale factor, so bisect on a bracket around the
+    # proportional estimate
+    unit_events = estimate_row_counts(start_date, end_date)["events"]
+    low = 0.5*target_events / unit_events
+    high = 2*target_events / unit_events
+    for _ in range(40):
+        middle = (low + high)/2
+        if estimate_row_counts(start_date, end_date, middle)["events"] < target_events:
+            low = middle
+        else:
+            high = middle
+    return(float("%.3g" % ((low + high)/2)))
+
+def get_estimate_table(start_date, end_date, scale_factors):
+    """
+    Formats the estimated row counts of several scale factors as a table
+
+    Parameters:
+        start_date (datetime): the date the website went live
+        end_date (datetime): the date the simulation runs up to
+        scale_factors (List<float>): the scale factors to estimate
+
+    Returns:
+        table (string): one line per scale factor, with the estimated rows of each table
+
+    """
+    lines = ["Estimated rows from " + start_date.strftime("%Y-%m-%d") + " to " +
+             end_date.strftime("%Y-%m-%d"),
+             "%8s %15s %13s %7s" % ("SF", "events", "customers", "items")]
+    for scale_factor in scale_factors:
+        row_counts = estimate_row_counts(start_date, end_date, scale_factor)
+        lines.append("%8g %15d %13d %7d" % (scale_factor, row_counts["events"],
+                                             row_counts["customers"], row_counts["items"]))
+    return("\n".join(lines))
+
+if __name__ == "__main__":
+    start_date = datetime.strptime("2018-01-01", "%Y-%m-%d")
+    end_date = datetime.strptime("2026-01-01", "%Y-%m-%d")
+    print(get_estimate_table(start_date, end_date, [0.5, 1, 2, 10, 100]))
+
+    # Scale factor expected to give 1 billion events over the same period
+    print(find_scale_factor(1e9, start_date, end_date))
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+
+@author: timpr
+"""
+import heapq
+import shutil
+import tempfile
+import random as rand
+from datetime import datetime
+from multiprocessing import Pool
+
+from classes.event_class import EventsTable, EVENT_INSERT_SQL, EVENT_TIME_COLUMN
+from classes.vectorized_event_class import VectorizedEventsTable
+from classes.customer_store_class import CUSTOMER_INSERT_SQL
+from classes.event_buffer_class import EventBuffer
+from classes.event_sink_class import SpoolSink, read_spool
+from classes.item_cache_class import get_item_cache
+from classes.event_encoder_class import EventEncoder, COMPACT_EVENT_INSERT_SQL
+
+def simulate_shard(shard_args):
+    """
+    Simulates one shard of the customer population in a worker process, streaming the events
+    and customers to spool files as they are produced, so neither the worker nor the parent
+    holds the shard's whole history in memory
+
+    Parameters:
+        shard_args (Tuple): the start date, end date, item ids, seed, shard index, number of shards,
+                            engine name, flush size, scale factor and spool directory for the shard
+
+    Returns:
+        event_path (string): the spool file of the shard's events, in the order they were simulated
+        customer_path (string): the spool file of the shard's customers, with shard-local ids
+        num_customers (int): the number of customers in the shard
+
+    """
+    (start_date, end_date, item_ids, seed, shard_index, num_shards, engine, flush_size, scale_factor,
+     spool_dir) = shard_args
+
+    event_sink = SpoolSink(flush_size, spool_dir)
+    if engine == "vectorized":
+        table_class = VectorizedEventsTable
+    else:
+        table_class = EventsTable
+    events_table = table_class(None, start_date, flush_size, seed = seed, shard_index = shard_index,
+                               num_shards = num_shards, item_ids = item_ids, end_date = end_date,
+                               sink = event_sink, scale_factor = scale_factor)
+    event_sink.close()
+
+    # Export the customers a chunk at a time, so only one chunk of rows is built at once
+    customers = events_table.customers
+    customer_sink = SpoolSink(flush_size, spool_dir)
+    for i in range(0, len(customers), flush_size):
+        customer_sink.add_rows(customers.export_rows(slice(i, min(i + flush_size, len(customers)))))
+    customer_sink.close()
+
+    return(event_sink.path, customer_sink.path, len(customers))
+
+def offset_customer_ids(rows, id_position, id_offset):
+    """
+    Shifts the customer ids in a list of rows so that ids from different shards do not collide
+
+    Parameters:
+        rows (List<Tuple>): the rows to renumber
+        id_position (int): the position of the customer id in each row
+        id_offset (int): the amount to add to every customer id
+
+    Returns:
+        rows (Generator<Tuple>): the renumbered rows
+
+    """
+    for row in rows:
+        yield row[:id_position] + (row[id_position] + id_offset,) + row[id_position + 1:]
+
+def run_sharded_simulation(mycursor, start_date, seed, num_shards, engine = "python",
+                           flush_size = 5000, processes = None, end_date = None, sink = None,
+                           customer_sink = None, scale_factor = 1, compact_schema = False,
+                           spool_dir = None):
+    """
+    Splits the customer population into shards, simulates each shard in a process pool with its
+    own seeded random stream, then merges the results into the events and customers tables.
+    Each shard spools its rows to disk, and the spools are merged as streams.
+    The same seed and number of shards always produce the same rows in the same order.
+
+    Parameters:
+        mycursor (MySQL Cursor): a cursor to perform database operations from Python
+        start_date (datetime): the date the website went live
+        seed (int): the seed from which every shard's random stream is derived, drawn at random if None
+        num_shards (int): the number of shards to split the customer population into
+        engine (string): the simulation engine, either "python" or "vectorized"
+        flush_size (int): the number of buffered events that triggers a batch write to the database
+        processes (int): the number of worker processes, defaults to one per shard
+        end_date (datetime): the date to simulate up to, defaults to today
+        sink (EventSink): where the merged events are written, defaults to the events table
+        customer_sink (EventSink): where the customers are written, defaults to the customers table
+        scale_factor (float): multiplies the base daily traffic of the whole simulation
+        compact_schema (boolean): true to encode the merged events for the compact events table
+        spool_dir (string): the directory in which the run's spool directory is created, defaults
+                            to the temp directory
+
+    Returns:
+        event_sink (EventSink): the sink the merged events were written to, holding write statistics
+
+    """
+    if end_date is None:
+        end_date = datetime.today()
+    
+    # Every shard must share the site-wide random stream, so a seed is always needed
+    if seed is None:
+        seed = rand.randrange(2**32)
+
+    item_ids = get_item_cache(mycursor).get_item_ids()
+
+    # Every shard spools into a directory of the run's own, which is removed however the run ends
+    run_spool_dir = tempfile.mkdtemp(prefix = "shards_", dir = spool_dir)
+    try:
+        shard_args = [(start_date, end_date, item_ids, seed, shard_index, num_shards, engine, flush_size,
+                       scale_factor, run_spool_dir)
+                      for shard_index in range(num_shards)]
+        with Pool(processes if processes is not None else num_shards) as pool:
+            shard_results = pool.map(simulate_shard, shard_args)
+
+        # Customer ids are allocated from 1 in each shard, so offset them by the size of earlier shards
+        id_offsets = []
+        total_customers = 0
+        for event_path, customer_path, num_customers in shard_results:
+            id_offsets.append(total_customers)
+            total_customers += num_customers
+
+        # Merge the shards' events day by day, taking shards in index order within each day
+        shard_events = [offset_customer_ids(read_spool(event_path), 3, id_offset)
+                        for (event_path, customer_path, num_customers), id_offset in zip(shard_results, id_offsets)]
+        event_sql = COMPACT_EVENT_INSERT_SQL if compact_schema == True else EVENT_INSERT_SQL
+        if sink is None:
+            event_sink = EventBuffer(mycursor, event_sql, flush_size, EVENT_TIME_COLUMN)
+        else:
+            event_sink = sink
+        merged_events = heapq.merge(*shard_events, key = lambda row: row[0])
+        if compact_schema == True:
+            merged_events = map(EventEncoder().encode_row, merged_events)
+        for row in merged_events:
+            event_sink.add_row(row)
+        event_sink.close()
+
+        if customer_sink is None:
+            customer_sink = EventBuffer(mycursor, CUSTOMER_INSERT_SQL, flush_size, isolate_errors = True)
+        for (event_path, customer_path, num_customers), id_offset in zip(shard_results, id_offsets):
+            for row in offset_customer_ids(read_spool(customer_path), 0, id_offset):
+                customer_sink.add_row(row)
+        customer_sink.close()
+    finally:
+        shutil.rmtree(run_spool_dir)
+
+    return(event_sink)
@@ -5,8 +5,8 @@
 """
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-import mysql.connector
 from datetime import datetime, timedelta, date
+from classes.storage_backend_class import create_backend
 
 def produce_shoe_club_growth_report(mycursor, camp_start_date, camp_end_date):
     """
@@ -37,10 +37,10 @@ def produce_shoe_club_growth_report(mycursor, camp_start_date, camp_end_date):
                         FROM
                             customers
                         WHERE
-                            shoe_club_signup_date < "''' + plot_start_date_string + '''"
+                            shoe_club_signup_date < %s
                         AND
-                            shoe_club_status = "Active"    
-                     ''')
+                            shoe_club_status = 'Active'    
+                     ''', (plot_start_date_string,))
     initial_members = mycursor.fetchall()[0][0]
     
     # Determine number of new customers added each day in the period of interest
@@ -50,22 +50,25 @@ def produce_shoe_club_growth_report(mycursor, camp_start_date, camp_end_date):
                         FROM 
                   	        customers 
                         WHERE 
-                            shoe_club_signup_date >= "''' + plot_start_date_string + '''" 
+                            shoe_club_signup_date >= %s 
                         AND 
-                            shoe_club_signup_date <= "''' + plot_end_date_string + '''" 
+                            shoe_club_signup_date <= %s 
                         GROUP BY 
                             shoe_club_signup_date 
                         ORDER BY 
-                            shoe_club_signup_date''')
+                            shoe_club_signup_date''', (plot_start_date_string, plot_end_date_string))
     daily_members = mycursor.fetchall()
     
-    # Construct a dictionary with the total number of customers on each day of the period of interest
+    # Construct a dictionary with the total number of customers on each day of the period of interest,
+    # carrying the total forward over days without any signups
+    daily_signups = dict(daily_members)
     daily_members_dict = {}
-    for day in daily_members:
-        if (day[0] == plot_start_date.date()):
-            daily_members_dict[day[0]] = day[1] + initial_members
-        else:
-            daily_members_dict[day[0]] = day[1] + daily_members_dict[day[0] - timedelta(days = 1)]
+    total_members = initial_members
+    day = plot_start_date.date()
+    while day <= plot_end_date.date():
+        total_members += daily_signups.get(day, 0)
+        daily_members_dict[day] = total_members
+        day += timedelta(days = 1)
     
     # Determine average number of customers added during campaign
     avg_camp_new_membs = (daily_members_dict[camp_end_date.date()] - 
@@ -84,7 +87,8 @@ def produce_shoe_club_growth_report(mycursor, camp_start_date, camp_end_date):
     create_growth_plot(daily_members_dict, plot_name, camp_start_date, camp_end_date)
     
     # Generate HTML report summarizing results
-    generate_html_report(avg_camp_new_membs, avg_non_camp_new_membs, plot_name)
+    generate_html_report(avg_camp_new_membs, avg_non_camp_new_membs, plot_name, camp_start_date,
+                         camp_end_date)
             
     return
 
@@ -130,7 +134,8 @@ def create_growth_plot(daily_customer_dict, plot_name, camp_start_date, camp_end
     
     return
 
-def generate_html_report(avg_camp_new_custs, avg_non_camp_new_custs, plot_name):
+def generate_html_report(avg_camp_new_custs, avg_non_camp_new_custs, plot_name, camp_start_date,
+                         camp_end_date):
     """
     Writes A/B test summary report to html
     
@@ -138,6 +143,8 @@ def generate_html_report(avg_camp_new_custs, avg_non_camp_new_custs, plot_name):
         avg_camp_new_custs (float): the average number of new daily customers registering during the campaign
         avg_non_camp_new_custs (float): the average number of new daily customers registering outside of campaign
         plot_name (string): the filename of the plot chart associated with the campaign
+        camp_start_date (datetime): the date that the marketing campaign started
+        camp_end_date (datetime): the date that the marketing campaign finished
     
     Returns:
         None
@@ -227,12 +234,9 @@ def generate_html_report(avg_camp_new_custs, avg_non_camp_new_custs, plot_name):
     return
 
 if __name__ == "__main__":
-    mydb = mysql.connector.connect(host="localhost",
-                                   user="root",
-                                   password="Tt556677",
-                                   database = "timsshoes",
-                                   connection_timeout = 28800
-                                   )    
+    # Storage backend holding the Tim's Shoes database, either "mysql" or "sqlite"
+    backend = create_backend("mysql")
+    mydb = backend.connect()
     mycursor = mydb.cursor()
     camp_start_date = datetime.strptime('2020-01-01', "%Y-%m-%d")
     camp_end_date = camp_start_date + timedelta(days = 30)